@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+from schema import parse_timestamps
+from schema import DISPLAY_TIMEZONE
+
+# Pure, UI-free analytics used by the workout dashboard. Everything here works on
+# whole columns so the cost grows with the number of days/weeks shown, not with
+# per-row Python work.
+
+
+# Dashboard date ranges ending today: label -> number of days, None for year to date
+DATE_WINDOWS = {'Last 7 days': 7, 'Last 30 days': 30, 'Last 90 days': 90, 'Year to date': None}
+CUSTOM_WINDOW = 'Custom'
+
+
+# Today's date in the display timezone, as a naive Timestamp at midnight
+def local_today():
+    return pd.Timestamp.now(tz=DISPLAY_TIMEZONE).tz_localize(None).normalize()
+
+
+# (first_day, last_day) of a dashboard date range as Timestamps; custom is the (first, last)
+# dates picked for CUSTOM_WINDOW. Days are calendar days in the display timezone.
+def date_window(label, today=None, custom=None):
+    if label == CUSTOM_WINDOW:
+        first_day, last_day = (pd.Timestamp(day).normalize() for day in custom)
+        return min(first_day, last_day), max(first_day, last_day)
+    today = local_today() if today is None else pd.Timestamp(today).normalize()
+    days = DATE_WINDOWS[label]
+    first_day = pd.Timestamp(today.year, 1, 1) if days is None else today - pd.Timedelta(days=days - 1)
+    return first_day, today
+
+
+# Parse the userWorkouts datetimes and add duration (minutes) and workout_date
+def prepare_workouts(df_workouts):
+    df_workouts = df_workouts.copy()
+    df_workouts['startDT'] = parse_timestamps(df_workouts['startDT'])
+    df_workouts['endDT'] = parse_timestamps(df_workouts['endDT'])
+
+    # Add calculated columns
+    df_workouts['duration'] = (df_workouts['endDT'] - df_workouts['startDT']).dt.total_seconds() / 60  # in minutes
+    df_workouts['workout_date'] = pd.to_datetime(df_workouts['startDT'].dt.date)
+    return df_workouts
+
+
+# Run-length encode a boolean array, returning (start index, length) of every True run
+def streak_runs(flags):
+    flags = np.asarray(flags, dtype=np.int8)
+    edges = np.diff(np.concatenate(([0], flags, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends - starts
+
+
+# Per-day goal tracking frame between start and end (inclusive) from the rows of the daily
+# rollup table (see rollups.py), which hold total duration and workout count per day, so
+# the mean duration is their ratio
+def rollup_goal_tracking(daily, start, end):
+    days = pd.DataFrame({'workout_date': pd.date_range(start=start, end=end)})
+    workouts = daily['workouts'].astype(float)
+    daily = pd.DataFrame({
+        'workout_date': pd.to_datetime(daily['day']),
+        'duration': daily['duration'].astype(float) / workouts,
+        'calories_burned': daily['calories_burned'].astype(float),
+        'met_duration_goal': daily['met_duration_goal'].astype(bool),
+        'met_calories_goal': daily['met_calories_goal'].astype(bool),
+    })
+
+    days['workout_date'] = days['workout_date'].astype(daily['workout_date'].dtype)
+    goal_tracking = days.merge(daily, on='workout_date', how='left')
+    goal_tracking['duration'] = goal_tracking['duration'].fillna(0)
+    goal_tracking['calories_burned'] = goal_tracking['calories_burned'].fillna(0)
+    goal_tracking['met_duration_goal'] = goal_tracking['met_duration_goal'].fillna(False).astype(bool)
+    goal_tracking['met_calories_goal'] = goal_tracking['met_calories_goal'].fillna(False).astype(bool)
+    goal_tracking['worked_out'] = goal_tracking['duration'] > 0
+    return goal_tracking
+
+
+# Weekly stats aligned to every Monday between start and end from the rows of the weekly
+# rollup table (weeks start on Monday); weeks without workouts have a count of 0
+def rollup_weekly_tracking(weekly, start, end):
+    mondays = pd.date_range(start=start, end=end, freq='W-MON')
+    weeks = pd.DataFrame({
+        'start_of_week': mondays,
+        'year': np.asarray(mondays.year, dtype='int64'),
+        'week': np.asarray(mondays.isocalendar()['week'], dtype='int64'),
+    })
+    weekly = pd.DataFrame({
+        'start_of_week': pd.to_datetime(weekly['week_start']).astype(weeks['start_of_week'].dtype),
+        'duration': weekly['duration'].astype(float) / weekly['workouts'].astype(float),
+        'calories_burned': weekly['calories_burned'].astype(float),
+        'workouts_per_week': weekly['workouts'],
+    })
+    weeks = weeks.merge(weekly, on='start_of_week', how='left')
+    weeks['workouts_per_week'] = weeks['workouts_per_week'].fillna(0).astype('int64')
+    return weeks
+
+
+def _date_strings(dates):
+    return pd.Series(dates).dt.strftime("%Y-%m-%d").to_numpy()
+
+
+def _events(titles, starts, ends, background_colors, text_colors=None):
+    events = pd.DataFrame({
+        'title': titles,
+        'start': starts,
+        'end': ends,
+        'resourceId': 'a',  # Assuming a single resource for simplicity
+        'backgroundColor': background_colors,
+    })
+    if text_colors is not None:
+        events['textColor'] = text_colors
+    return events.to_dict('records')
+
+
+def daily_events(goal_tracking):
+    duration = goal_tracking['duration'].to_numpy()
+    calories = goal_tracking['calories_burned'].to_numpy()
+    met_duration = np.broadcast_to(np.asarray(goal_tracking['met_duration_goal'], dtype=bool), duration.shape)
+    met_calories = np.broadcast_to(np.asarray(goal_tracking['met_calories_goal'], dtype=bool), duration.shape)
+
+    # Determine the status of the goals and set the appropriate message and colors
+    conditions = [
+        (duration == 0) & (calories == 0),
+        met_duration & met_calories,
+        met_duration,
+        met_calories,
+    ]
+    titles = np.select(conditions, [
+        "No workouts :(",
+        "✅ Met both daily workout duration and calorie goals!",
+        "✅ Met daily workout duration goal but ❌ did not meet daily calorie goal.",
+        "✅ Met daily calorie goal but ❌ did not meet daily workout duration goal.",
+    ], default="❌ Did not meet either daily workout or calorie goals.")
+    background_colors = np.select(conditions, ["gray", "green", "yellow", "yellow"], default="red")
+    text_colors = np.select(conditions, ["white", "white", "black", "black"], default="white")
+
+    dates = _date_strings(goal_tracking['workout_date'])
+    return _events(titles, dates, dates, background_colors, text_colors)
+
+
+def streak_events(goal_tracking):
+    starts, lengths = streak_runs(goal_tracking['worked_out'].to_numpy())
+    # The event is placed on the last day of each streak
+    dates = _date_strings(goal_tracking['workout_date'].to_numpy()[starts + lengths - 1])
+    titles = [f"🔥 Workout streak: {length} days!" for length in lengths]
+    return _events(titles, dates, dates, "orange")
+
+
+def weekly_events(weeks, frequency_goal=None):
+    active = weeks[weeks['workouts_per_week'] > 0]
+    idle = weeks[weeks['workouts_per_week'] == 0]
+
+    # Active weeks produce three events each (goal status, avg duration, total calories)
+    starts = _date_strings(active['start_of_week'])
+    ends = _date_strings(active['start_of_week'] + pd.Timedelta(days=7))
+    counts = active['workouts_per_week'].to_numpy()
+    met = counts >= frequency_goal if frequency_goal else np.zeros(len(active), dtype=bool)
+
+    status_titles = np.where(
+        met,
+        [f"✅ Met weekly workout frequency goal with {n} workouts!" for n in counts],
+        [f"❌ Did not fully meet weekly workout frequency goal. Only {n} workouts." for n in counts],
+    ) if len(active) else []
+    status = _events(status_titles, starts, ends,
+                     np.where(met, "green", "yellow"), np.where(met, "white", "black"))
+    durations = _events([f"Avg duration: {d:.2f} mins" for d in active['duration'].to_numpy()],
+                        starts, ends, "lightblue")
+    calories = _events([f"Total calories burned: {c:.0f}" for c in active['calories_burned'].to_numpy()],
+                       starts, ends, "purple")
+
+    idle_starts = _date_strings(idle['start_of_week'])
+    idle_ends = _date_strings(idle['start_of_week'] + pd.Timedelta(days=7))
+    empty = _events("No workouts for this week :(", idle_starts, idle_ends, "grey") if len(idle) else []
+
+    # Restore calendar order: weeks ascending, status/duration/calories per active week
+    active_groups = iter(zip(status, durations, calories))
+    idle_groups = iter((event,) for event in empty)
+    groups = [next(active_groups) if is_active else next(idle_groups)
+              for is_active in weeks['workouts_per_week'].to_numpy() > 0]
+    return [event for group in groups for event in group]
+
+
+def calendar_events(goal_tracking, weeks, frequency_goal=None):
+    return daily_events(goal_tracking) + streak_events(goal_tracking) + weekly_events(weeks, frequency_goal)
+
+
+# The full list of calendar events (daily goals, streaks, weekly rollups) from the daily
+# and weekly rollup tables, for the days from start (default: the start of the year) to today
+def build_rollup_calendar_events(daily, weekly, frequency_goal=None, today=None, start=None):
+    today = pd.Timestamp.today() if today is None else pd.Timestamp(today)
+    start = pd.Timestamp(today.year, 1, 1) if start is None else pd.Timestamp(start)
+
+    goal_tracking = rollup_goal_tracking(daily, start, today)
+    weeks = rollup_weekly_tracking(weekly, start, today)
+    return calendar_events(goal_tracking, weeks, frequency_goal)
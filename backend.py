@@ -0,0 +1,648 @@
+import abc
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import pandas as pd
+import data
+import schema
+
+# Query backends for heart-rate aggregates. The dashboard asks for per-workout,
+# daily and weekly summaries and only pulls raw samples when it has to draw them.
+# SupabaseBackend reads the views in sql/heart_rate_summaries.sql; SQLiteBackend
+# implements the same interface locally for offline tests and benchmarks. Both also
+# serve the reads and writes of the rollup worker (rollups.py, sql/rollups.sql) and
+# the stored per-workout summaries (summaries.py, sql/workout_summaries.sql) and the
+# cohort quantile sketches (cohorts.py, sql/cohort_sketches.sql).
+
+SUMMARY_COLUMNS = ['avg_heartrate', 'min_heartrate', 'max_heartrate', 'samples']
+WORKOUT_SUMMARY_COLUMNS = ['workout_id', 'username'] + SUMMARY_COLUMNS
+DAILY_SUMMARY_COLUMNS = ['username', 'day'] + SUMMARY_COLUMNS
+WEEKLY_SUMMARY_COLUMNS = ['username', 'week_start'] + SUMMARY_COLUMNS
+
+DAILY_ROLLUP_TABLE = 'userDailyRollup'
+WEEKLY_ROLLUP_TABLE = 'userWeeklyRollup'
+ROLLUP_COLUMNS = ['workouts', 'duration', 'calories_burned', 'avg_heartrate']
+DAILY_ROLLUP_COLUMNS = ['username', 'day'] + ROLLUP_COLUMNS + ['met_duration_goal', 'met_calories_goal']
+WEEKLY_ROLLUP_COLUMNS = ['username', 'week_start'] + ROLLUP_COLUMNS + ['met_frequency_goal']
+LIFETIME_SUMMARY_VIEW = 'userLifetimeSummary'
+
+WORKOUT_TOTALS_TABLE = 'userWorkoutSummary'
+UNSUMMARIZED_VIEW = 'unsummarizedWorkouts'
+ZONE_COLUMNS = [f'zone{zone}_seconds' for zone in range(1, 6)]
+WORKOUT_TOTALS_COLUMNS = ['workout_id', 'username', 'startDT', 'duration', 'avg_heartrate', 'max_heartrate',
+                          'samples'] + ZONE_COLUMNS + ['calories_burned']
+
+COHORT_SKETCH_TABLE = 'workoutCohortSketch'
+COHORT_MEMBER_TABLE = 'workoutCohortMember'
+UNSKETCHED_VIEW = 'unsketchedWorkouts'
+COHORT_SKETCH_COLUMNS = ['id', 'workout', 'cohort', 'metric', 'count', 'sketch']
+UNSKETCHED_COLUMNS = ['workout_id', 'username', 'workout', 'duration', 'overallAccuracy', 'calories_burned']
+
+
+# JSON-safe rows of a frame (NaN becomes null, numpy scalars plain numbers)
+def _records(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+
+# Monday ('YYYY-MM-DD') of the week holding day, the first week_start overlapping a range
+def _week_start(day):
+    day = pd.Timestamp(day)
+    return (day - pd.Timedelta(days=day.weekday())).strftime('%Y-%m-%d')
+
+
+class QueryBackend(abc.ABC):
+    # Mean/min/max/count heart rate per workout of the user; only workouts starting in
+    # [start, end) when given (ISO timestamps)
+    @abc.abstractmethod
+    def workout_heart_rate_summary(self, username, start=None, end=None):
+        raise NotImplementedError
+
+    # Heart-rate aggregates per calendar day in the display timezone
+    @abc.abstractmethod
+    def daily_heart_rate_summary(self, username):
+        raise NotImplementedError
+
+    # Heart-rate aggregates per week (weeks start on Monday)
+    @abc.abstractmethod
+    def weekly_heart_rate_summary(self, username):
+        raise NotImplementedError
+
+    # Raw userWorkoutHealth rows for the given workouts
+    @abc.abstractmethod
+    def heart_rate_samples(self, workout_ids):
+        raise NotImplementedError
+
+    # userWorkouts rows of the user; only those starting in [start, end) when given (ISO timestamps)
+    @abc.abstractmethod
+    def user_workouts(self, username, start=None, end=None):
+        raise NotImplementedError
+
+    # Highest workout_id in userWorkouts, or None when it is empty
+    @abc.abstractmethod
+    def latest_workout_id(self):
+        raise NotImplementedError
+
+    # workout_id, username and startDT of every workout with a higher workout_id, in id order
+    @abc.abstractmethod
+    def workouts_after(self, workout_id):
+        raise NotImplementedError
+
+    # The user's row (goals, weight, age, gender) as a dict, or None
+    @abc.abstractmethod
+    def user_row(self, username):
+        raise NotImplementedError
+
+    # The user's userDailyRollup / userWeeklyRollup rows, in date order. With first_day and
+    # last_day ('YYYY-MM-DD') only the days in that range and the weeks starting in it; a
+    # week starting before first_day also counts workouts before the range, so it is left out.
+    @abc.abstractmethod
+    def daily_rollup(self, username, first_day=None, last_day=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def weekly_rollup(self, username, first_day=None, last_day=None):
+        raise NotImplementedError
+
+    # The user's lifetime totals (workouts, duration, calories_burned, active_days, first_day,
+    # last_day) as a dict, or None before any rollups were written
+    @abc.abstractmethod
+    def lifetime_summary(self, username):
+        raise NotImplementedError
+
+    # Replace the user's rollup rows dated first_day..last_day (inclusive, 'YYYY-MM-DD';
+    # None for all of them), and the weekly rows of every week holding one of those days,
+    # with the given daily and weekly frames
+    @abc.abstractmethod
+    def replace_rollups(self, username, first_day, last_day, daily, weekly):
+        raise NotImplementedError
+
+    # Stored userWorkoutSummary rows of the user; only workouts starting in [start, end)
+    # when given (ISO timestamps)
+    @abc.abstractmethod
+    def workout_summaries(self, username, start=None, end=None):
+        raise NotImplementedError
+
+    # Insert or replace userWorkoutSummary rows (a WORKOUT_TOTALS_COLUMNS frame)
+    @abc.abstractmethod
+    def upsert_workout_summaries(self, summary):
+        raise NotImplementedError
+
+    # Up to limit userWorkouts rows with a higher workout_id and no summary, in id order
+    @abc.abstractmethod
+    def unsummarized_workouts(self, workout_id, limit):
+        raise NotImplementedError
+
+    # Up to limit summarized workouts (UNSKETCHED_COLUMNS) with a higher workout_id that are
+    # not in the cohort sketches yet, in id order
+    @abc.abstractmethod
+    def unsketched_workouts(self, workout_id, limit):
+        raise NotImplementedError
+
+    # In one transaction, record the workouts as added to the cohort sketches and insert the
+    # workoutCohortSketch rows holding them (a COHORT_SKETCH_COLUMNS frame). Returns False,
+    # writing nothing, when any of them was recorded before (another caller added it).
+    @abc.abstractmethod
+    def add_cohort_sketches(self, workout_ids, sketches):
+        raise NotImplementedError
+
+    # workoutCohortSketch rows (COHORT_SKETCH_COLUMNS) of the given workout types; only the
+    # given cohorts when given
+    @abc.abstractmethod
+    def cohort_sketches(self, workouts, cohorts=None):
+        raise NotImplementedError
+
+    # In one transaction, replace the workoutCohortSketch rows with the given ids by merged
+    # (a COHORT_SKETCH_COLUMNS dict). Returns False, writing nothing, when any of them was
+    # deleted before (another caller merged it).
+    @abc.abstractmethod
+    def merge_cohort_sketches(self, ids, merged):
+        raise NotImplementedError
+
+    # Delete every cohort sketch and membership row
+    @abc.abstractmethod
+    def reset_cohorts(self):
+        raise NotImplementedError
+
+
+# With cached=False every read goes to Supabase (the rollup worker must see rows written
+# since the dashboard cached them). Reads that can exceed PostgREST's max-rows are ordered
+# on a unique key and paged (data.execute_paged).
+class SupabaseBackend(QueryBackend):
+    def __init__(self, client, cached=True):
+        self.client = client
+        self.cached = cached
+
+    def _rows(self, key, query, paged=False):
+        if self.cached:
+            return data.cached_rows(key, query, paged)
+        if paged:
+            return data.execute_paged(query, f"select {key[1]}")
+        return data.execute(query(), f"select {key[1]}").data
+
+    # A user's rows of a summary view, ordered on the view's per-user key column
+    def _summary(self, view, username, columns, key):
+        rows = self._rows((username, view), lambda: self.client.table(view).select('*').eq('username', username)
+                          .order(key), paged=True)
+        return pd.DataFrame(rows, columns=columns)
+
+    # Cached rows of a user's table or view with column between low and high (inclusive,
+    # exclusive when high_exclusive; either bound may be None)
+    def _range(self, table, username, column, low, high, columns, high_exclusive=False):
+        def query():
+            query = self.client.table(table).select('*').eq('username', username)
+            if low is not None:
+                query = query.gte(column, low)
+            if high is not None:
+                query = query.lt(column, high) if high_exclusive else query.lte(column, high)
+            return query.order(column)
+        return pd.DataFrame(self._rows((username, table, low, high), query, paged=True), columns=columns)
+
+    def workout_heart_rate_summary(self, username, start=None, end=None):
+        if start is None and end is None:
+            return self._summary('workoutHeartRateSummary', username, WORKOUT_SUMMARY_COLUMNS, 'workout_id')
+        return self._range('workoutHeartRateSummary', username, 'startDT', start, end, WORKOUT_SUMMARY_COLUMNS,
+                           high_exclusive=True)
+
+    def daily_heart_rate_summary(self, username):
+        return self._summary('dailyHeartRateSummary', username, DAILY_SUMMARY_COLUMNS, 'day')
+
+    def weekly_heart_rate_summary(self, username):
+        return self._summary('weeklyHeartRateSummary', username, WEEKLY_SUMMARY_COLUMNS, 'week_start')
+
+    def heart_rate_samples(self, workout_ids):
+        df_health, _ = data.fetch_health_batched(self.client, workout_ids)
+        return schema.health_frame(df_health)
+
+    def user_workouts(self, username, start=None, end=None):
+        def query():
+            query = self.client.table('userWorkouts').select('*').eq('username', username)
+            if start is not None:
+                query = query.gte('startDT', start)
+            if end is not None:
+                query = query.lt('startDT', end)
+            return query.order('workout_id')
+        return pd.DataFrame(data.execute_paged(query, 'select userWorkouts (rollup)'))
+
+    def latest_workout_id(self):
+        rows = data.execute(self.client.table('userWorkouts').select('workout_id')
+                            .order('workout_id', desc=True).limit(1), 'select latest workout_id').data
+        return rows[0]['workout_id'] if rows else None
+
+    def workouts_after(self, workout_id):
+        rows = data.execute_paged(lambda: self.client.table('userWorkouts').select('workout_id, username, startDT')
+                                  .gt('workout_id', workout_id).order('workout_id'), 'select new userWorkouts')
+        return pd.DataFrame(rows, columns=['workout_id', 'username', 'startDT'])
+
+    def user_row(self, username):
+        rows = self._rows((username, 'user'), lambda: self.client.table('user').select('*').eq('username', username))
+        return rows[0] if rows else None
+
+    def daily_rollup(self, username, first_day=None, last_day=None):
+        return self._range(DAILY_ROLLUP_TABLE, username, 'day', first_day, last_day, DAILY_ROLLUP_COLUMNS)
+
+    def weekly_rollup(self, username, first_day=None, last_day=None):
+        return self._range(WEEKLY_ROLLUP_TABLE, username, 'week_start', first_day, last_day, WEEKLY_ROLLUP_COLUMNS)
+
+    def lifetime_summary(self, username):
+        rows = self._rows((username, LIFETIME_SUMMARY_VIEW), lambda: self.client.table(LIFETIME_SUMMARY_VIEW)
+                          .select('*').eq('username', username))
+        return rows[0] if rows else None
+
+    # PostgREST has no multi-statement transactions, so the new rows are upserted on the
+    # primary key first and only the stored rows they no longer hold are deleted after;
+    # readers never see the range empty and a failure part way keeps the rows written
+    def replace_rollups(self, username, first_day, last_day, daily, weekly):
+        for table, column, frame in ((DAILY_ROLLUP_TABLE, 'day', daily), (WEEKLY_ROLLUP_TABLE, 'week_start', weekly)):
+            if not frame.empty:
+                data.execute(self.client.table(table).upsert(_records(frame), on_conflict=f'username,{column}'),
+                             f"upsert {table}")
+            low = _week_start(first_day) if first_day is not None and column == 'week_start' else first_day
+            def query():
+                query = self.client.table(table).select(column).eq('username', username).order(column)
+                return query.gte(column, low).lte(column, last_day) if low is not None else query
+            stored = {row[column] for row in data.execute_paged(query, f"select {table}")}
+            stale = sorted(stored - set(frame[column] if not frame.empty else ()))
+            if stale:
+                data.execute(self.client.table(table).delete().eq('username', username).in_(column, stale),
+                             f"delete {table}")
+
+    def workout_summaries(self, username, start=None, end=None):
+        return self._range(WORKOUT_TOTALS_TABLE, username, 'startDT', start, end, WORKOUT_TOTALS_COLUMNS,
+                           high_exclusive=True)
+
+    def upsert_workout_summaries(self, summary):
+        if not summary.empty:
+            data.execute(self.client.table(WORKOUT_TOTALS_TABLE).upsert(_records(summary), on_conflict='workout_id'),
+                         f"upsert {WORKOUT_TOTALS_TABLE}")
+
+    def unsummarized_workouts(self, workout_id, limit):
+        rows = data.execute(self.client.table(UNSUMMARIZED_VIEW).select('*').gt('workout_id', workout_id)
+                            .order('workout_id').limit(limit), f"select {UNSUMMARIZED_VIEW}").data
+        return pd.DataFrame(rows)
+
+    def unsketched_workouts(self, workout_id, limit):
+        rows = data.execute(self.client.table(UNSKETCHED_VIEW).select('*').gt('workout_id', workout_id)
+                            .order('workout_id').limit(limit), f"select {UNSKETCHED_VIEW}").data
+        return pd.DataFrame(rows, columns=UNSKETCHED_COLUMNS)
+
+    # The functions in sql/cohort_sketches.sql run each write in one transaction
+    def add_cohort_sketches(self, workout_ids, sketches):
+        if not workout_ids:
+            return True
+        return bool(data.execute(self.client.rpc('add_cohort_sketches', {
+            'workout_ids': [int(workout_id) for workout_id in workout_ids],
+            'sketches': _records(sketches[COHORT_SKETCH_COLUMNS])}), "rpc add_cohort_sketches").data)
+
+    # Sketches are shared by all users, so they are cached under the shared (None) key
+    def cohort_sketches(self, workouts, cohorts=None):
+        def query():
+            query = self.client.table(COHORT_SKETCH_TABLE).select(', '.join(COHORT_SKETCH_COLUMNS)) \
+                .in_('workout', list(workouts))
+            return query.in_('cohort', list(cohorts)) if cohorts is not None else query
+        key = (None, COHORT_SKETCH_TABLE, tuple(sorted(workouts)), tuple(sorted(cohorts)) if cohorts else None)
+        return pd.DataFrame(self._rows(key, query) if workouts else [], columns=COHORT_SKETCH_COLUMNS)
+
+    def merge_cohort_sketches(self, ids, merged):
+        return bool(data.execute(self.client.rpc('merge_cohort_sketches', {'ids': list(ids), 'merged': merged}),
+                                 "rpc merge_cohort_sketches").data)
+
+    # PostgREST refuses deletes without a filter, so each one matches every row
+    def reset_cohorts(self):
+        data.execute(self.client.table(COHORT_SKETCH_TABLE).delete().neq('cohort', ''), f"delete {COHORT_SKETCH_TABLE}")
+        data.execute(self.client.table(COHORT_MEMBER_TABLE).delete().gte('workout_id', 0),
+                     f"delete {COHORT_MEMBER_TABLE}")
+
+
+SQLITE_SCHEMA = """
+create table if not exists "userWorkouts" (
+    workout_id integer primary key,
+    username text not null,
+    workout text,
+    startDT text,
+    endDT text,
+    reps integer,
+    overallAccuracy real
+);
+create index if not exists user_workouts_username on "userWorkouts" (username);
+
+create table if not exists "user" (
+    username text primary key,
+    password text,
+    age integer,
+    weight real,
+    gender text,
+    caloriesBurnPerDay integer,
+    workoutDurationPerDay integer,
+    workoutFrequencyPerWeek integer,
+    profilePicture text
+);
+
+create table if not exists "userWorkoutHealth" (
+    workout_id integer not null,
+    timestamp text not null,
+    heartrate real
+);
+create index if not exists user_workout_health_workout on "userWorkoutHealth" (workout_id);
+
+create view if not exists "workoutHeartRateSummary" as
+select w.workout_id, w.username,
+       avg(h.heartrate) as avg_heartrate, min(h.heartrate) as min_heartrate,
+       max(h.heartrate) as max_heartrate, count(h.heartrate) as samples, w.startDT
+from "userWorkouts" w join "userWorkoutHealth" h on h.workout_id = w.workout_id
+group by w.workout_id, w.username, w.startDT;
+
+drop view if exists "dailyHeartRateSummary";
+create view "dailyHeartRateSummary" as
+select w.username, local_day(h.timestamp) as day,
+       avg(h.heartrate) as avg_heartrate, min(h.heartrate) as min_heartrate,
+       max(h.heartrate) as max_heartrate, count(h.heartrate) as samples
+from "userWorkouts" w join "userWorkoutHealth" h on h.workout_id = w.workout_id
+group by w.username, day;
+
+drop view if exists "weeklyHeartRateSummary";
+create view "weeklyHeartRateSummary" as
+select w.username, date(local_day(h.timestamp), 'weekday 0', '-6 days') as week_start,
+       avg(h.heartrate) as avg_heartrate, min(h.heartrate) as min_heartrate,
+       max(h.heartrate) as max_heartrate, count(h.heartrate) as samples
+from "userWorkouts" w join "userWorkoutHealth" h on h.workout_id = w.workout_id
+group by w.username, week_start;
+
+create table if not exists "userDailyRollup" (
+    username text not null,
+    day text not null,
+    workouts integer not null,
+    duration real not null,
+    calories_burned real not null,
+    avg_heartrate real,
+    met_duration_goal integer not null,
+    met_calories_goal integer not null,
+    primary key (username, day)
+);
+
+create table if not exists "userWeeklyRollup" (
+    username text not null,
+    week_start text not null,
+    workouts integer not null,
+    duration real not null,
+    calories_burned real not null,
+    avg_heartrate real,
+    met_frequency_goal integer not null,
+    primary key (username, week_start)
+);
+
+create view if not exists "userLifetimeSummary" as
+select username, sum(workouts) as workouts, sum(duration) as duration, sum(calories_burned) as calories_burned,
+       count(*) as active_days, min(day) as first_day, max(day) as last_day
+from "userDailyRollup"
+group by username;
+
+create table if not exists "userWorkoutSummary" (
+    workout_id integer primary key,
+    username text not null,
+    startDT text not null,
+    duration real not null,
+    avg_heartrate real,
+    max_heartrate real,
+    samples integer not null,
+    zone1_seconds real,
+    zone2_seconds real,
+    zone3_seconds real,
+    zone4_seconds real,
+    zone5_seconds real,
+    calories_burned real,
+    summarized_at text not null default current_timestamp
+);
+create index if not exists user_workout_summary_username on "userWorkoutSummary" (username, startDT);
+
+create view if not exists "unsummarizedWorkouts" as
+select w.* from "userWorkouts" w
+left join "userWorkoutSummary" s on s.workout_id = w.workout_id
+where s.workout_id is null;
+
+create table if not exists "workoutCohortSketch" (
+    id text primary key,
+    workout text not null,
+    cohort text not null,
+    metric text not null,
+    count integer not null,
+    sketch text not null,
+    created_at text not null default current_timestamp
+);
+create index if not exists workout_cohort_sketch_workout on "workoutCohortSketch" (workout, cohort, metric);
+
+create table if not exists "workoutCohortMember" (
+    workout_id integer primary key,
+    sketched_at text not null default current_timestamp
+);
+
+create view if not exists "unsketchedWorkouts" as
+select s.workout_id, s.username, w.workout, s.duration, w.overallAccuracy, s.calories_burned
+from "userWorkoutSummary" s
+join "userWorkouts" w on w.workout_id = s.workout_id
+left join "workoutCohortMember" m on m.workout_id = s.workout_id
+where m.workout_id is null;
+"""
+
+# SQLite stores booleans as 0/1
+DAILY_ROLLUP_FLAGS = {'met_duration_goal': bool, 'met_calories_goal': bool}
+WEEKLY_ROLLUP_FLAGS = {'met_frequency_goal': bool}
+
+
+# Aborts a SQLiteBackend transaction another caller got to first
+class _Conflict(Exception):
+    pass
+
+
+_DISPLAY_ZONE = ZoneInfo(schema.DISPLAY_TIMEZONE)
+
+
+# Calendar day ('YYYY-MM-DD') of an ISO timestamp in the display timezone, read as
+# schema.parse_timestamps reads it (naive values are UTC); local_day() in the SQLite views
+def _local_day(timestamp):
+    if timestamp is None:
+        return None
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(_DISPLAY_ZONE).date().isoformat()
+
+
+class SQLiteBackend(QueryBackend):
+    def __init__(self, path=':memory:'):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.create_function('local_day', 1, _local_day, deterministic=True)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.executescript(SQLITE_SCHEMA)
+
+    # Load rows shaped like the Supabase tables (list of dicts) into a local table
+    def insert(self, table, rows):
+        if not rows:
+            return
+        columns = list(rows[0])
+        placeholders = ', '.join('?' for _ in columns)
+        quoted = ', '.join(f'"{column}"' for column in columns)
+        with self.lock:
+            self.connection.executemany(f'insert into "{table}" ({quoted}) values ({placeholders})',
+                                        [tuple(row.get(column) for column in columns) for row in rows])
+            self.connection.commit()
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return pd.read_sql_query(sql, self.connection, params=params)
+
+    def workout_heart_rate_summary(self, username, start=None, end=None):
+        sql, params = 'select * from "workoutHeartRateSummary" where username = ?', [username]
+        if start is not None:
+            sql, params = sql + ' and datetime(startDT) >= datetime(?)', params + [start]
+        if end is not None:
+            sql, params = sql + ' and datetime(startDT) < datetime(?)', params + [end]
+        return self._query(sql + ' order by workout_id', params)[WORKOUT_SUMMARY_COLUMNS]
+
+    def daily_heart_rate_summary(self, username):
+        return self._query('select * from "dailyHeartRateSummary" where username = ? order by day', (username,))
+
+    def weekly_heart_rate_summary(self, username):
+        return self._query('select * from "weeklyHeartRateSummary" where username = ? order by week_start', (username,))
+
+    def heart_rate_samples(self, workout_ids):
+        workout_ids = list(workout_ids)
+        placeholders = ', '.join('?' for _ in workout_ids) or 'null'
+        return schema.health_frame(self._query(f'select * from "userWorkoutHealth" where workout_id in ({placeholders}) '
+                                               'order by workout_id, timestamp', workout_ids))
+
+    # datetime() normalizes the UTC offsets, so rows written with any offset compare correctly
+    def user_workouts(self, username, start=None, end=None):
+        sql, params = 'select * from "userWorkouts" where username = ?', [username]
+        if start is not None:
+            sql, params = sql + ' and datetime(startDT) >= datetime(?)', params + [start]
+        if end is not None:
+            sql, params = sql + ' and datetime(startDT) < datetime(?)', params + [end]
+        return self._query(sql + ' order by workout_id', params)
+
+    def latest_workout_id(self):
+        with self.lock:
+            latest, = self.connection.execute('select max(workout_id) from "userWorkouts"').fetchone()
+        return latest
+
+    def workouts_after(self, workout_id):
+        return self._query('select workout_id, username, startDT from "userWorkouts" where workout_id > ? '
+                           'order by workout_id', (workout_id,))
+
+    def user_row(self, username):
+        rows = self._query('select * from "user" where username = ?', (username,))
+        return rows.iloc[0].to_dict() if not rows.empty else None
+
+    def _range(self, table, username, column, low, high):
+        sql, params = f'select * from "{table}" where username = ?', [username]
+        if low is not None:
+            sql, params = sql + f' and {column} >= ?', params + [low]
+        if high is not None:
+            sql, params = sql + f' and {column} <= ?', params + [high]
+        return self._query(sql + f' order by {column}', params)
+
+    def daily_rollup(self, username, first_day=None, last_day=None):
+        return self._range(DAILY_ROLLUP_TABLE, username, 'day', first_day, last_day).astype(DAILY_ROLLUP_FLAGS)
+
+    def weekly_rollup(self, username, first_day=None, last_day=None):
+        return self._range(WEEKLY_ROLLUP_TABLE, username, 'week_start', first_day, last_day).astype(WEEKLY_ROLLUP_FLAGS)
+
+    def lifetime_summary(self, username):
+        rows = self._query(f'select * from "{LIFETIME_SUMMARY_VIEW}" where username = ?', (username,))
+        return rows.iloc[0].to_dict() if not rows.empty else None
+
+    # Delete and insert in one transaction, so readers never see a partial range
+    def replace_rollups(self, username, first_day, last_day, daily, weekly):
+        with self.lock, self.connection:
+            for table, column, frame in ((DAILY_ROLLUP_TABLE, 'day', daily), (WEEKLY_ROLLUP_TABLE, 'week_start', weekly)):
+                if first_day is None:
+                    self.connection.execute(f'delete from "{table}" where username = ?', (username,))
+                else:
+                    low = _week_start(first_day) if column == 'week_start' else first_day
+                    self.connection.execute(f'delete from "{table}" where username = ? and {column} between ? and ?',
+                                            (username, low, last_day))
+                rows = _records(frame)
+                if rows:
+                    columns = list(rows[0])
+                    self.connection.executemany(
+                        f'insert into "{table}" ({", ".join(columns)}) values ({", ".join("?" for _ in columns)})',
+                        [tuple(row[column] for column in columns) for row in rows])
+
+    def workout_summaries(self, username, start=None, end=None):
+        sql, params = f'select * from "{WORKOUT_TOTALS_TABLE}" where username = ?', [username]
+        if start is not None:
+            sql, params = sql + ' and datetime(startDT) >= datetime(?)', params + [start]
+        if end is not None:
+            sql, params = sql + ' and datetime(startDT) < datetime(?)', params + [end]
+        return self._query(sql + ' order by startDT', params)[WORKOUT_TOTALS_COLUMNS]
+
+    def upsert_workout_summaries(self, summary):
+        rows = _records(summary[WORKOUT_TOTALS_COLUMNS])
+        if not rows:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f'insert or replace into "{WORKOUT_TOTALS_TABLE}" ({", ".join(WORKOUT_TOTALS_COLUMNS)}) '
+                f'values ({", ".join("?" for _ in WORKOUT_TOTALS_COLUMNS)})',
+                [tuple(row[column] for column in WORKOUT_TOTALS_COLUMNS) for row in rows])
+
+    def unsummarized_workouts(self, workout_id, limit):
+        return self._query(f'select * from "{UNSUMMARIZED_VIEW}" where workout_id > ? order by workout_id limit ?',
+                           (workout_id, limit))
+
+    def unsketched_workouts(self, workout_id, limit):
+        return self._query(f'select * from "{UNSKETCHED_VIEW}" where workout_id > ? order by workout_id limit ?',
+                           (workout_id, limit))[UNSKETCHED_COLUMNS]
+
+    # Raising inside the connection context rolls the transaction back
+    def add_cohort_sketches(self, workout_ids, sketches):
+        rows = _records(sketches[COHORT_SKETCH_COLUMNS])
+        try:
+            with self.lock, self.connection:
+                claimed = self.connection.executemany(
+                    f'insert into "{COHORT_MEMBER_TABLE}" (workout_id) values (?) on conflict do nothing',
+                    [(int(workout_id),) for workout_id in workout_ids]).rowcount
+                if claimed < len(workout_ids):
+                    raise _Conflict
+                self._insert_cohort_sketches(rows)
+        except _Conflict:
+            return False
+        return True
+
+    def cohort_sketches(self, workouts, cohorts=None):
+        workouts = list(workouts)
+        sql = (f'select {", ".join(COHORT_SKETCH_COLUMNS)} from "{COHORT_SKETCH_TABLE}" '
+               f'where workout in ({", ".join("?" for _ in workouts) or "null"})')
+        params = workouts
+        if cohorts is not None:
+            sql += f' and cohort in ({", ".join("?" for _ in cohorts) or "null"})'
+            params = params + list(cohorts)
+        return self._query(sql, params)
+
+    def _insert_cohort_sketches(self, rows):
+        if rows:
+            self.connection.executemany(
+                f'insert into "{COHORT_SKETCH_TABLE}" ({", ".join(COHORT_SKETCH_COLUMNS)}) '
+                f'values ({", ".join("?" for _ in COHORT_SKETCH_COLUMNS)})',
+                [tuple(row[column] for column in COHORT_SKETCH_COLUMNS) for row in rows])
+
+    def merge_cohort_sketches(self, ids, merged):
+        ids = list(ids)
+        try:
+            with self.lock, self.connection:
+                taken = self.connection.execute(
+                    f'delete from "{COHORT_SKETCH_TABLE}" where id in ({", ".join("?" for _ in ids) or "null"})',
+                    ids).rowcount
+                if taken < len(ids):
+                    raise _Conflict
+                self._insert_cohort_sketches([merged])
+        except _Conflict:
+            return False
+        return True
+
+    def reset_cohorts(self):
+        with self.lock, self.connection:
+            self.connection.execute(f'delete from "{COHORT_SKETCH_TABLE}"')
+            self.connection.execute(f'delete from "{COHORT_MEMBER_TABLE}"')
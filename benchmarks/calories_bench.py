@@ -0,0 +1,77 @@
+import argparse
+import numpy as np
+import pandas as pd
+from calories import calculate_calories_burned, calorie_totals
+from benchmarks.synthetic import generate
+from benchmarks.timing import best_of
+
+# Micro-benchmark of the calorie engine against the per-frame arithmetic the dashboard
+# used before (one frame per user: average heart rate per workout, then the gender
+# branch of the formula times the workout duration).
+#
+#   python -m benchmarks.calories_bench --users 200 --workouts 20 --samples 1800
+
+
+# Users, workouts and samples (~1% dropped) with timestamps already parsed, as the app holds them
+def synthetic(users, workouts_per_user, samples_per_workout, seed=0):
+    tables = generate(users, workouts_per_user, samples_per_workout, seed)
+    df_workouts = tables['userWorkouts'].assign(
+        startDT=pd.to_datetime(tables['userWorkouts']['startDT']),
+        endDT=pd.to_datetime(tables['userWorkouts']['endDT']),
+    )
+    df_health = tables['userWorkoutHealth']
+    df_health = df_health[np.random.default_rng(seed).random(len(df_health)) > 0.01]
+    return tables['user'], df_workouts, df_health.assign(timestamp=pd.to_datetime(df_health['timestamp']),
+                                                         heartrate=df_health['heartrate'].astype(np.float64))
+
+
+# Dashboard arithmetic, repeated for every user
+def per_frame(df_users, df_workouts, df_health):
+    totals = []
+    for user in df_users.itertuples():
+        workouts = df_workouts[df_workouts['username'] == user.username]
+        health = df_health[df_health['workout_id'].isin(workouts['workout_id'])]
+        avg_heart_rate = health.groupby('workout_id')['heartrate'].mean().rename('avg_heartbeat').reset_index()
+        workouts = workouts.merge(avg_heart_rate, on='workout_id', how='left')
+        duration = (workouts['endDT'] - workouts['startDT']).dt.total_seconds() / 60
+        if user.gender == "Female":
+            calories = duration * ((0.4472 * workouts['avg_heartbeat']) - (0.1263 * user.weight) + (0.074 * user.age) - 20.4022) / 4.184
+        else:
+            calories = duration * ((0.6309 * workouts['avg_heartbeat']) + (0.1988 * user.weight) + (0.2017 * user.age) - 55.0969) / 4.184
+        totals.append(calories)
+    return pd.concat(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calorie engine micro-benchmark')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--workouts', type=int, default=20, help='workouts per user')
+    parser.add_argument('--samples', type=int, default=1800, help='heart-rate samples per workout')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df_users, df_workouts, df_health = synthetic(args.users, args.workouts, args.samples)
+    print(f"{len(df_users)} users, {len(df_workouts)} workouts, {len(df_health)} samples")
+
+    # Dashboard path: duration x average heart rate for every workout
+    workouts = df_workouts.merge(df_users, on='username')
+    duration = (workouts['endDT'] - workouts['startDT']).dt.total_seconds() / 60
+    heart_rate = pd.Series(np.random.default_rng(1).integers(70, 185, len(workouts)), dtype=np.float64)
+    scalar, _ = best_of(args.repeat, lambda: [
+        calculate_calories_burned(g, d, h, w, a)
+        for g, d, h, w, a in zip(workouts['gender'], duration, heart_rate, workouts['weight'], workouts['age'])
+    ])
+    vector, _ = best_of(args.repeat, calculate_calories_burned,
+                        workouts['gender'], duration, heart_rate, workouts['weight'], workouts['age'])
+    print(f"workout calories   per row: {scalar * 1000:8.1f} ms   vectorized: {vector * 1000:8.1f} ms   ({scalar / vector:.0f}x)")
+
+    # Batch path: the old per-user frame arithmetic vs sample integration for all users at once
+    frame, _ = best_of(args.repeat, per_frame, df_users, df_workouts, df_health)
+    engine, (per_workout, per_day, per_week) = best_of(args.repeat, calorie_totals, df_health, df_workouts, df_users)
+    print(f"batch totals  per-user frames: {frame * 1000:8.1f} ms   engine: {engine * 1000:8.1f} ms   ({frame / engine:.1f}x)"
+          f"   [{len(per_workout)} workouts, {len(per_day)} days, {len(per_week)} weeks]")
+    print(f"engine throughput: {len(df_health) / engine / 1e6:.1f}M samples/s")
+
+
+if __name__ == '__main__':
+    main()
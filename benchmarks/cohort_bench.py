@@ -0,0 +1,120 @@
+import argparse
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+import cohorts
+import summaries
+from analytics import prepare_workouts
+from backend import SQLiteBackend, COHORT_SKETCH_TABLE
+from benchmarks.synthetic import generate
+from benchmarks.timing import best_of
+
+# Cohort sketches against the local SQLite stand-in: summarizes every workout, adds them
+# to the sketches from several concurrent workers (each workout must be counted exactly
+# once), then times one user's cohort comparison from the sketches against the exact
+# percentiles from scanning every user's summarized workouts, and reports the largest
+# percentile difference and the stored sketch sizes.
+#
+#   python -m benchmarks.cohort_bench --users 500 --workouts 100 --workers 4
+
+EXACT_SQL = """
+select w.workout, s.duration, w.overallAccuracy, s.calories_burned, u.age, u.gender
+from "userWorkoutSummary" s
+join "userWorkouts" w on w.workout_id = s.workout_id
+join "user" u on u.username = s.username
+"""
+
+
+def _rows(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+
+def from_sketches(backend, user, df_workouts):
+    sketches = cohorts.load_sketches(backend, user, set(df_workouts['workout']))
+    return cohorts.percentiles(df_workouts, sketches, user)
+
+
+def _percentile(population, values):
+    return 100 * np.median(np.mean(population[:, None] <= values, axis=0)) if len(population) else np.nan
+
+
+# The naive comparison: every summarized workout of every user, ranked exactly
+def exact(backend, user, df_workouts):
+    everyone = backend._query(EXACT_SQL)
+    everyone['cohort'] = [cohorts.user_cohort({'age': age, 'gender': gender})
+                          for age, gender in zip(everyone['age'], everyone['gender'])]
+    cohort = cohorts.user_cohort(user)
+    rows = []
+    for workout, group in df_workouts.groupby('workout', sort=True):
+        same = everyone[everyone['workout'] == workout]
+        for metric, label in cohorts.METRICS.items():
+            values = pd.to_numeric(group[metric], errors='coerce').dropna().to_numpy()
+            if not len(values):
+                continue
+            rows.append({'workout': workout, 'metric': label,
+                         'percentile_all': _percentile(same[metric].dropna().to_numpy(), values),
+                         'percentile_cohort': _percentile(same.loc[same['cohort'] == cohort, metric].dropna().to_numpy(),
+                                                          values)})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cohort sketch benchmark')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--workouts', type=int, default=100, help='workouts per user')
+    parser.add_argument('--samples', type=int, default=20, help='heart-rate samples per workout')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent workers adding to the sketches')
+    parser.add_argument('--batch', type=int, default=cohorts.SKETCH_BATCH_SIZE)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tables = generate(args.users, args.workouts, args.samples)
+    backend = SQLiteBackend()
+    backend.insert('user', _rows(tables['user']))
+    backend.insert('userWorkouts', _rows(tables['userWorkouts']))
+    backend.insert('userWorkoutHealth', _rows(tables['userWorkoutHealth'][['workout_id', 'timestamp', 'heartrate']]))
+    summaries.backfill(backend)
+
+    added = []
+    workers = [threading.Thread(target=lambda: added.append(cohorts.update(backend, args.batch)))
+               for _ in range(args.workers)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    update_seconds = time.perf_counter() - started
+    total = len(tables['userWorkouts'])
+    assert sum(added) == total and cohorts.update(backend) == 0, added
+
+    stored = backend._query(f'select * from "{COHORT_SKETCH_TABLE}"')
+    counts = stored[stored['cohort'] == cohorts.ALL_COHORT].groupby('metric')['count'].sum()
+    assert (counts == total).all(), counts
+    # Compaction leaves few rows per cohort however many batches and workers wrote them
+    for workout in stored['workout'].unique():
+        cohorts.compact(backend, workout, max_rows=1)
+    compacted = backend._query(f'select * from "{COHORT_SKETCH_TABLE}"')
+    assert (compacted[compacted['cohort'] == cohorts.ALL_COHORT].groupby('metric')['count'].sum() == total).all()
+
+    user = backend.user_row(tables['user']['username'].iloc[0])
+    df_workouts = summaries.apply_summaries(prepare_workouts(backend.user_workouts(user['username'])),
+                                            backend.workout_summaries(user['username']))
+    exact_seconds, expected = best_of(args.repeat, exact, backend, user, df_workouts)
+    sketch_seconds, comparison = best_of(args.repeat, from_sketches, backend, user, df_workouts)
+    difference = (comparison[['percentile_all', 'percentile_cohort']].to_numpy()
+                  - expected[['percentile_all', 'percentile_cohort']].to_numpy())
+    sizes = compacted['sketch'].str.len()
+
+    print(f"{args.users} users, {total} workouts, {args.workers} concurrent workers")
+    print(f"update:  {update_seconds:8.2f} s ({total / update_seconds:,.0f} workouts/s in batches of {args.batch}), "
+          f"{len(stored)} sketch rows -> {len(compacted)} after compaction")
+    print(f"sketches: {sizes.mean():,.0f} bytes per row on average (max {sizes.max():,}), "
+          f"{sizes.sum() / 1024:,.1f} KiB in total")
+    print(f"comparison  exact scan: {exact_seconds * 1000:8.1f} ms   sketches: {sketch_seconds * 1000:8.1f} ms")
+    print(f"largest percentile difference: {np.nanmax(np.abs(difference)):.2f} points")
+
+
+if __name__ == '__main__':
+    main()
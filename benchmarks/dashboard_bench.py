@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+import data
+import figures
+import hr_archive
+from analytics import prepare_workouts, rollup_goal_tracking, rollup_weekly_tracking, build_rollup_calendar_events, \
+    DATE_WINDOWS
+from backend import SupabaseBackend
+from calories import calorie_totals
+from schema import health_frame
+import rollups
+from workout import (SECTIONS, analysis_figures, performance_figures, trend_figures, average_heart_rate_figure,
+                     heart_rate_sample_figures, ANALYSIS_COLUMNS, PERFORMANCE_COLUMNS, TREND_COLUMNS)
+from benchmarks.synthetic import generate
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.timing import best_of
+
+# Headless benchmark of the workout dashboard: the pure analytics steps and full page
+# runs through Streamlit's AppTest against a FakeSupabase loaded with synthetic data,
+# at several data sizes. Results are written as JSON and compared with the per-step
+# thresholds in benchmarks/thresholds.json; the exit status is 1 on any regression.
+#
+#   python -m benchmarks.dashboard_bench                      # small + medium
+#   python -m benchmarks.dashboard_bench --sizes large --output results.json
+#   python -m benchmarks.dashboard_bench --write-thresholds   # re-baseline
+
+# size -> (users, workouts per user, heart-rate samples per workout)
+SIZES = {
+    'small': (1, 50, 300),
+    'medium': (5, 250, 600),
+    'large': (20, 1000, 600),
+}
+DEFAULT_SIZES = ('small', 'medium')
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), 'thresholds.json')
+# Thresholds written by --write-thresholds are the measured time times this factor
+THRESHOLD_HEADROOM = 3.0
+# ...but never below this, so millisecond steps do not flag timer noise
+THRESHOLD_FLOOR_SECONDS = 0.05
+PAGE_TIMEOUT_SECONDS = 600
+BENCH_USER = 'user0'
+
+
+def _serialize(figures):
+    return sum(len(figure.to_json()) for figure in figures)
+
+
+# The heart-rate view rows with the calorie engine's per-workout totals, and the prepared
+# workouts with the dashboard's avg_heartbeat and calories_burned columns
+def _workout_calories(prepared, heart_rate_summary, df_health, df_users):
+    per_workout, _, _ = calorie_totals(df_health, prepared, df_users)
+    summary = heart_rate_summary.merge(per_workout[['workout_id', 'calories_burned']], on='workout_id', how='left')
+    columns = summary[['workout_id', 'avg_heartrate', 'calories_burned']].rename(columns={'avg_heartrate': 'avg_heartbeat'})
+    return summary, prepared.merge(columns, on='workout_id', how='left')
+
+
+# Pure steps on BENCH_USER's data, in the order workout_page runs them
+def analytics_steps(tables, client, repeat):
+    user = tables['user'].set_index('username', drop=False).loc[BENCH_USER]
+    workouts = tables['userWorkouts'][tables['userWorkouts']['username'] == BENCH_USER]
+    summary = pd.DataFrame(client.table('workoutHeartRateSummary').select('*').eq('username', BENCH_USER).execute().data)
+    health_samples = tables['userWorkoutHealth'][tables['userWorkoutHealth']['workout_id'].isin(workouts['workout_id'])]
+    health = health_frame(health_samples)
+    today = pd.Timestamp.today()
+    start_of_year = pd.Timestamp(today.year, 1, 1)
+
+    steps = {}
+    steps['prepare_workouts'], prepared = best_of(repeat, prepare_workouts, workouts)
+    steps['merge_and_calories'], (summary, df_workouts) = best_of(
+        repeat, _workout_calories, prepared, summary, health_samples, tables['user'])
+    # What the worker computes on a rebuild; the dashboard reads the stored result
+    steps['build_rollups'], (daily, weekly) = best_of(repeat, rollups.build_rollups, workouts, summary, user.to_dict())
+    steps['goal_tracking'], _ = best_of(repeat, lambda: (
+        rollup_goal_tracking(daily, start_of_year, today),
+        rollup_weekly_tracking(weekly, start_of_year, today),
+    ))
+    steps['calendar_events'], _ = best_of(repeat, build_rollup_calendar_events, daily, weekly,
+                                          user['workoutFrequencyPerWeek'])
+    steps['workout_figures'], _ = best_of(repeat, lambda: _serialize(
+        analysis_figures(df_workouts) + performance_figures(df_workouts) + trend_figures(df_workouts)
+        + [average_heart_rate_figure(df_workouts)]))
+    steps['heart_rate_figures'], _ = best_of(repeat, lambda: _serialize(heart_rate_sample_figures(health)))
+    # A repeat render: every chart served from the figure cache, then serialized
+    figures._cache.clear()
+    cached = lambda: _serialize(
+        figures.cached_figures('analysis', lambda: analysis_figures(df_workouts), df_workouts[ANALYSIS_COLUMNS])
+        + figures.cached_figures('performance', lambda: performance_figures(df_workouts),
+                                 df_workouts[PERFORMANCE_COLUMNS])
+        + figures.cached_figures('trends', lambda: trend_figures(df_workouts), df_workouts[TREND_COLUMNS])
+        + figures.cached_figures('heart_rate_samples', lambda: heart_rate_sample_figures(health), health))
+    cached()
+    steps['cached_figures_repeat'], _ = best_of(repeat, cached)
+    steps['calorie_totals_all_users'], _ = best_of(
+        repeat, calorie_totals, tables['userWorkoutHealth'], tables['userWorkouts'], tables['user'])
+    return {step: {'seconds': seconds} for step, seconds in steps.items()}
+
+
+def _page_script():
+    from workout import workout_page
+    workout_page()
+
+
+# Reset the app's process-wide caches and point it at the fake client
+def _reset_app(client, archive_dir):
+    rollups.stop_worker()
+    data._clients['SUPABASE_KEY'] = client
+    data._clients['SUPABASE_SERVICE_ROLE_KEY'] = client
+    data._cache.clear()
+    data._histories.clear()
+    figures._cache.clear()
+    hr_archive.ARCHIVE_DIR = archive_dir
+    hr_archive._frames.clear()
+
+
+def _timed_run(app, client):
+    client.reset_stats()
+    started = time.perf_counter()
+    app.run()
+    seconds = time.perf_counter() - started
+    if app.exception:
+        raise RuntimeError(f"workout_page raised: {app.exception[0].value}")
+    totals = client.stats().values()
+    return {
+        'seconds': seconds,
+        'requests': sum(entry['requests'] for entry in totals),
+        'rows': sum(entry['rows'] for entry in totals),
+        'bytes': sum(entry['bytes'] for entry in totals),
+    }
+
+
+# Full workout_page runs: cold start, warm rerun, every section, the raw heart-rate charts
+# and a cold start per date range
+def page_steps(client):
+    with tempfile.TemporaryDirectory() as archive_dir:
+        _reset_app(client, archive_dir)
+        # The rollup worker keeps these current in production; build them once up front
+        for username in client.tables['user']['username']:
+            rollups.rebuild(SupabaseBackend(client, cached=False), username)
+        app = AppTest.from_function(_page_script, default_timeout=PAGE_TIMEOUT_SECONDS)
+        app.secrets['SUPABASE_URL'] = client.url
+        app.secrets['SUPABASE_KEY'] = 'benchmark'
+        app.secrets['SUPABASE_SERVICE_ROLE_KEY'] = 'benchmark'
+        app.session_state['username'] = BENCH_USER
+        app.session_state['authenticated'] = True
+
+        steps = {'page_cold': _timed_run(app, client), 'page_rerun': _timed_run(app, client)}
+        for label in SECTIONS:
+            app.sidebar.radio[0].set_value(label)
+            steps[f'section:{label}'] = _timed_run(app, client)
+            if app.toggle:
+                app.toggle[0].set_value(True)
+                steps['heart_rate_samples_cold'] = _timed_run(app, client)
+                steps['heart_rate_samples_rerun'] = _timed_run(app, client)
+                app.toggle[0].set_value(False)
+                app.run()
+        # Cold page load per date range: requests, rows and bytes follow the range, not the history
+        for label in DATE_WINDOWS:
+            _reset_app(client, archive_dir)
+            app.sidebar.selectbox[0].set_value(label)
+            steps[f'window:{label}'] = _timed_run(app, client)
+        rollups.stop_worker()
+        return steps
+
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        users, workouts, samples = SIZES[size]
+        tables = generate(users, workouts, samples)
+        client = FakeSupabase(tables)
+        print(f"[{size}] {users} users x {workouts} workouts x {samples} samples", file=sys.stderr)
+        for kind, steps in (('analytics', analytics_steps(tables, client, repeat)), ('page', page_steps(client))):
+            for step, measured in steps.items():
+                results.append({'size': size, 'kind': kind, 'step': step, **measured})
+                print(f"  {step:<45} {measured['seconds'] * 1000:9.1f} ms", file=sys.stderr)
+    return results
+
+
+def check(results, thresholds):
+    regressions = 0
+    for result in results:
+        threshold = thresholds.get(result['size'], {}).get(result['step'])
+        result['threshold'] = threshold
+        if threshold is None:
+            result['status'] = 'new'
+        elif result['seconds'] > threshold:
+            result['status'] = 'regression'
+            regressions += 1
+        else:
+            result['status'] = 'ok'
+    return regressions
+
+
+def write_thresholds(results, path, headroom):
+    thresholds = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            thresholds = json.load(f)
+    for result in results:
+        threshold = max(result['seconds'] * headroom, THRESHOLD_FLOOR_SECONDS)
+        thresholds.setdefault(result['size'], {})[result['step']] = float(f"{threshold:.3g}")
+    with open(path, 'w') as f:
+        json.dump(thresholds, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Workout dashboard benchmark')
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES), help=f"comma-separated, from {', '.join(SIZES)}")
+    parser.add_argument('--repeat', type=int, default=3, help='runs per analytics step (best is kept)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--thresholds', default=THRESHOLDS_PATH)
+    parser.add_argument('--write-thresholds', action='store_true', help='store measured times x headroom as thresholds')
+    parser.add_argument('--headroom', type=float, default=THRESHOLD_HEADROOM)
+    args = parser.parse_args()
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = set(sizes) - set(SIZES)
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(sorted(unknown))}")
+
+    results = run(sizes, args.repeat)
+    if args.write_thresholds:
+        write_thresholds(results, args.thresholds, args.headroom)
+
+    thresholds = {}
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    regressions = check(results, thresholds)
+
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': {size: dict(zip(('users', 'workouts', 'samples'), SIZES[size])) for size in sizes},
+        'results': results,
+        'regressions': regressions,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    for result in results:
+        if result['status'] == 'regression':
+            print(f"REGRESSION [{result['size']}] {result['step']}: {result['seconds']:.3f}s > {result['threshold']}s",
+                  file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import pandas as pd
+from aiohttp import web
+from benchmarks.fake_supabase import FakeQuery
+
+# FakeSupabase behind HTTP: the subset of the PostgREST API (/rest/v1/<table>) that
+# postgrest-py sends for the queries the app makes, so unmodified supabase clients
+# (the app's, and st_login_form's connection) can point SUPABASE_URL at it. Every
+# request waits `latency` seconds first, standing in for the network round trip and
+# database time; queries then run on the default executor.
+#
+#   GET/HEAD  ?select=a,b&col=eq.1&col=in.(1,2)&order=col.desc&limit=10&offset=20
+#             Prefer: count=exact   Accept: application/vnd.pgrst.object+json (single)
+#   POST      insert; Prefer: resolution=merge-duplicates|ignore-duplicates and
+#             ?on_conflict=a,b make it an upsert
+#   PATCH     update the filtered rows      DELETE  delete them
+#   POST /rest/v1/rpc/<function>   call a FakeSupabase function with the JSON body
+
+OPERATORS = {'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'in'}
+RESERVED_PARAMS = {'select', 'order', 'limit', 'offset', 'columns', 'on_conflict'}
+SINGLE_OBJECT = 'application/vnd.pgrst.object+json'
+
+
+def _error(status, message, code='PGRST000'):
+    return web.json_response({'message': message, 'code': code, 'details': None, 'hint': None}, status=status)
+
+
+def _scalar(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+# Filter values arrive as text; numeric and boolean columns compare as numbers
+def _coerce(frame, column, value):
+    if isinstance(value, list):
+        return [_coerce(frame, column, item) for item in value]
+    if column not in frame or not pd.api.types.is_numeric_dtype(frame[column]):
+        return value
+    if pd.api.types.is_bool_dtype(frame[column]):
+        return value == 'true'
+    number = float(value)
+    return int(number) if number.is_integer() and frame[column].dtype.kind in 'iu' else number
+
+
+# A FakeQuery for the request; raises ValueError on unsupported syntax
+def build_query(client, table, request, body):
+    query = FakeQuery(client, table)
+    prefer = {item.strip() for item in request.headers.get('Prefer', '').split(',') if item.strip()}
+    params = request.query
+
+    if request.method in ('GET', 'HEAD'):
+        count = 'exact' if 'count=exact' in prefer else None
+        query.select(params.get('select', '*'), count=count, head=request.method == 'HEAD')
+        if SINGLE_OBJECT in request.headers.get('Accept', ''):
+            query.single()
+    elif request.method == 'POST':
+        if 'resolution=merge-duplicates' in prefer or 'resolution=ignore-duplicates' in prefer:
+            query.upsert(body, on_conflict=params.get('on_conflict', ''),
+                         ignore_duplicates='resolution=ignore-duplicates' in prefer)
+        else:
+            query.insert(body)
+    elif request.method == 'PATCH':
+        query.update(body)
+    elif request.method == 'DELETE':
+        query.delete()
+
+    frame = client._frame(table)
+    for column, expression in params.items():
+        if column in RESERVED_PARAMS:
+            continue
+        op, _, value = expression.partition('.')
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported filter {column}={expression}")
+        if op == 'in':
+            value = [_scalar(item) for item in value.strip('()').split(',') if item]
+        else:
+            value = _scalar(value)
+        query._filter(column, op, _coerce(frame, column, value))
+
+    for order in params.getall('order', []):
+        for term in order.split(','):
+            column, _, direction = term.partition('.')
+            query.order(column, desc=direction.startswith('desc'))
+    if 'offset' in params or 'limit' in params:
+        offset = int(params.get('offset', 0))
+        query.offset = offset
+        query.stop = offset + int(params['limit']) if 'limit' in params else None
+    return query, prefer
+
+
+def create_app(client, latency=0.0):
+    app = web.Application(client_max_size=64 * 2**20)
+
+    async def handle(request):
+        table = request.match_info['table']
+        body = await request.json() if request.method in ('POST', 'PATCH') and request.can_read_body else None
+        try:
+            query, prefer = build_query(client, table, request, body)
+        except ValueError as e:
+            return _error(400, str(e))
+        if latency:
+            await asyncio.sleep(latency)
+        try:
+            response = await asyncio.get_running_loop().run_in_executor(None, query.execute)
+        except Exception as e:
+            return _error(500, str(e))
+
+        if query.write is not None:
+            if 'return=representation' not in prefer:
+                return web.Response(status=201 if request.method == 'POST' else 204)
+            return web.Response(status=201 if request.method == 'POST' else 200, content_type='application/json',
+                                text=json.dumps(response.data, default=str))
+        headers = {}
+        if response.count is not None:
+            rows = len(response.data) if isinstance(response.data, list) else 1
+            headers['Content-Range'] = f"{query.offset}-{query.offset + rows - 1}/{response.count}" if rows \
+                else f"*/{response.count}"
+        if query.single_row and response.data is None:
+            return _error(406, "JSON object requested, multiple (or no) rows returned", 'PGRST116')
+        return web.Response(content_type='application/json', headers=headers,
+                            text='' if query.head else json.dumps(response.data, default=str))
+
+    async def call(request):
+        function = request.match_info['function']
+        params = await request.json() if request.can_read_body else {}
+        if latency:
+            await asyncio.sleep(latency)
+        try:
+            response = await asyncio.get_running_loop().run_in_executor(None, client._call, function, params)
+        except ValueError as e:
+            return _error(404, str(e), 'PGRST202')
+        except Exception as e:
+            return _error(500, str(e))
+        return web.json_response(response.data)
+
+    app.router.add_route('POST', '/rest/v1/rpc/{function}', call)
+    app.router.add_route('*', '/rest/v1/{table}', handle)
+    return app
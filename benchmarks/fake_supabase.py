@@ -0,0 +1,410 @@
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+import schema
+from backend import UNSKETCHED_COLUMNS
+
+# In-process stand-in for the Supabase client, serving DataFrames through the subset
+# of the postgrest-py query builder the app uses (select/eq/neq/gt/gte/lt/lte/in_/
+# order/range/limit/single, count='exact', head=True, insert/upsert/update/delete)
+# plus the summary views, the rpc functions of sql/cohort_sketches.sql and a storage
+# bucket stub. Equality and in_
+# filters use per-column sorted indexes, so serving a page does not scan the table.
+# An optional per-request latency stands in for the network round trip, and an optional
+# max_rows caps the rows of one select like PostgREST's max-rows setting.
+
+VIEWS = ('workoutHeartRateSummary', 'dailyHeartRateSummary', 'weeklyHeartRateSummary', 'userLifetimeSummary',
+         'unsummarizedWorkouts', 'unsketchedWorkouts')
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.columns = None
+        self.count = None
+        self.head = False
+        self.filters = []  # (column, op, value)
+        self.orders = []  # (column, desc)
+        self.offset, self.stop = 0, None
+        self.single_row = False
+        self.write = None  # (kind, payload)
+        self.on_conflict, self.ignore_duplicates = [], False
+
+    def select(self, columns='*', count=None, head=False):
+        self.columns = None if columns == '*' else [column.strip() for column in columns.split(',')]
+        self.count = count
+        self.head = head
+        return self
+
+    def _filter(self, column, op, value):
+        self.filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def in_(self, column, values):
+        return self._filter(column, 'in', list(values))
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self.offset, self.stop = start, end + 1
+        return self
+
+    def limit(self, count):
+        self.stop = self.offset + count
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.write = ('insert', rows if isinstance(rows, list) else [rows])
+        return self
+
+    def upsert(self, rows, on_conflict='', ignore_duplicates=False, **kwargs):
+        self.write = ('upsert', rows if isinstance(rows, list) else [rows])
+        self.on_conflict = [column for column in on_conflict.split(',') if column]
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values):
+        self.write = ('update', values)
+        return self
+
+    def delete(self):
+        self.write = ('delete', None)
+        return self
+
+    def execute(self):
+        return self.client._execute(self)
+
+
+class FakeRpc:
+    def __init__(self, client, function, params):
+        self.client = client
+        self.function = function
+        self.params = params
+
+    def execute(self):
+        return self.client._call(self.function, self.params)
+
+
+class FakeBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def upload(self, path, file, file_options=None):
+        self.client._record(f'storage:{self.name}', 1, len(file))
+        self.client.objects[(self.name, path)] = bytes(file)
+        return {'Key': f'{self.name}/{path}'}
+
+    def update(self, path, file, file_options=None):
+        return self.upload(path, file, file_options)
+
+    def remove(self, paths):
+        paths = [paths] if isinstance(paths, str) else paths
+        self.client._record(f'storage:{self.name}', len(paths), 0)
+        return [self.client.objects.pop((self.name, path), None) for path in paths]
+
+    def get_public_url(self, path, options=None):
+        return f"{self.client.url}/storage/v1/object/public/{self.name}/{path}"
+
+
+class FakeStorage:
+    def __init__(self, client):
+        self.client = client
+
+    def from_(self, bucket):
+        return FakeBucket(self.client, bucket)
+
+
+class FakeSupabase:
+    def __init__(self, tables, latency=0.0, url='http://fake-supabase', max_rows=None):
+        self.tables = {name: frame.reset_index(drop=True) for name, frame in tables.items()}
+        self.latency = latency
+        self.max_rows = max_rows
+        self.url = url
+        self.storage = FakeStorage(self)
+        self.objects = {}
+        self.calls = []  # (table, rows, bytes) per request
+        self._indexes = {}
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, function, params=None):
+        return FakeRpc(self, function, params or {})
+
+    def _record(self, table, rows, size):
+        with self._lock:
+            self.calls.append((table, rows, size))
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = []
+
+    # Requests, rows and bytes per table since the last reset
+    def stats(self):
+        with self._lock:
+            calls = list(self.calls)
+        totals = {}
+        for table, rows, size in calls:
+            entry = totals.setdefault(table, {'requests': 0, 'rows': 0, 'bytes': 0})
+            entry['requests'] += 1
+            entry['rows'] += rows
+            entry['bytes'] += size
+        return totals
+
+    def _frame(self, name):
+        if name in VIEWS:
+            return self._view(name)
+        return self.tables.setdefault(name, pd.DataFrame())
+
+    def _changed(self, name):
+        if name in ('userWorkouts', 'userWorkoutHealth'):
+            stale = set(VIEWS)
+        elif name == 'userDailyRollup':
+            stale = {'userLifetimeSummary'}
+        elif name == 'userWorkoutSummary':
+            stale = {'unsummarizedWorkouts', 'unsketchedWorkouts'}
+        elif name == 'workoutCohortMember':
+            stale = {'unsketchedWorkouts'}
+        else:
+            stale = set()
+        self._indexes = {key: value for key, value in self._indexes.items() if key[0] != name and key[0] not in stale}
+        for view in stale:
+            self._views.pop(view, None)
+
+    # Views from sql/heart_rate_summaries.sql, sql/rollups.sql, sql/workout_summaries.sql and
+    # sql/cohort_sketches.sql, materialized until the tables change
+    def _view(self, name):
+        view = self._views.get(name)
+        if view is not None:
+            return view
+        if name in ('userLifetimeSummary', 'unsummarizedWorkouts', 'unsketchedWorkouts'):
+            view = {'userLifetimeSummary': self._lifetime_summary, 'unsummarizedWorkouts': self._unsummarized,
+                    'unsketchedWorkouts': self._unsketched}[name]()
+            self._views[name] = view
+            return view
+        workouts = self.tables['userWorkouts'][['workout_id', 'username', 'startDT']]
+        samples = self.tables['userWorkoutHealth'][['workout_id', 'timestamp', 'heartrate']].merge(workouts, on='workout_id')
+        # Calendar days in the display timezone, as the views group them
+        day = schema.parse_timestamps(samples['timestamp']).dt.tz_localize(None).dt.normalize()
+        keys = {
+            'workoutHeartRateSummary': [samples['workout_id'], samples['username'], samples['startDT']],
+            'dailyHeartRateSummary': [samples['username'], day.dt.strftime('%Y-%m-%d').rename('day')],
+            'weeklyHeartRateSummary': [samples['username'], (day - pd.to_timedelta(day.dt.weekday, unit='D'))
+                                       .dt.strftime('%Y-%m-%d').rename('week_start')],
+        }[name]
+        view = samples['heartrate'].groupby(keys).agg(
+            avg_heartrate='mean', min_heartrate='min', max_heartrate='max', samples='count').reset_index()
+        if 'startDT' in view:
+            view = view[[column for column in view.columns if column != 'startDT'] + ['startDT']]
+        self._views[name] = view
+        return view
+
+    def _lifetime_summary(self):
+        daily = self.tables.get('userDailyRollup')
+        if daily is None or daily.empty:
+            return pd.DataFrame(columns=['username', 'workouts', 'duration', 'calories_burned', 'active_days',
+                                         'first_day', 'last_day'])
+        return daily.groupby('username').agg(
+            workouts=('workouts', 'sum'), duration=('duration', 'sum'), calories_burned=('calories_burned', 'sum'),
+            active_days=('day', 'count'), first_day=('day', 'min'), last_day=('day', 'max')).reset_index()
+
+    def _unsummarized(self):
+        workouts = self.tables['userWorkouts']
+        summaries = self.tables.get('userWorkoutSummary')
+        if summaries is None or summaries.empty:
+            return workouts
+        return workouts[~workouts['workout_id'].isin(summaries['workout_id'])].reset_index(drop=True)
+
+    def _unsketched(self):
+        summaries = self.tables.get('userWorkoutSummary')
+        if summaries is None or summaries.empty:
+            return pd.DataFrame(columns=UNSKETCHED_COLUMNS)
+        workouts = self.tables['userWorkouts'][['workout_id', 'workout', 'overallAccuracy']]
+        view = summaries.merge(workouts.astype({'workout_id': summaries['workout_id'].dtype}), on='workout_id')
+        members = self.tables.get('workoutCohortMember')
+        if members is not None and not members.empty:
+            view = view[~view['workout_id'].isin(members['workout_id'].astype(view['workout_id'].dtype))]
+        return view[UNSKETCHED_COLUMNS].reset_index(drop=True)
+
+    # The functions of sql/cohort_sketches.sql; each checks and writes under the lock, so
+    # it is all or nothing like the Postgres transaction
+    def _call(self, function, params):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if function == 'add_cohort_sketches':
+                result = self._add_cohort_sketches(params['workout_ids'], params['sketches'])
+            elif function == 'merge_cohort_sketches':
+                result = self._merge_cohort_sketches(params['ids'], params['merged'])
+            else:
+                raise ValueError(f"Unknown function {function}")
+        self._record(f'rpc:{function}', 1, len(json.dumps(params)))
+        return FakeResponse(result)
+
+    def _append(self, name, rows):
+        frame = self.tables.get(name)
+        added = pd.DataFrame(rows)
+        self.tables[name] = added if frame is None or frame.empty else pd.concat([frame, added], ignore_index=True)
+        self._changed(name)
+
+    def _add_cohort_sketches(self, workout_ids, sketches):
+        members = self.tables.get('workoutCohortMember')
+        if members is not None and not members.empty and members['workout_id'].isin(workout_ids).any():
+            return False
+        self._append('workoutCohortMember', [{'workout_id': workout_id} for workout_id in workout_ids])
+        self._append('workoutCohortSketch', sketches)
+        return True
+
+    def _merge_cohort_sketches(self, ids, merged):
+        stored = self.tables.get('workoutCohortSketch', pd.DataFrame(columns=['id']))
+        taken = stored['id'].isin(ids)
+        if taken.sum() < len(set(ids)):
+            return False
+        self.tables['workoutCohortSketch'] = stored[~taken].reset_index(drop=True)
+        self._append('workoutCohortSketch', [merged])
+        return True
+
+    # Sorted (values, row positions) of a column, built once per table version
+    def _index(self, name, frame, column):
+        key = (name, column)
+        index = self._indexes.get(key)
+        if index is None:
+            values = frame[column].to_numpy()
+            order = np.argsort(values, kind='stable')
+            index = (values[order], order)
+            self._indexes[key] = index
+        return index
+
+    def _positions(self, query, frame):
+        positions = None
+        remaining = []
+        for column, op, value in query.filters:
+            # Tables that were never written to have no columns yet, so nothing matches
+            if column not in frame:
+                return np.empty(0, dtype=np.int64)
+            if op in ('eq', 'in') and column in frame:
+                values, order = self._index(query.table, frame, column)
+                wanted = np.unique(np.asarray([value] if op == 'eq' else value, dtype=values.dtype)) \
+                    if len(values) else np.asarray([])
+                bounds = zip(np.searchsorted(values, wanted, 'left'), np.searchsorted(values, wanted, 'right'))
+                matched = np.concatenate([order[lo:hi] for lo, hi in bounds] or [np.empty(0, dtype=np.int64)])
+                positions = matched if positions is None else np.intersect1d(positions, matched)
+            else:
+                remaining.append((column, op, value))
+        positions = np.sort(positions) if positions is not None else np.arange(len(frame))
+
+        for column, op, value in remaining:
+            column_values = frame[column].to_numpy()[positions]
+            if op == 'in':
+                keep = np.isin(column_values, value)
+            else:
+                if column_values.dtype == object:
+                    value = str(value)
+                keep = {'eq': np.equal, 'neq': np.not_equal, 'gt': np.greater, 'gte': np.greater_equal,
+                        'lt': np.less, 'lte': np.less_equal}[op](column_values, value)
+            positions = positions[np.asarray(keep, dtype=bool)]
+        return positions
+
+    def _execute(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if query.write is not None:
+                data = self._write(query)
+            else:
+                data = None
+        if data is not None:
+            self._record(query.table, len(data), len(json.dumps(data, default=str)))
+            return FakeResponse(data)
+
+        with self._lock:
+            frame = self._frame(query.table)
+            positions = self._positions(query, frame)
+            count = len(positions) if query.count else None
+            rows = frame.iloc[positions]
+            if query.orders and len(rows):
+                rows = rows.sort_values([column for column, _ in query.orders],
+                                        ascending=[not desc for _, desc in query.orders], kind='stable')
+            rows = rows.iloc[query.offset:query.stop]
+            if self.max_rows is not None:
+                rows = rows.iloc[:self.max_rows]
+            if query.columns is not None:
+                rows = rows[query.columns]
+            data = [] if query.head else json.loads(rows.to_json(orient='records', date_format='iso'))
+
+        self._record(query.table, len(data), len(json.dumps(data)))
+        if query.single_row:
+            data = data[0] if data else None
+        return FakeResponse(data, count)
+
+    # Apply an insert/upsert/update/delete and return the affected rows
+    def _write(self, query):
+        kind, payload = query.write
+        frame = self._frame(query.table)
+        if kind in ('insert', 'upsert'):
+            added = pd.DataFrame(payload)
+            # Upserts conflict on on_conflict, or the first column standing in for the primary key
+            keys = query.on_conflict if kind == 'upsert' and query.on_conflict else frame.columns[:1].tolist()
+            rows = payload
+            if kind == 'upsert' and keys and all(key in added for key in keys) and len(frame):
+                existing = pd.MultiIndex.from_frame(frame[keys].astype(str))
+                conflicts = pd.MultiIndex.from_frame(added[keys].astype(str))
+                if query.ignore_duplicates:
+                    new = ~conflicts.isin(existing)
+                    added = added[new]
+                    rows = [row for row, keep in zip(payload, new) if keep]
+                else:
+                    frame = frame[~existing.isin(conflicts)]
+            self.tables[query.table] = pd.concat([frame, added], ignore_index=True)
+        else:
+            positions = self._positions(query, frame)
+            rows = json.loads(frame.iloc[positions].to_json(orient='records', date_format='iso'))
+            if kind == 'update':
+                frame = frame.copy()
+                for column, value in payload.items():
+                    if column not in frame:
+                        frame[column] = None
+                    frame[column] = frame[column].astype(object)
+                    frame.iloc[positions, frame.columns.get_loc(column)] = value
+                rows = [{**row, **payload} for row in rows]
+            else:
+                frame = frame.drop(index=frame.index[positions]).reset_index(drop=True)
+            self.tables[query.table] = frame
+        self._changed(query.table)
+        return rows
@@ -0,0 +1,82 @@
+import asyncio
+import itertools
+from datetime import datetime, timezone
+import numpy as np
+import socketio
+from aiohttp import web
+from live import LIVE_EVENT
+
+# Stand-in for the trainer server: POST /start and /stop after `latency` seconds, and a
+# socket.io endpoint pushing one heart-rate sample per second to every subscribed live
+# feed. A stop records the workout like the real server does: a userWorkouts row plus
+# one userWorkoutHealth sample per second of it, written to the FakeSupabase client.
+# Retried stops carrying an already seen Idempotency-Key are not recorded again.
+
+WATCH_URL = 'http://127.0.0.1/fake-trainer/watch.mp4'
+SAMPLE_SECONDS = 1.0
+
+
+def create_app(client, latency=0.0, seed=0):
+    app = web.Application()
+    sio = socketio.AsyncServer(async_mode='aiohttp')
+    sio.attach(app)
+    rng = np.random.default_rng(seed)
+    recorded = set()
+    stats = {'start': 0, 'stop': 0, 'recorded': 0}
+    next_id = itertools.count(int(client.tables['userWorkouts']['workout_id'].max()) + 1
+                              if len(client.tables.get('userWorkouts', ())) else 1)
+
+    def record(payload):
+        now = datetime.now(timezone.utc)
+        started = datetime.strptime(payload['startDT'], '%Y-%m-%dT%H:%M:%S%z')
+        workout_id = next(next_id)
+        client.table('userWorkouts').insert({
+            'workout_id': workout_id, 'username': payload['username'], 'workout': payload['workout'],
+            'startDT': started.astimezone(timezone.utc).isoformat(), 'endDT': now.isoformat(),
+            'reps': int(rng.integers(5, 50)), 'overallAccuracy': float(rng.random() * 100),
+        }).execute()
+        seconds = max(int((now - started).total_seconds()), 1)
+        timestamps = np.datetime64(started.astimezone(timezone.utc).replace(tzinfo=None), 's') + np.arange(seconds)
+        client.table('userWorkoutHealth').insert([
+            {'workout_id': workout_id, 'timestamp': f'{timestamp}+00:00', 'heartrate': int(heartrate)}
+            for timestamp, heartrate in zip(timestamps, rng.integers(80, 160, seconds))]).execute()
+
+    async def start(request):
+        await request.json()
+        await asyncio.sleep(latency)
+        stats['start'] += 1
+        return web.json_response({'watch_url': WATCH_URL})
+
+    async def stop(request):
+        payload = await request.json()
+        await asyncio.sleep(latency)
+        stats['stop'] += 1
+        key = request.headers.get('Idempotency-Key')
+        if key not in recorded:
+            recorded.add(key)
+            await asyncio.get_running_loop().run_in_executor(None, record, payload)
+            stats['recorded'] += 1
+        return web.json_response({'status': 'stopped'})
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    @sio.on('subscribe')
+    async def subscribe(sid, payload):
+        await sio.enter_room(sid, 'live')
+
+    async def emit_samples(app):
+        async def loop():
+            while True:
+                await asyncio.sleep(SAMPLE_SECONDS)
+                await sio.emit(LIVE_EVENT, {'timestamp': datetime.now(timezone.utc).isoformat(),
+                                            'heartrate': int(rng.integers(80, 160))}, room='live')
+        task = asyncio.create_task(loop())
+        yield
+        task.cancel()
+
+    app.router.add_post('/start', start)
+    app.router.add_post('/stop', stop)
+    app.router.add_get('/stats', get_stats)
+    app.cleanup_ctx.append(emit_samples)
+    return app
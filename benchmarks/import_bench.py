@@ -0,0 +1,171 @@
+import argparse
+import ast
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+# Cold-start import budget. Each step imports modules in a fresh interpreter with
+# `-X importtime`, as a new container does:
+#
+#   login           the module-level imports of streamlit_app.py (what every cold process
+#                   pays before it can serve the login screen)
+#   page:<name>     a page module imported on top of the login path (paid on the first
+#                   run routed to that page)
+#
+# The best time of --repeat runs is compared with benchmarks/import_budget.json, and the
+# login path must not load any of LOGIN_EXCLUDED; the exit status is 1 on either. The
+# heaviest top-level imports of each step are listed from the -X importtime output.
+#
+#   python -m benchmarks.import_bench
+#   python -m benchmarks.import_bench --write-budget   # re-baseline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, 'streamlit_app.py')
+BUDGET_PATH = os.path.join(os.path.dirname(__file__), 'import_budget.json')
+PAGES = ('workout', 'profile')
+# Dependencies only the pages need; importing any of them on the login path is a regression
+LOGIN_EXCLUDED = ('workout', 'profile', 'data', 'pandas', 'numpy', 'plotly.express', 'pytz', 'requests',
+                  'streamlit_calendar', 'socketio')
+# Budgets written by --write-budget are the measured time times this factor
+BUDGET_HEADROOM = 1.5
+BUDGET_FLOOR_SECONDS = 0.05
+TOP_IMPORTS = 5
+MARKER = '--- measured imports ---'
+
+_PROGRAM = f"""
+import json, sys, time
+exec(sys.argv[1])
+sys.stderr.write({MARKER!r} + '\\n')
+sys.stderr.flush()
+started = time.perf_counter()
+exec(sys.argv[2])
+print(json.dumps({{'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}}))
+"""
+
+
+# The module-level import statements of the Streamlit entry point
+def app_imports(path=APP_PATH):
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    return '\n'.join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+# [(module, cumulative seconds)] of the top-level imports after the marker, heaviest first
+def parse_importtime(stderr):
+    _, _, measured = stderr.partition(MARKER)
+    imports = []
+    for line in measured.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented past the single space after the separator
+        if cumulative.strip().isdigit() and not name[1:].startswith(' '):
+            imports.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(imports, key=lambda item: item[1], reverse=True)
+
+
+# One fresh interpreter: run prelude, then time statement
+def measure(prelude, statement):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', _PROGRAM, prelude, statement],
+                             cwd=ROOT, env=env, capture_output=True, text=True)
+    if process.returncode:
+        raise RuntimeError(f"importing failed:\n{process.stderr[-2000:]}")
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result['imports'] = parse_importtime(process.stderr)
+    return result
+
+
+def run(repeat):
+    login = app_imports()
+    steps = {'login': ('', login)}
+    steps.update({f'page:{page}': (login, f'import {page}') for page in PAGES})
+    results = []
+    for step, (prelude, statement) in steps.items():
+        measure(prelude, statement)  # Writes the bytecode caches, as an image built with them would hold
+        runs = [measure(prelude, statement) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run['seconds'])
+        result = {'step': step, 'seconds': best['seconds'],
+                  'top_imports': [{'module': name, 'seconds': seconds} for name, seconds in best['imports'][:TOP_IMPORTS]]}
+        if step == 'login':
+            result['excluded_loaded'] = [name for name in LOGIN_EXCLUDED if name in best['modules']]
+        results.append(result)
+        print(f"  {step:<15} {best['seconds'] * 1000:8.1f} ms   "
+              + ', '.join(f"{name} {seconds * 1000:.0f}" for name, seconds in best['imports'][:TOP_IMPORTS]),
+              file=sys.stderr)
+    return results
+
+
+def check(results, budget):
+    failures = 0
+    for result in results:
+        result['budget'] = budget.get(result['step'])
+        if result.get('excluded_loaded'):
+            result['status'] = 'excluded module loaded'
+        elif result['budget'] is None:
+            result['status'] = 'new'
+        elif result['seconds'] > result['budget']:
+            result['status'] = 'regression'
+        else:
+            result['status'] = 'ok'
+        failures += result['status'] not in ('ok', 'new')
+    return failures
+
+
+def write_budget(results, path, headroom):
+    budget = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            budget = json.load(f)
+    for result in results:
+        budget[result['step']] = float(f"{max(result['seconds'] * headroom, BUDGET_FLOOR_SECONDS):.3g}")
+    with open(path, 'w') as f:
+        json.dump(budget, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start import budget')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per step (best is kept)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--budget', default=BUDGET_PATH)
+    parser.add_argument('--write-budget', action='store_true', help='store measured times x headroom as the budget')
+    parser.add_argument('--headroom', type=float, default=BUDGET_HEADROOM)
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.write_budget:
+        write_budget(results, args.budget, args.headroom)
+
+    budget = {}
+    if os.path.exists(args.budget):
+        with open(args.budget) as f:
+            budget = json.load(f)
+    failures = check(results, budget)
+
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+        'failures': failures,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    for result in results:
+        if result['status'] == 'regression':
+            print(f"REGRESSION {result['step']}: {result['seconds']:.3f}s > {result['budget']}s", file=sys.stderr)
+        elif result['status'] == 'excluded module loaded':
+            print(f"REGRESSION {result['step']} imports {', '.join(result['excluded_loaded'])}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
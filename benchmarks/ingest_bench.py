@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+import aiohttp
+import numpy as np
+import pandas as pd
+from aiohttp import web
+from ingest import create_app, supabase_writer
+from benchmarks.fake_supabase import FakeSupabase
+
+# Load test of the ingestion service: the aiohttp app on localhost writing to a
+# FakeSupabase with a per-request latency, and hundreds of simulated wearables each
+# posting small batches for one workout as fast as they are acknowledged. Reports
+# sustained samples/s, post latency, and how many samples each insert request carried
+# (write amplification), then checks every acknowledged sample was stored.
+#
+#   python -m benchmarks.ingest_bench --workouts 500 --batch 5 --seconds 20 --latency 0.05
+
+TOKEN = 'benchmark'
+
+
+async def wearable(session, url, workout_id, batch, deadline, latencies, acked):
+    started_at = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(hours=workout_id)
+    sent = 0
+    while time.monotonic() < deadline:
+        samples = [{'timestamp': (started_at + timedelta(seconds=sent + i)).isoformat(),
+                    'heartrate': 60 + (sent + i) % 120} for i in range(batch)]
+        posted = time.perf_counter()
+        async with session.post(url, json={'workout_id': workout_id, 'samples': samples}) as response:
+            await response.read()
+            if response.status == 200:
+                latencies.append(time.perf_counter() - posted)
+                acked.append(batch)
+                sent += batch
+            else:
+                # Backpressure or a failed write: back off, then re-send the same samples
+                await asyncio.sleep(float(response.headers.get('Retry-After', 1)))
+
+
+async def run(workouts, batch, seconds, latency):
+    client = FakeSupabase({'userWorkoutHealth': pd.DataFrame(columns=['workout_id', 'timestamp', 'heartrate'])},
+                          latency=latency)
+    runner = web.AppRunner(create_app(supabase_writer(client), TOKEN))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f'http://127.0.0.1:{port}/samples'
+
+    latencies, acked = [], []
+    started = time.monotonic()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0),
+                                     headers={'Authorization': f'Bearer {TOKEN}'}) as session:
+        await asyncio.gather(*(wearable(session, url, workout_id, batch, started + seconds, latencies, acked)
+                               for workout_id in range(1, workouts + 1)))
+        async with session.get(f'http://127.0.0.1:{port}/health') as response:
+            health = await response.json()
+    elapsed = time.monotonic() - started
+    await runner.cleanup()
+    return client, health, latencies, sum(acked), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Heart-rate ingestion load test')
+    parser.add_argument('--workouts', type=int, default=300, help='concurrent workouts (one wearable each)')
+    parser.add_argument('--batch', type=int, default=5, help='samples per post')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per fake insert request')
+    args = parser.parse_args()
+
+    client, health, latencies, acked, elapsed = asyncio.run(run(args.workouts, args.batch, args.seconds, args.latency))
+    stored = client.tables['userWorkoutHealth']
+    unique = len(stored.drop_duplicates(['workout_id', 'timestamp']))
+    inserts = health['inserts']
+
+    print(f"{args.workouts} workouts posting {args.batch} samples at a time for {elapsed:.1f}s, "
+          f"{args.latency * 1000:.0f} ms per insert")
+    print(f"sustained: {acked / elapsed:,.0f} samples/s in {len(latencies) / elapsed:,.0f} posts/s")
+    print(f"post latency  p50: {np.percentile(latencies, 50) * 1000:.0f} ms   p99: {np.percentile(latencies, 99) * 1000:.0f} ms")
+    print(f"inserts: {inserts} ({acked / max(inserts, 1):,.0f} samples per insert, "
+          f"{len(latencies) / max(inserts, 1):,.1f} posts per insert)   retries: {health['retries']}   "
+          f"rejected: {health['rejected']}")
+    # At-least-once: every acknowledged sample must be stored
+    print(f"stored: {len(stored)} rows, {unique} unique samples, {acked} acknowledged"
+          + ("" if unique >= acked else "   MISSING SAMPLES"))
+
+
+if __name__ == '__main__':
+    main()
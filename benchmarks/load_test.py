@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import aiohttp
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from benchmarks.synthetic import generate
+
+# Concurrent-session load test. A child process serves the synthetic tables through a
+# fake PostgREST endpoint (fake_postgrest.py) and runs a fake trainer server
+# (fake_trainer.py), each with a configurable latency. The app runs as a real
+# `streamlit run` server, which runs one script thread per session; this process
+# drives N sessions at once over Streamlit's websocket protocol, the way browsers do.
+# Every session logs in, loads workout_page, switches section, starts and stops a
+# workout, then opens and saves profile_page and goes back. A render is one rerun
+# request until its script finishes, including any st.rerun() it triggers; Start and
+# Stop count from the click until the request finished, including the 1 s fragment polls.
+#
+# Each concurrency level gets a fresh app server, warmed up by one session that loads
+# the login page. It reports p50/p95/p99 render latency, renders/s and the server's
+# RSS growth per session.
+#
+#   python -m benchmarks.load_test --concurrency 1,5,10,25 --db-latency 0.02 --trainer-latency 0.1
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'streamlit_app.py')
+LOGIN_PASSWORD = 'Load-test-1!'
+# Placeholder key; the fake endpoints accept any
+SUPABASE_KEY = 'load-test.anon.key'
+SERVER_START_SECONDS = 60
+RENDER_TIMEOUT_SECONDS = 120
+RSS_SAMPLE_SECONDS = 0.05
+# Sections the sessions switch to, a mix of rollup- and chart-heavy ones (see workout.SECTIONS)
+SECTIONS = ['Overall Goal Tracking', 'Workout Analysis', 'Heart Rate Analysis', 'Over Time Trend Analysis']
+
+
+# Child process: the fake Supabase and trainer servers; puts (supabase port, trainer port) on ready
+def serve(ready, users, workouts, samples, db_latency, trainer_latency):
+    import argon2
+    from aiohttp import web
+    from benchmarks import fake_postgrest, fake_trainer
+    from benchmarks.fake_supabase import FakeSupabase
+
+    tables = generate(users, workouts, samples)
+    tables['user']['password'] = argon2.PasswordHasher().hash(LOGIN_PASSWORD)
+    client = FakeSupabase(tables)
+
+    async def main():
+        ports = []
+        for app in (fake_postgrest.create_app(client, db_latency), fake_trainer.create_app(client, trainer_latency)):
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            ports.append(site._server.sockets[0].getsockname()[1])
+        ready.put(tuple(ports))
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def rss_bytes(pid):
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+def _free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# `streamlit run streamlit_app.py` in a scratch directory holding its secrets (pointing it
+# at the fake servers) and config
+class AppServer:
+    def __init__(self, supabase_url, trainer_url, directory):
+        self.port = _free_port()
+        os.makedirs(os.path.join(directory, '.streamlit'), exist_ok=True)
+        secrets = (f'SUPABASE_URL = "{supabase_url}"\nSUPABASE_KEY = "{SUPABASE_KEY}"\n'
+                   f'SUPABASE_SERVICE_ROLE_KEY = "{SUPABASE_KEY}"\n')
+        with open(os.path.join(directory, '.streamlit', 'secrets.toml'), 'w') as file:
+            # st_login_form's connection reads its own section
+            file.write(f'TRAINER_URL = "{trainer_url}"\n' + secrets + '\n[connections.supabase]\n' + secrets)
+        with open(os.path.join(directory, '.streamlit', 'config.toml'), 'w') as file:
+            file.write('[server]\nheadless = true\nfileWatcherType = "none"\n\n'
+                       '[browser]\ngatherUsageStats = false\n')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', APP_PATH, '--server.port', str(self.port)],
+            cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.url = f'http://127.0.0.1:{self.port}'
+
+    async def wait_ready(self, http):
+        deadline = time.monotonic() + SERVER_START_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                async with http.get(f'{self.url}/_stcore/health') as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError("The app server did not start")
+
+    def rss(self):
+        return rss_bytes(self.process.pid)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+# One browser tab: a websocket session holding the widget values it has sent
+class Session:
+    def __init__(self, http, app_url, username):
+        self.http = http
+        self.app_url = app_url
+        self.username = username
+        self.ws = None
+        self.widgets = {}  # (element type, label) -> widget proto of the last full run
+        self.values = {}  # widget id -> WidgetState sent on every rerun
+        self.fragments = set()  # Fragments the page asked to re-run periodically
+        self.timings = []  # (step, seconds) per render
+
+    async def connect(self):
+        self.ws = await self.http.ws_connect(f'{self.app_url.replace("http", "ws", 1)}/_stcore/stream',
+                                             protocols=('streamlit',), max_msg_size=0)
+
+    async def close(self):
+        await self.ws.close()
+
+    def _widget(self, kind, label):
+        widget = self.widgets.get((kind, label))
+        if widget is None:
+            raise LookupError(f"{self.username}: no {kind} labelled {label!r}")
+        return widget
+
+    # Text inputs and radios both send their value as a string
+    def set_value(self, kind, label, value):
+        widget = self._widget(kind, label)
+        self.values[widget.id] = WidgetState(id=widget.id, string_value=value)
+
+    # Send a rerun (with a button click, or of one fragment) and wait until the script
+    # finishes; returns True when the whole page ran
+    async def _rerun(self, click=None, fragment_id=None):
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.page_script_hash = ''
+        for state in self.values.values():
+            message.rerun_script.widget_states.widgets.add().CopyFrom(state)
+        if click is not None:
+            message.rerun_script.widget_states.widgets.add(id=self._widget('button', click).id, trigger_value=True)
+        if fragment_id is not None:
+            message.rerun_script.fragment_id = fragment_id
+            message.rerun_script.is_auto_rerun = True
+        await self.ws.send_bytes(message.SerializeToString())
+
+        widgets, errors, fragments = {}, [], set()
+        while True:
+            received = await self.ws.receive(timeout=RENDER_TIMEOUT_SECONDS)
+            if received.type != aiohttp.WSMsgType.BINARY:
+                raise RuntimeError(f"{self.username}: websocket closed ({received.type.name})")
+            forward = ForwardMsg()
+            forward.ParseFromString(received.data)
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type == 'exception':
+                    errors.append(element.exception.message)
+                proto = getattr(element, element_type)
+                if hasattr(proto, 'label') and hasattr(proto, 'id'):
+                    widgets[(element_type, proto.label)] = proto
+            elif kind == 'auto_rerun':
+                fragments.add(forward.auto_rerun.fragment_id)
+            elif kind == 'script_finished':
+                status = forward.script_finished
+                if status == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    # st.rerun(): the whole page runs next
+                    widgets, errors, fragments = {}, [], set()
+                    continue
+                if errors:
+                    raise RuntimeError(f"{self.username}: {errors[0]}")
+                if status == ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY:
+                    return False
+                self.widgets, self.fragments = widgets, fragments
+                return True
+
+    async def render(self, step, click=None):
+        started = time.perf_counter()
+        await self._rerun(click)
+        self.timings.append((step, time.perf_counter() - started))
+
+    # Click Start/Stop, then re-run the page's polling fragments every second (as the
+    # browser does) until the request finishes and the page reruns
+    async def trainer_action(self, step, click):
+        started = time.perf_counter()
+        await self._rerun(click)
+        while self.fragments:
+            await asyncio.sleep(1)
+            if any([await self._rerun(fragment_id=fragment_id) for fragment_id in sorted(self.fragments)]):
+                break
+        self.timings.append((step, time.perf_counter() - started))
+
+    async def login(self):
+        await self.render('login_form')
+        self.set_value('text_input', 'Your username', self.username)
+        self.set_value('text_input', 'Your password', LOGIN_PASSWORD)
+        await self.render('login', click='Log in')
+        self._widget('button', 'Go to profile')
+        # Form fields are only sent with their submit
+        self.values.clear()
+
+    async def run(self, iterations, sections):
+        await self.connect()
+        try:
+            await self.login()
+            for section in sections[:iterations]:
+                await self.render('workout_page')
+                self.set_value('radio', 'Section', section)
+                await self.render('section')
+                await self.trainer_action('start_workout', 'Start Workout')
+                await self.trainer_action('stop_workout', 'Stop Workout')
+                await self.render('profile_page', click='Go to profile')
+                await self.render('save_profile', click='Save Changes')
+                await self.render('back_to_workout', click='Go to Workout Page')
+        finally:
+            await self.close()
+
+
+async def run_level(concurrency, users, supabase_url, trainer_url, iterations):
+    with tempfile.TemporaryDirectory() as directory:
+        server = AppServer(supabase_url, trainer_url, directory)
+        try:
+            async with aiohttp.ClientSession() as http:
+                await server.wait_ready(http)
+                # Imports and first-run setup happen once per server, not per session
+                warmup = Session(http, server.url, 'user0')
+                await warmup.connect()
+                await warmup.render('login_form')
+                await warmup.close()
+                baseline = peak = server.rss()
+
+                sessions = [Session(http, server.url, f'user{i % users}') for i in range(concurrency)]
+                started = time.perf_counter()
+                # Sessions visit the sections in turn, each starting at a different one
+                visits = [[SECTIONS[(i + j) % len(SECTIONS)] for j in range(iterations)] for i in range(concurrency)]
+                tasks = asyncio.gather(*(session.run(iterations, sections) for session, sections in zip(sessions, visits)),
+                                       return_exceptions=True)
+                while not tasks.done():
+                    peak = max(peak, server.rss())
+                    await asyncio.wait([tasks], timeout=RSS_SAMPLE_SECONDS)
+                elapsed = time.perf_counter() - started
+                errors = [str(result) for result in tasks.result() if isinstance(result, BaseException)]
+        finally:
+            server.stop()
+
+    timings = [seconds for session in sessions for _, seconds in session.timings]
+    steps = {}
+    for session in sessions:
+        for step, seconds in session.timings:
+            steps.setdefault(step, []).append(seconds)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) if timings else (np.nan,) * 3
+    return {
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'renders': len(timings),
+        'renders_per_second': len(timings) / elapsed,
+        'p50': p50, 'p95': p95, 'p99': p99,
+        'steps_p95': {step: float(np.percentile(values, 95)) for step, values in steps.items()},
+        'rss_baseline_mb': baseline / 2**20,
+        'rss_peak_mb': peak / 2**20,
+        'rss_per_session_mb': (peak - baseline) / 2**20 / concurrency,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent-session load test')
+    parser.add_argument('--concurrency', default='1,5,10', help='comma-separated session counts, run in order')
+    parser.add_argument('--users', type=int, default=None, help='distinct users (default: the highest concurrency)')
+    parser.add_argument('--workouts', type=int, default=100, help='workouts per user')
+    parser.add_argument('--samples', type=int, default=120, help='heart-rate samples per workout')
+    parser.add_argument('--iterations', type=int, default=1, help='workout -> profile rounds per session')
+    parser.add_argument('--db-latency', type=float, default=0.02, help='seconds per fake PostgREST request')
+    parser.add_argument('--trainer-latency', type=float, default=0.1, help='seconds per fake /start or /stop')
+    parser.add_argument('--output', help='also write the JSON report here')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    users = args.users or max(levels)
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    fakes = context.Process(target=serve, args=(ready, users, args.workouts, args.samples, args.db_latency,
+                                                args.trainer_latency), daemon=True)
+    fakes.start()
+    try:
+        supabase_port, trainer_port = ready.get(timeout=300)
+        supabase_url = f'http://127.0.0.1:{supabase_port}'
+        trainer_url = f'http://127.0.0.1:{trainer_port}'
+
+        print(f"{users} users x {args.workouts} workouts x {args.samples} samples, "
+              f"{args.db_latency * 1000:.0f} ms per query, {args.trainer_latency * 1000:.0f} ms per trainer call")
+        print(f"{'sessions':>8} {'renders':>8} {'renders/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'RSS MB':>8} {'MB/session':>10} {'errors':>7}")
+        results = []
+        for concurrency in levels:
+            result = asyncio.run(run_level(concurrency, users, supabase_url, trainer_url, args.iterations))
+            results.append(result)
+            print(f"{concurrency:>8} {result['renders']:>8} {result['renders_per_second']:>10.1f} "
+                  f"{result['p50'] * 1000:>8.0f} {result['p95'] * 1000:>8.0f} {result['p99'] * 1000:>8.0f} "
+                  f"{result['rss_peak_mb']:>8.0f} {result['rss_per_session_mb']:>10.1f} {len(result['errors']):>7}")
+            for error in result['errors'][:3]:
+                print(f"         {error}")
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(results, output, indent=2, default=float)
+    finally:
+        fakes.terminate()
+
+
+if __name__ == '__main__':
+    main()
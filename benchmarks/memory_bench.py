@@ -0,0 +1,48 @@
+import argparse
+import json
+import pandas as pd
+from schema import workouts_frame, health_frame
+from benchmarks.synthetic import generate
+
+# Per-session memory of one user's workout and heart-rate frames: frames built from
+# the JSON rows as they arrive (with the workout start/end copied onto every sample,
+# as the heart-rate charts used to) against the compact dtypes from schema.py.
+#
+#   python -m benchmarks.memory_bench --workouts 1000 --samples 600
+
+
+def _megabytes(*frames):
+    return sum(frame.memory_usage(deep=True).sum() for frame in frames) / 1024 ** 2
+
+
+def _rows(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Workout frame memory benchmark')
+    parser.add_argument('--workouts', type=int, default=250, help='workouts of the user')
+    parser.add_argument('--samples', type=int, default=600, help='heart-rate samples per workout')
+    args = parser.parse_args()
+
+    tables = generate(1, args.workouts, args.samples)
+    workout_rows, health_rows = _rows(tables['userWorkouts']), _rows(tables['userWorkoutHealth'])
+
+    raw_workouts, raw_health = pd.DataFrame(workout_rows), pd.DataFrame(health_rows)
+    merged = raw_health.merge(raw_workouts[['workout_id', 'startDT', 'endDT']], on='workout_id', how='left')
+    merged['timestamp'] = pd.to_datetime(merged['timestamp'])
+    before = {'workouts': _megabytes(raw_workouts), 'samples': _megabytes(raw_health, merged)}
+
+    compact_workouts, compact_health = workouts_frame(workout_rows), health_frame(health_rows)
+    after = {'workouts': _megabytes(compact_workouts), 'samples': _megabytes(compact_health)}
+
+    print(f"{len(raw_workouts)} workouts, {len(raw_health)} samples")
+    for name in before:
+        print(f"{name:<10} raw: {before[name]:8.2f} MB   compact: {after[name]:8.2f} MB   "
+              f"({before[name] / after[name]:.1f}x)")
+    total_before, total_after = sum(before.values()), sum(after.values())
+    print(f"{'total':<10} raw: {total_before:8.2f} MB   compact: {total_after:8.2f} MB   ({total_before / total_after:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
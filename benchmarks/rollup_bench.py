@@ -0,0 +1,169 @@
+import argparse
+import json
+import numpy as np
+import pandas as pd
+from analytics import prepare_workouts, rollup_goal_tracking, rollup_weekly_tracking
+from backend import SQLiteBackend
+from calories import calorie_totals
+import rollups
+from benchmarks.synthetic import generate
+from benchmarks.timing import best_of
+
+# Rollup worker against the local SQLite stand-in: a full rebuild of every user, then
+# new workouts arrive and only their weeks are refreshed. The refreshed tables are
+# checked against a fresh rebuild and against the dashboard's per-page aggregation,
+# and both dashboard paths (aggregate every workout vs read the rollups) are timed.
+#
+#   python -m benchmarks.rollup_bench --users 20 --workouts 500 --new 20
+
+
+def _rows(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+
+def _load(backend, tables, workout_ids):
+    workouts = tables['userWorkouts'][tables['userWorkouts']['workout_id'].isin(workout_ids)]
+    health = tables['userWorkoutHealth'][tables['userWorkoutHealth']['workout_id'].isin(workout_ids)]
+    backend.insert('userWorkouts', _rows(workouts))
+    backend.insert('userWorkoutHealth', _rows(health[['workout_id', 'timestamp', 'heartrate']]))
+
+
+def _snapshot(backend, usernames):
+    return {username: (backend.daily_rollup(username), backend.weekly_rollup(username)) for username in usernames}
+
+
+def _same(snapshot, expected):
+    for username, frames in snapshot.items():
+        for frame, expected_frame in zip(frames, expected[username]):
+            pd.testing.assert_frame_equal(frame.reset_index(drop=True), expected_frame.reset_index(drop=True))
+
+
+# The dashboard's old per-page aggregation, which the rollup tables replaced, kept here as
+# the reference they are checked against: the per-day goal tracking frame between start
+# and end (inclusive)
+def daily_goal_tracking(df_workouts, start, end, duration_goal=None, calories_goal=None):
+    days = pd.DataFrame({'workout_date': pd.date_range(start=start, end=end)})
+    if df_workouts.empty:
+        daily = pd.DataFrame({'workout_date': pd.Series(dtype='datetime64[ns]'),
+                              'duration': pd.Series(dtype=float),
+                              'calories_burned': pd.Series(dtype=float)})
+    else:
+        daily = df_workouts.assign(workout_date=pd.to_datetime(df_workouts['workout_date'])).groupby('workout_date').agg({
+            'duration': 'mean',
+            'calories_burned': 'sum'
+        }).reset_index()
+
+    days['workout_date'] = days['workout_date'].astype(daily['workout_date'].dtype)
+    goal_tracking = days.merge(daily, on='workout_date', how='left')
+    goal_tracking['duration'] = goal_tracking['duration'].fillna(0)
+    goal_tracking['calories_burned'] = goal_tracking['calories_burned'].fillna(0)
+
+    # Track if the daily goals were met or not
+    goal_tracking['met_duration_goal'] = goal_tracking['duration'] >= duration_goal if duration_goal is not None else False
+    goal_tracking['met_calories_goal'] = goal_tracking['calories_burned'] >= calories_goal if calories_goal else False
+    goal_tracking['worked_out'] = goal_tracking['duration'] > 0
+    return goal_tracking
+
+
+# Number of workouts, mean duration and total calories per ISO (year, week)
+def weekly_rollup(df_workouts):
+    if df_workouts.empty:
+        return pd.DataFrame({'year': pd.Series(dtype='int64'), 'week': pd.Series(dtype='int64'),
+                             'duration': pd.Series(dtype=float), 'calories_burned': pd.Series(dtype=float),
+                             'workouts_per_week': pd.Series(dtype='int64')})
+
+    iso = pd.to_datetime(df_workouts['startDT']).dt.isocalendar()
+    weekly_stats = df_workouts.assign(year=iso['year'].astype('int64'), week=iso['week'].astype('int64')).groupby(['year', 'week']).agg({
+        'duration': 'mean',
+        'calories_burned': 'sum',
+        'startDT': 'count'  # Number of workouts per week
+    }).reset_index().rename(columns={'startDT': 'workouts_per_week'})
+    return weekly_stats
+
+
+# Weekly stats aligned to every Monday between start and end; weeks without workouts have a count of 0
+def weekly_goal_tracking(df_workouts, start, end):
+    mondays = pd.date_range(start=start, end=end, freq='W-MON')
+    weeks = pd.DataFrame({
+        'start_of_week': mondays,
+        'year': np.asarray(mondays.year, dtype='int64'),
+        'week': np.asarray(mondays.isocalendar()['week'], dtype='int64'),
+    })
+    weeks = weeks.merge(weekly_rollup(df_workouts), on=['year', 'week'], how='left')
+    weeks['workouts_per_week'] = weeks['workouts_per_week'].fillna(0).astype('int64')
+    return weeks
+
+
+# The dashboard's old per-page aggregation for one user
+def per_page(backend, user):
+    df_workouts = prepare_workouts(backend.user_workouts(user['username']))
+    per_workout, _, _ = calorie_totals(backend.heart_rate_samples(df_workouts['workout_id'].tolist()),
+                                       df_workouts, pd.DataFrame([user]))
+    df_workouts = df_workouts.merge(per_workout[['workout_id', 'calories_burned']], on='workout_id', how='left')
+    today = pd.Timestamp.today()
+    start_of_year = pd.Timestamp(today.year, 1, 1)
+    return (daily_goal_tracking(df_workouts, start_of_year, today, user['workoutDurationPerDay'], user['caloriesBurnPerDay']),
+            weekly_goal_tracking(df_workouts, start_of_year, today))
+
+
+def from_rollups(backend, user):
+    today = pd.Timestamp.today()
+    start_of_year = pd.Timestamp(today.year, 1, 1)
+    return (rollup_goal_tracking(backend.daily_rollup(user['username']), start_of_year, today),
+            rollup_weekly_tracking(backend.weekly_rollup(user['username']), start_of_year, today))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rollup worker benchmark')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--workouts', type=int, default=250, help='workouts per user')
+    parser.add_argument('--samples', type=int, default=60, help='heart-rate samples per workout')
+    parser.add_argument('--new', type=int, default=10, help='workouts (highest ids) that arrive after the rebuild')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tables = generate(args.users, args.workouts, args.samples)
+    workouts = tables['userWorkouts']
+    # The poll finds new workouts by id, so the ones arriving late are the highest ids
+    newest = workouts['workout_id'].rank(ascending=False) <= args.new
+    usernames = list(tables['user']['username'])
+
+    backend = SQLiteBackend()
+    backend.insert('user', _rows(tables['user']))
+    _load(backend, tables, workouts.loc[~newest, 'workout_id'])
+
+    rebuild, _ = best_of(1, lambda: [rollups.rebuild(backend, username) for username in usernames])
+    watermark = backend.latest_workout_id()
+    _load(backend, tables, workouts.loc[newest, 'workout_id'])
+
+    # What the worker's poll does: the days of workouts past the watermark, refreshed per user
+    new_workouts = backend.workouts_after(watermark)
+    days = rollups.local_days(new_workouts['startDT'])
+    touched = {username: set(user_days) for username, user_days in days.groupby(new_workouts['username'].to_numpy())}
+    refresh, _ = best_of(1, lambda: [rollups.refresh_days(backend, username, user_days)
+                                     for username, user_days in touched.items()])
+    refreshed = _snapshot(backend, usernames)
+
+    for username in usernames:
+        rollups.rebuild(backend, username)
+    _same(refreshed, _snapshot(backend, usernames))
+
+    user = backend.user_row(usernames[0])
+    page_seconds, (goal_tracking, weeks) = best_of(args.repeat, per_page, backend, user)
+    rollup_seconds, (rollup_tracking, rollup_weeks) = best_of(args.repeat, from_rollups, backend, user)
+    columns = ['workout_date', 'duration', 'calories_burned', 'met_duration_goal', 'met_calories_goal', 'worked_out']
+    active = goal_tracking['duration'] > 0
+    pd.testing.assert_frame_equal(goal_tracking.loc[active, columns], rollup_tracking.loc[active, columns],
+                                  check_dtype=False)
+    assert np.array_equal(weeks['workouts_per_week'], rollup_weeks['workouts_per_week'])
+
+    print(f"{len(usernames)} users, {len(workouts)} workouts, {int(newest.sum())} new in "
+          f"{sum(len(user_days) for user_days in touched.values())} days")
+    print(f"full rebuild: {rebuild * 1000:8.1f} ms   incremental refresh: {refresh * 1000:8.1f} ms")
+    print(f"dashboard goal tracking  per-page aggregation: {page_seconds * 1000:8.1f} ms   "
+          f"rollup tables: {rollup_seconds * 1000:8.1f} ms")
+    print("refreshed rollups match a full rebuild and the per-page aggregation")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import summaries
+from streaming import StatsTracker, WorkoutStats, WINDOW_SECONDS, EWMA_HALF_LIFE_SECONDS
+
+# Streaming heart-rate statistics for many concurrent live workouts: feeds interleaved
+# 1 Hz samples of every workout into one StatsTracker, as a trainer server multiplexing
+# its sessions would, and reports samples/s and the memory held per workout. One
+# workout's statistics are checked against pandas rolling windows and the zone times of
+# summaries.summarize() over the same samples, and must not change when samples without a
+# heart rate are interleaved.
+#
+#   python -m benchmarks.streaming_bench --workouts 5000 --seconds 600 --batch 1
+
+
+def _samples(rng, workouts, seconds):
+    start = time.time() - seconds
+    timestamps = start + np.arange(seconds, dtype=np.float64)
+    # A random walk per workout, so the rolling maximum and zones actually move
+    steps = rng.normal(0, 2, size=(seconds, workouts)).cumsum(axis=0)
+    heartrate = np.clip(np.rint(rng.uniform(90, 150, size=workouts) + steps), 50, 210)
+    return timestamps, heartrate
+
+
+def feed(tracker, timestamps, heartrate, batch):
+    workouts = heartrate.shape[1]
+    for begin in range(0, len(timestamps), batch):
+        chunk_times = timestamps[begin:begin + batch].tolist()
+        chunk = heartrate[begin:begin + batch].T.tolist()
+        for workout in range(workouts):
+            tracker.update(workout, zip(chunk_times, chunk[workout]))
+
+
+def check(timestamps, heartrate, age):
+    stats = WorkoutStats(age)
+    for timestamp, value in zip(timestamps.tolist(), heartrate.tolist()):
+        stats.update(timestamp, value)
+
+    index = pd.to_datetime(timestamps, unit='s')
+    series = pd.Series(heartrate, index=index)
+    window = series.rolling(f'{WINDOW_SECONDS:.0f}s')
+    assert np.isclose(stats.window_mean, window.mean().iloc[-1])
+    assert stats.window_max == window.max().iloc[-1] and stats.peak == heartrate.max()
+    ewma = heartrate[0]
+    for elapsed, value in zip(np.diff(timestamps), heartrate[1:]):
+        ewma = value + (ewma - value) * 0.5 ** (elapsed / EWMA_HALF_LIFE_SECONDS)
+    assert np.isclose(stats.ewma, ewma)
+
+    # Samples without a heart rate between the others change nothing
+    gapped = WorkoutStats(age)
+    for timestamp, value in zip(timestamps.tolist(), heartrate.tolist()):
+        gapped.update(timestamp, value)
+        gapped.update(timestamp + 0.5, None)
+        gapped.update(timestamp + 0.75, float('nan'))
+    assert gapped.snapshot() == stats.snapshot()
+
+    start, end = pd.Timestamp(timestamps[0], unit='s', tz='UTC'), pd.Timestamp(timestamps[-1], unit='s', tz='UTC')
+    df_workouts = pd.DataFrame({'workout_id': [1], 'username': ['user0'],
+                                'startDT': [start.isoformat()], 'endDT': [end.isoformat()]})
+    df_health = pd.DataFrame({'workout_id': 1, 'timestamp': index.tz_localize('UTC').map(pd.Timestamp.isoformat),
+                              'heartrate': heartrate})
+    summary = summaries.summarize(df_workouts, df_health, {'user0': {'weight': 70, 'age': age, 'gender': 'Male'}})
+    zones = summary[[f'zone{zone}_seconds' for zone in range(1, len(summaries.HEART_RATE_ZONES) + 1)]].iloc[0]
+    np.testing.assert_allclose(stats.zone_seconds, zones.to_numpy(dtype=float))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming heart-rate statistics benchmark')
+    parser.add_argument('--workouts', type=int, default=2000, help='concurrent live workouts')
+    parser.add_argument('--seconds', type=int, default=600, help='1 Hz samples per workout')
+    parser.add_argument('--batch', type=int, default=1, help='samples per workout per update (socket.io batch)')
+    parser.add_argument('--age', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    timestamps, heartrate = _samples(rng, args.workouts, args.seconds)
+    check(timestamps, heartrate[:, 0], args.age)
+
+    tracker = StatsTracker()
+    for workout in range(args.workouts):
+        tracker.start(workout, args.age)
+    started = time.perf_counter()
+    feed(tracker, timestamps, heartrate, args.batch)
+    seconds = time.perf_counter() - started
+
+    # State once every window is full: what each running workout holds from then on
+    tracemalloc.start()
+    tracker = StatsTracker()
+    for workout in range(args.workouts):
+        tracker.start(workout, args.age)
+    warm = int(WINDOW_SECONDS) * 2
+    feed(tracker, timestamps[:warm], heartrate[:warm], warm)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples = args.workouts * args.seconds
+    alerts = sum(tracker.workouts[workout].alert for workout in range(args.workouts))
+    print(f"{args.workouts} workouts x {args.seconds} samples, {args.batch} sample(s) per update")
+    print(f"update: {seconds:8.2f} s   {samples / seconds:,.0f} samples/s   {seconds / samples * 1e6:.2f} us/sample")
+    print(f"state:  {held / args.workouts / 1024:8.2f} KiB per workout with a full "
+          f"{WINDOW_SECONDS:.0f}s window   {alerts} alerting")
+    print("ewma, window mean/max and zone times match pandas rolling and summaries.summarize()")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from analytics import prepare_workouts
+from backend import SQLiteBackend
+from calories import calorie_totals
+import summaries
+from benchmarks.synthetic import generate
+from benchmarks.timing import best_of
+
+# Write-time workout summaries against the local SQLite stand-in: backfills every
+# workout in batches, then times one user's dashboard columns recomputed from the
+# heart-rate view and the calorie engine's batch totals against reading the stored
+# summaries, and checks both give the same duration, average heart rate and calories.
+#
+#   python -m benchmarks.summary_bench --users 20 --workouts 500 --batch 200
+
+
+def _rows(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+
+def recomputed(backend, user):
+    df_workouts = prepare_workouts(backend.user_workouts(user['username']))
+    heart_rate = backend.workout_heart_rate_summary(user['username'])
+    per_workout, _, _ = calorie_totals(backend.heart_rate_samples(df_workouts['workout_id'].tolist()),
+                                       df_workouts, pd.DataFrame([user]))
+    return (df_workouts
+            .merge(heart_rate[['workout_id', 'avg_heartrate']].rename(columns={'avg_heartrate': 'avg_heartbeat'}),
+                   on='workout_id', how='left')
+            .merge(per_workout[['workout_id', 'calories_burned']], on='workout_id', how='left'))
+
+
+def stored(backend, user):
+    df_workouts = prepare_workouts(backend.user_workouts(user['username']))
+    summary, _ = summaries.load_summaries(backend, user, df_workouts)
+    return summaries.apply_summaries(df_workouts, summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Workout summary benchmark')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--workouts', type=int, default=250, help='workouts per user')
+    parser.add_argument('--samples', type=int, default=600, help='heart-rate samples per workout')
+    parser.add_argument('--batch', type=int, default=summaries.BACKFILL_BATCH_SIZE, help='workouts per backfill batch')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    tables = generate(args.users, args.workouts, args.samples)
+    backend = SQLiteBackend()
+    backend.insert('user', _rows(tables['user']))
+    backend.insert('userWorkouts', _rows(tables['userWorkouts']))
+    backend.insert('userWorkoutHealth', _rows(tables['userWorkoutHealth'][['workout_id', 'timestamp', 'heartrate']]))
+
+    started = time.perf_counter()
+    summarized = summaries.backfill(backend, args.batch)
+    backfill_seconds = time.perf_counter() - started
+    assert summarized == len(tables['userWorkouts']) and summaries.backfill(backend, args.batch) == 0
+
+    user = backend.user_row(tables['user']['username'].iloc[0])
+    old_seconds, old = best_of(args.repeat, recomputed, backend, user)
+    new_seconds, new = best_of(args.repeat, stored, backend, user)
+    for column in ('duration', 'avg_heartbeat', 'calories_burned'):
+        np.testing.assert_allclose(new[column].astype(float), old[column].astype(float), rtol=1e-9)
+
+    print(f"{args.users} users, {summarized} workouts, {len(tables['userWorkoutHealth'])} samples")
+    print(f"backfill: {backfill_seconds:8.2f} s ({summarized / backfill_seconds:,.0f} workouts/s "
+          f"in batches of {args.batch})")
+    print(f"dashboard columns  recomputed: {old_seconds * 1000:8.1f} ms   stored: {new_seconds * 1000:8.1f} ms")
+    print("stored summaries match the recomputed columns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+# Synthetic data shaped like the Supabase tables: N users x M workouts x K heart-rate
+# samples. Columns and value formats follow what PostgREST returns (timestamps as
+# ISO-8601 strings in UTC), so the frames can be served by FakeSupabase unchanged.
+
+WORKOUT_NAMES = ['Squat', 'Push Up', 'Lunge', 'Bicep Curl']
+HISTORY_DAYS = 270  # Workouts are spread over this many days before `end`
+
+
+def _iso(values):
+    return np.char.add(np.datetime_as_string(np.asarray(values, dtype='datetime64[s]'), unit='s'), '+00:00').astype(object)
+
+
+def _username(index):
+    return f'user{index}'
+
+
+# Dict of DataFrames keyed by table name: 'user', 'workouts', 'userWorkouts', 'userWorkoutHealth'
+def generate(users=1, workouts=50, samples=600, seed=0, end=None):
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.now(tz='UTC').floor('h') if end is None else pd.Timestamp(end)
+
+    usernames = np.array([_username(i) for i in range(users)], dtype=object)
+    df_users = pd.DataFrame({
+        'username': usernames,
+        'password': 'x',
+        'age': rng.integers(16, 70, users),
+        'weight': rng.integers(45, 110, users).astype(float),
+        'gender': rng.choice(['Male', 'Female'], users),
+        'caloriesBurnPerDay': rng.integers(200, 800, users),
+        'workoutDurationPerDay': rng.integers(15, 90, users),
+        'workoutFrequencyPerWeek': rng.integers(1, 7, users),
+        'profilePicture': None,
+    })
+
+    # Each user's workouts are spread over the history window, in start order
+    count = users * workouts
+    offsets = np.sort(rng.integers(0, HISTORY_DAYS * 24 * 3600, (users, workouts)), axis=1).ravel()
+    starts = (end - pd.Timedelta(days=HISTORY_DAYS)).tz_convert('UTC').tz_localize(None).to_datetime64() \
+        + offsets.astype('timedelta64[s]')
+    durations = rng.integers(10 * 60, 60 * 60, count).astype('timedelta64[s]')
+    workout_ids = np.arange(1, count + 1)
+    df_workouts = pd.DataFrame({
+        'workout_id': workout_ids,
+        'username': np.repeat(usernames, workouts),
+        'workout': rng.choice(WORKOUT_NAMES, count),
+        'startDT': _iso(starts),
+        'endDT': _iso(starts + durations),
+        'reps': rng.integers(5, 50, count),
+        'overallAccuracy': rng.random(count) * 100,
+    })
+
+    # K samples evenly spread over each workout; heart rate is a bounded random walk
+    positions = np.tile(np.arange(samples), count)
+    sample_offsets = (np.repeat(durations.astype(np.int64), samples) * positions) // max(samples, 1)
+    steps = rng.integers(-3, 4, (count, samples))
+    base = rng.integers(80, 140, (count, 1))
+    heartrate = np.clip(base + np.cumsum(steps, axis=1), 50, 200).ravel()
+    df_health = pd.DataFrame({
+        'id': np.arange(1, count * samples + 1),
+        'workout_id': np.repeat(workout_ids, samples),
+        'timestamp': _iso(np.repeat(starts, samples) + sample_offsets.astype('timedelta64[s]')),
+        'heartrate': heartrate,
+    })
+
+    return {
+        'user': df_users,
+        'workouts': pd.DataFrame({'name': WORKOUT_NAMES}),
+        'userWorkouts': df_workouts,
+        'userWorkoutHealth': df_health,
+    }
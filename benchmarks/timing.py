@@ -0,0 +1,14 @@
+import time
+
+# Timing helpers shared by the benchmark scripts
+
+
+# Best wall time over `repeat` calls of fn(*args), and the result of the last call
+def best_of(repeat, fn, *args):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
@@ -0,0 +1,62 @@
+import argparse
+import os
+import tempfile
+import cv2
+import numpy as np
+from video_analysis import analyze_video
+
+# Throughput of the video analysis engine on a synthetic workout video: a figure doing
+# squats (its top edge moving down and back up once per rep) in front of a static,
+# noisy background. Each configuration reports how many frames per second it consumes,
+# how much faster than real time that is and the CPU seconds per second of video, and
+# checks the counted reps against the ones drawn.
+#
+#   python -m benchmarks.video_bench --seconds 60 --workers 1,2,4 --steps 1,2
+
+
+# Write an MP4 of `reps` squats at the given tempo to path; returns the number of frames
+def synthetic_video(path, seconds=30, fps=30, reps=10, width=640, height=480, seed=0):
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 80, (height, width, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    frames = int(seconds * fps)
+    # Standing for the first and last second, reps evenly spread in between
+    t = np.arange(frames) / fps
+    phase = np.clip((t - 1) / max(seconds - 2, 1e-9), 0, 1) * reps
+    depth = (1 - np.cos(2 * np.pi * phase)) / 2  # 0 standing, 1 at the bottom of the rep
+    for index in range(frames):
+        frame = background.copy()
+        top = int(height * (0.15 + 0.3 * depth[index]))
+        cv2.rectangle(frame, (width // 2 - 60, top), (width // 2 + 60, height - 20), (200, 180, 160), -1)
+        cv2.circle(frame, (width // 2, top), 40, (220, 200, 180), -1)
+        writer.write(frame)
+    writer.release()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Video analysis throughput benchmark')
+    parser.add_argument('--seconds', type=float, default=30, help='length of the synthetic video')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--reps', type=int, default=10)
+    parser.add_argument('--workers', default='1,2', help='comma-separated process pool sizes')
+    parser.add_argument('--steps', default='1,2', help='comma-separated frame steps')
+    parser.add_argument('--batch', type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'squats.mp4')
+        frames = synthetic_video(path, args.seconds, args.fps, args.reps)
+        print(f"{frames} frames at {args.fps} fps, {args.reps} reps, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'step':>4} {'frames/s':>9} {'x realtime':>10} {'CPU s/video s':>13} {'reps':>5} {'accuracy':>8}")
+        for workers in [int(value) for value in args.workers.split(',')]:
+            for step in [int(value) for value in args.steps.split(',')]:
+                result = analyze_video(path, 'Squat', frame_step=step, batch_frames=args.batch, workers=workers)
+                measured = result['metrics']
+                print(f"{workers:>7} {step:>4} {measured['throughput_fps']:>9.0f} {measured['realtime_factor']:>10.1f} "
+                      f"{measured['cpu_per_video_second']:>13.3f} {result['reps']:>5} {result['overallAccuracy']:>8.1f}"
+                      + ("" if result['reps'] == args.reps else f"   expected {args.reps} reps"))
+
+
+if __name__ == '__main__':
+    main()
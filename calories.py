@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+from schema import DISPLAY_TIMEZONE
+from zones import MAX_SAMPLE_GAP_SECONDS
+
+# Heart-rate based calorie engine. The rate formula (kcal per minute from heart rate,
+# weight and age) is evaluated on whole arrays, so the same code serves one
+# dashboard user or a batch job over every user's samples.
+
+# (heart rate, weight, age, intercept) coefficients of the kJ/min formula per gender
+COEFFICIENTS = {
+    "Female": (0.4472, -0.1263, 0.074, -20.4022),
+    "Male": (0.6309, 0.1988, 0.2017, -55.0969),
+}
+KJ_PER_KCAL = 4.184
+
+
+# The formula is linear in heart rate: kcal/min = slope * heart_rate + intercept, where slope
+# depends on gender and intercept on gender, weight and age. Arguments are scalars or arrays;
+# unknown genders get 0 for both.
+def formula_terms(gender, weight, age):
+    gender = np.asarray(gender)
+    conditions = [gender == name for name in COEFFICIENTS]
+    hr_coef, weight_coef, age_coef, intercept = (
+        np.select(conditions, [coefficients[i] for coefficients in COEFFICIENTS.values()], default=0.0)
+        for i in range(4)
+    )
+    intercept = weight_coef * np.asarray(weight, dtype=np.float64) + age_coef * np.asarray(age, dtype=np.float64) + intercept
+    return hr_coef / KJ_PER_KCAL, intercept / KJ_PER_KCAL
+
+
+# kcal burned per minute; every argument may be a scalar or an array
+def calories_per_minute(gender, heart_rate, weight, age):
+    slope, intercept = formula_terms(gender, weight, age)
+    return slope * np.asarray(heart_rate, dtype=np.float64) + intercept
+
+
+# kcal for a duration (minutes) at an average heart rate; accepts scalars, arrays or Series
+def calculate_calories_burned(gender, duration, heart_rate, weight, age):
+    calories = np.asarray(duration, dtype=np.float64) * calories_per_minute(gender, heart_rate, weight, age)
+    if isinstance(duration, pd.Series):
+        return pd.Series(calories, index=duration.index)
+    if isinstance(heart_rate, pd.Series):
+        return pd.Series(calories, index=heart_rate.index)
+    return calories[()] if calories.ndim == 0 else calories
+
+
+def _epoch_ns(timestamps):
+    timestamps = pd.Series(timestamps)
+    if not isinstance(timestamps.dtype, pd.DatetimeTZDtype) and not pd.api.types.is_datetime64_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, utc=True, format='ISO8601')
+    return timestamps.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+# Seconds credited to every sample: the time until the next sample of the same workout,
+# capped at max_gap_seconds (the last sample of a workout gets 0), aligned with the input rows
+def sample_seconds(workout_ids, timestamps, max_gap_seconds=MAX_SAMPLE_GAP_SECONDS):
+    workout_ids = np.asarray(workout_ids)
+    timestamps = _epoch_ns(timestamps)
+    seconds = np.zeros(len(timestamps))
+    if len(timestamps) < 2:
+        return seconds
+    order = np.lexsort((timestamps, workout_ids))
+    ids, ts = workout_ids[order], timestamps[order]
+    seconds[order[:-1]] = np.minimum(np.where(ids[1:] == ids[:-1], np.diff(ts) / 1e9, 0.0), max_gap_seconds)
+    return seconds
+
+
+# kcal of every sample, integrated over the time until the next sample of the same workout
+# (trapezoidal, so it follows the heart rate between samples). The last sample of a workout
+# and samples with a missing heart rate contribute 0; gaps longer than max_gap_seconds are
+# credited for max_gap_seconds at the last known rate. gender/weight/age are scalars or
+# per-sample arrays. Returns an array aligned with the input rows.
+def sample_calories(workout_ids, timestamps, heart_rates, gender, weight, age, max_gap_seconds=MAX_SAMPLE_GAP_SECONDS):
+    slope, intercept = formula_terms(gender, weight, age)
+    return _integrate(workout_ids, _epoch_ns(timestamps), heart_rates, slope, intercept, max_gap_seconds)
+
+
+# sample_calories on epoch-nanosecond timestamps and per-sample (or scalar) formula terms
+def _integrate(workout_ids, timestamps, heart_rates, slope, intercept, max_gap_seconds=MAX_SAMPLE_GAP_SECONDS):
+    workout_ids = np.asarray(workout_ids)
+    heart_rates = np.asarray(heart_rates, dtype=np.float64)
+    calories = np.zeros(len(heart_rates))
+    if len(heart_rates) < 2:
+        return calories
+
+    order = np.lexsort((timestamps, workout_ids))
+    ids, ts, hr = workout_ids[order], timestamps[order], heart_rates[order]
+    start = order[:-1]
+
+    seconds = np.where(ids[1:] == ids[:-1], np.diff(ts) / 1e9, 0.0)
+    dropout = seconds > max_gap_seconds
+    end_hr = np.where(dropout | np.isnan(hr[1:]), hr[:-1], hr[1:])
+    seconds = np.minimum(seconds, max_gap_seconds)
+
+    def per_start(value):
+        value = np.asarray(value)
+        return value if value.ndim == 0 else value[start]
+
+    rate = per_start(slope) * (hr[:-1] + end_hr) / 2 + per_start(intercept)
+    calories[start] = np.nan_to_num(np.clip(rate, 0, None) * seconds / 60)
+    return calories
+
+
+# Per-workout, per-day and per-week kcal for any number of users from one integration of the samples.
+# df_health has workout_id/timestamp/heartrate, df_workouts maps workout_id to username and
+# df_users holds username/gender/weight/age. Days and weeks (starting Monday) are taken from
+# each sample's local time, so a workout running past midnight is split across both days.
+def calorie_totals(df_health, df_workouts, df_users, timezone=DISPLAY_TIMEZONE):
+    workouts = df_workouts[['workout_id', 'username']].drop_duplicates('workout_id')
+    users = df_users[['username', 'gender', 'weight', 'age']].drop_duplicates('username').set_index('username')
+
+    # Sample -> workout -> user profile, as positional lookups instead of frame merges
+    workout_users = users.index.get_indexer(workouts['username'])
+    workout_rows = pd.Index(workouts['workout_id']).get_indexer(df_health['workout_id'])
+    user_rows = np.append(workout_users, -1)[workout_rows]  # Unknown workout (-1) -> unknown user
+    known = user_rows >= 0  # Samples of unknown workouts/users are left out
+    user_rows = user_rows[known]
+
+    # Formula terms are worked out once per user and gathered per sample
+    slope, intercept = formula_terms(users['gender'].to_numpy(), users['weight'].to_numpy(dtype=np.float64),
+                                     users['age'].to_numpy(dtype=np.float64))
+    health = df_health[known]
+    timestamps = _epoch_ns(health['timestamp'])
+    calories = _integrate(health['workout_id'].to_numpy(), timestamps, health['heartrate'],
+                          slope[user_rows], intercept[user_rows])
+
+    # Local calendar day of every sample as days since the epoch; weeks start on Monday (1970-01-01 was a Thursday)
+    local = pd.DatetimeIndex(timestamps.view('datetime64[ns]')).tz_localize('UTC').tz_convert(timezone).tz_localize(None)
+    day = local.to_numpy(dtype='datetime64[D]').view(np.int64)
+    week = day - (day + 3) % 7
+
+    workout_codes, workout_values = pd.factorize(health['workout_id'].to_numpy(), sort=True)
+    per_workout = pd.DataFrame({
+        'workout_id': workout_values,
+        'username': workouts.set_index('workout_id')['username'].reindex(workout_values).to_numpy(),
+        'calories_burned': np.bincount(workout_codes, calories, len(workout_values)),
+    })
+    per_day = _sum_by_user(user_rows, day, calories, users.index, 'day')
+    per_week = _sum_by_user(user_rows, week, calories, users.index, 'week_start')
+    return per_workout, per_day, per_week
+
+
+# Sum weights per (user, day) with days as epoch day numbers, as a frame sorted by user and day
+def _sum_by_user(user_rows, days, weights, usernames, column):
+    span = int(days.max() - days.min()) + 1 if len(days) else 1
+    offset = days.min() if len(days) else 0
+    keys, inverse = np.unique(user_rows * span + (days - offset), return_inverse=True)
+    return pd.DataFrame({
+        'username': usernames.to_numpy()[keys // span],
+        column: (keys % span + offset).astype('datetime64[D]').astype('datetime64[ns]'),
+        'calories_burned': np.bincount(inverse, weights, len(keys)),
+    })
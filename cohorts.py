@@ -0,0 +1,161 @@
+import argparse
+import logging
+import uuid
+import numpy as np
+import pandas as pd
+from backend import COHORT_SKETCH_COLUMNS
+from quantiles import KLLSketch, merge_all
+
+# Cohort comparison: how a user's workouts rank among everyone's workouts of the same
+# type. Quantile sketches (quantiles.KLLSketch) of each METRICS column per workout type,
+# for everyone (ALL_COHORT) and per gender and age band, are stored in
+# workoutCohortSketch (sql/cohort_sketches.sql). The rollup worker adds summarized
+# workouts incrementally: each batch is claimed in workoutCohortMember, which only one
+# worker process can do per workout, and written as new sketch rows in the same
+# transaction. Readers merge a cohort's rows; once it has more than MAX_COHORT_ROWS the
+# worker replaces them with one merged row, also in one transaction that fails if
+# another process merged any of them first. The dashboard merges a few small sketches
+# and ranks each of the user's workouts against them, however many workouts the cohorts
+# hold. `python -m cohorts` adds the existing history; --rebuild starts over, e.g. after
+# users moved to another age band.
+
+METRICS = {'duration': 'Duration (min)', 'overallAccuracy': 'Accuracy', 'calories_burned': 'Calories'}
+ALL_COHORT = 'all'
+# Lower bounds of the age bands after the first ('<18')
+AGE_BANDS = (18, 25, 35, 45, 55, 65)
+SKETCH_BATCH_SIZE = 500
+MAX_COHORT_ROWS = 8
+
+logger = logging.getLogger(__name__)
+
+
+def age_band(age):
+    if age is None or pd.isna(age):
+        return None
+    position = int(np.searchsorted(AGE_BANDS, age, side='right'))
+    if position == 0:
+        return f'<{AGE_BANDS[0]}'
+    if position == len(AGE_BANDS):
+        return f'{AGE_BANDS[-1]}+'
+    return f'{AGE_BANDS[position - 1]}-{AGE_BANDS[position] - 1}'
+
+
+# The user's gender and age cohort ('Female 25-34'), or None without both in the profile
+def user_cohort(user):
+    band = age_band(user.get('age')) if user else None
+    gender = user.get('gender') if user else None
+    return f'{gender} {band}' if band is not None and gender else None
+
+
+def _sketch_row(workout, cohort, metric, sketch):
+    return {'id': str(uuid.uuid4()), 'workout': workout, 'cohort': cohort, 'metric': metric,
+            'count': sketch.count, 'sketch': sketch.encode()}
+
+
+# workoutCohortSketch rows holding the given workouts (UNSKETCHED_COLUMNS); users maps
+# each username to its user row
+def build_sketches(df_workouts, users):
+    df = df_workouts.assign(cohort=df_workouts['username'].map(lambda username: user_cohort(users.get(username))))
+    rows = []
+    for metric in METRICS:
+        values = df[['workout', 'cohort']].assign(value=pd.to_numeric(df[metric], errors='coerce')).dropna(
+            subset=['workout', 'value'])
+        for workout, group in values.groupby('workout', sort=True):
+            rows.append(_sketch_row(workout, ALL_COHORT, metric, KLLSketch().update(group['value'].to_numpy())))
+            for cohort, members in group.dropna(subset=['cohort']).groupby('cohort', sort=True):
+                rows.append(_sketch_row(workout, cohort, metric, KLLSketch().update(members['value'].to_numpy())))
+    return pd.DataFrame(rows, columns=COHORT_SKETCH_COLUMNS)
+
+
+# Merge the cohorts of a workout type that have more than max_rows rows into one row each
+def compact(backend, workout, max_rows=MAX_COHORT_ROWS):
+    stored = backend.cohort_sketches([workout])
+    for (cohort, metric), group in stored.groupby(['cohort', 'metric']):
+        if len(group) <= max_rows:
+            continue
+        merged = merge_all(KLLSketch.decode(sketch) for sketch in group['sketch'])
+        # Another process merging the same rows first leaves them to it
+        backend.merge_cohort_sketches(group['id'].tolist(), _sketch_row(workout, cohort, metric, merged))
+
+
+# Add every summarized workout that is not in the sketches yet, batch_size at a time, then
+# compact the cohorts that grew; returns the number of workouts added
+def update(backend, batch_size=SKETCH_BATCH_SIZE):
+    after, added, users, workouts = 0, 0, {}, set()
+    while True:
+        batch = backend.unsketched_workouts(after, batch_size)
+        if batch.empty:
+            break
+        for username in batch['username'].unique():
+            if username not in users:
+                users[username] = backend.user_row(username)
+        sketches = build_sketches(batch, users)
+        # When another process added some of the batch first, nothing was written; reading
+        # the batch again leaves out the workouts it added
+        if not backend.add_cohort_sketches(batch['workout_id'].tolist(), sketches):
+            continue
+        after = int(batch['workout_id'].max())
+        workouts.update(sketches['workout'])
+        added += len(batch)
+        logger.info("Added %d workouts to the cohort sketches (up to workout_id %d)", added, after)
+    for workout in sorted(workouts):
+        compact(backend, workout)
+    return added
+
+
+# {(workout, cohort, metric): KLLSketch} of the given workout types, for everyone and the
+# user's cohort
+def load_sketches(backend, user, workouts):
+    cohort = user_cohort(user)
+    cohorts = [ALL_COHORT] + ([cohort] if cohort is not None else [])
+    stored = backend.cohort_sketches(sorted(workouts), cohorts)
+    return {key: merge_all(KLLSketch.decode(sketch) for sketch in group['sketch'])
+            for key, group in stored.groupby(['workout', 'cohort', 'metric'])}
+
+
+# Per workout type and metric: the user's workouts in df_workouts (prepared rows with the
+# summary columns), their median value, and the median percentile of those workouts among
+# everyone's workouts and the user's cohort's. Each workout is ranked on its own, as the
+# sketches hold single workouts, not averages.
+def percentiles(df_workouts, sketches, user):
+    cohort = user_cohort(user)
+    rows = []
+    for workout, group in df_workouts.groupby('workout', sort=True):
+        for metric, label in METRICS.items():
+            values = pd.to_numeric(group[metric], errors='coerce').dropna().to_numpy() if metric in group else []
+            if not len(values):
+                continue
+            everyone = sketches.get((workout, ALL_COHORT, metric))
+            peers = sketches.get((workout, cohort, metric)) if cohort is not None else None
+            rows.append({
+                'workout': workout,
+                'metric': label,
+                'your_workouts': len(values),
+                'your_median': float(np.median(values)),
+                'percentile_all': 100 * np.median(everyone.rank(values)) if everyone is not None else np.nan,
+                'workouts_all': everyone.count if everyone is not None else 0,
+                'percentile_cohort': 100 * np.median(peers.rank(values)) if peers is not None else np.nan,
+                'workouts_cohort': peers.count if peers is not None else 0,
+            })
+    return pd.DataFrame(rows, columns=['workout', 'metric', 'your_workouts', 'your_median', 'percentile_all',
+                                       'workouts_all', 'percentile_cohort', 'workouts_cohort'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add the summarized workouts to the cohort sketches')
+    parser.add_argument('--batch', type=int, default=SKETCH_BATCH_SIZE, help='workouts per batch')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='delete the sketches and add every workout again (stop the workers first)')
+    args = parser.parse_args()
+
+    import data
+    from backend import SupabaseBackend
+    logging.basicConfig(level=logging.INFO)
+    backend = SupabaseBackend(data.get_client("SUPABASE_SERVICE_ROLE_KEY"), cached=False)
+    if args.rebuild:
+        backend.reset_cohorts()
+    print(f"Added {update(backend, args.batch)} workouts to the cohort sketches")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+import pandas as pd
+import supabase
+import hr_archive
+import schema
+import metrics
+
+# Shared data-access layer: one Supabase client per process (per key), a
+# per-user read cache with TTL + LRU eviction, and an incrementally synced copy
+# of each user's workout history. Writes must call invalidate_user().
+
+CACHE_TTL_SECONDS = 300
+CACHE_MAX_ENTRIES = 1024
+# Workout history is fully re-fetched at least this often to pick up edited rows
+FULL_RESYNC_SECONDS = 3600
+
+# PostgREST caps the rows of one response (max-rows), so selects that can exceed it are
+# paged with range()
+PAGE_SIZE = 1000
+
+HEALTH_COLUMNS = ['workout_id', 'timestamp', 'heartrate']
+# userWorkoutHealth is fetched in bounded chunks of workout ids, paged with range()
+# (PostgREST caps rows per response), with chunks running on a shared thread pool
+HEALTH_CHUNK_SIZE = 100
+HEALTH_PAGE_SIZE = PAGE_SIZE
+HEALTH_FETCH_WORKERS = 8
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+# Return the process-wide Supabase client for the given secret key name
+def get_client(key_name="SUPABASE_KEY"):
+    client = _clients.get(key_name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key_name)
+            if client is None:
+                client = supabase.create_client(st.secrets["SUPABASE_URL"], st.secrets[key_name])
+                _clients[key_name] = client
+    return client
+
+
+class TTLCache:
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # Keys are tuples whose first element is the username (None for shared tables)
+    def invalidate_user(self, username):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == username]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = TTLCache()
+
+
+# Run a query builder, recording its time, rows and payload size when metrics are enabled
+def execute(query, name):
+    with metrics.span(name, kind='query') as span:
+        response = query.execute()
+        span.add_payload(response.data)
+    return response
+
+
+# All rows of query(), a function returning a fresh query builder ordered on a unique key
+# so that pages neither overlap nor skip rows, fetched page_size rows at a time
+def execute_paged(query, name, page_size=PAGE_SIZE):
+    rows = []
+    while True:
+        page = execute(query().range(len(rows), len(rows) + page_size - 1), name).data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+# Rows of query() (a function returning a query builder), read once per key until they
+# expire; paged queries must be ordered (see execute_paged)
+def cached_rows(key, query, paged=False):
+    rows = _cache.get(key)
+    if rows is None:
+        rows = execute_paged(query, f"select {key[1]}") if paged else execute(query(), f"select {key[1]}").data
+        _cache.set(key, rows)
+    else:
+        metrics.record(f"select {key[1]}", kind='cache', requests=0, rows=len(rows))
+    return rows
+
+
+# Cached rows are shared between sessions, so callers must not mutate them in place
+
+def fetch_workouts(client):
+    return cached_rows((None, 'workouts'), lambda: client.table('workouts').select('*'))
+
+
+def fetch_user(client, username):
+    return cached_rows((username, 'user'), lambda: client.table('user').select('*').eq('username', username))
+
+
+# Evict every cached read belonging to the given user (call after any write)
+def invalidate_user(username):
+    _cache.invalidate_user(username)
+    history = _histories.get(username)
+    if history is not None:
+        history.stale = True
+
+
+# Process-wide copy of a user's userWorkouts rows plus the newest startDT /
+# timestamp already held, used as the delta-sync watermarks. Only workouts starting
+# at or after `since` are held; it moves back as earlier date ranges are requested.
+# Heart-rate samples live in the memory-mapped hr_archive and are only synced once a
+# caller asks.
+class WorkoutHistory:
+    def __init__(self):
+        self.df_workouts = pd.DataFrame()
+        self.since = None  # UTC ISO lower bound of the held startDT; None when all of it is held
+        self.workouts_watermark = None
+        self.health_watermark = None
+        self.synced_at = 0.0
+        self.full_synced_at = 0.0
+        self.stale = True
+        self.full_resync_needed = True
+        self.health_loaded = False
+        self.fetch_stats = []
+        self.lock = threading.Lock()
+
+    @property
+    def workout_ids(self):
+        return self.df_workouts['workout_id'].tolist() if not self.df_workouts.empty else []
+
+    def _update_watermarks(self):
+        if not self.df_workouts.empty:
+            self.workouts_watermark = pd.to_datetime(self.df_workouts['startDT'], utc=True, format='ISO8601').max().isoformat()
+
+    def replace(self, workout_rows):
+        self.df_workouts = schema.workouts_frame(workout_rows)
+        self.workouts_watermark = None
+        self._update_watermarks()
+
+    def merge(self, workout_rows):
+        if workout_rows:
+            merged = pd.concat([self.df_workouts, schema.workouts_frame(workout_rows)], ignore_index=True) \
+                .drop_duplicates(subset='workout_id', keep='last').reset_index(drop=True)
+            # Categories of the two frames differ, so the concatenated columns are converted again
+            self.df_workouts = schema.workouts_frame(merged)
+        self._update_watermarks()
+
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+def _health_frame(rows):
+    return pd.DataFrame(rows) if rows else pd.DataFrame(columns=HEALTH_COLUMNS)
+
+
+_health_pool = None
+_health_pool_lock = threading.Lock()
+
+
+def _get_health_pool():
+    global _health_pool
+    if _health_pool is None:
+        with _health_pool_lock:
+            if _health_pool is None:
+                _health_pool = ThreadPoolExecutor(max_workers=HEALTH_FETCH_WORKERS, thread_name_prefix='health-fetch')
+    return _health_pool
+
+
+# Page through one chunk of workout ids; returns the rows and a stats dict for the chunk
+def _fetch_health_chunk(client, index, workout_ids, page_size, since=None):
+    started = time.perf_counter()
+    rows = []
+    pages = 0
+    payload_bytes = 0
+    while True:
+        query = client.table('userWorkoutHealth').select('*').in_('workout_id', workout_ids)
+        if since is not None:
+            query = query.gte('timestamp', since)
+        page = query.order('workout_id').order('timestamp') \
+            .range(pages * page_size, (pages + 1) * page_size - 1).execute().data
+        pages += 1
+        payload_bytes += len(json.dumps(page, separators=(',', ':')).encode())
+        rows.extend(page)
+        if len(page) < page_size:
+            break
+    return rows, {
+        'chunk': index,
+        'workout_ids': len(workout_ids),
+        'pages': pages,
+        'rows': len(rows),
+        'bytes': payload_bytes,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+# Fetch userWorkoutHealth for many workouts: ids are split into bounded chunks, each
+# chunk is paged with range() and chunks run concurrently. Samples before `since` (UTC
+# ISO) are skipped. Returns (df_health, stats) where stats has one entry per chunk with
+# the rows and JSON bytes it fetched.
+def fetch_health_batched(client, workout_ids, chunk_size=HEALTH_CHUNK_SIZE, page_size=HEALTH_PAGE_SIZE, since=None):
+    workout_ids = list(workout_ids)
+    chunks = [workout_ids[i:i + chunk_size] for i in range(0, len(workout_ids), chunk_size)]
+    futures = [_get_health_pool().submit(_fetch_health_chunk, client, index, chunk, page_size, since)
+               for index, chunk in enumerate(chunks)]
+    results = [future.result() for future in futures]
+
+    rows = [row for chunk_rows, _ in results for row in chunk_rows]
+    stats = [chunk_stats for _, chunk_stats in results]
+    # Chunks run on worker threads; their stats are recorded here on the calling thread
+    for chunk_stats in stats:
+        metrics.record('select userWorkoutHealth', seconds=chunk_stats['seconds'], requests=chunk_stats['pages'],
+                       rows=chunk_stats['rows'], payload_bytes=chunk_stats['bytes'])
+    return _health_frame(rows), stats
+
+
+# Fetch samples of workouts not yet in the local archive (or all of them when refreshing) and
+# archive them. A workout's samples never precede its start, so since (the lower bound of
+# the workouts' startDT) only lets the database skip older index entries.
+def _archive_health(client, username, history, workout_ids, refresh=False, since=None):
+    if not refresh:
+        workout_ids = [workout_id for workout_id in workout_ids if not hr_archive.has_workout(username, workout_id)]
+    if workout_ids:
+        df_health, history.fetch_stats = fetch_health_batched(client, workout_ids, since=since)
+        hr_archive.store_frame(username, df_health, workout_ids)
+
+
+def _update_health_watermark(username, history):
+    latest = hr_archive.latest_timestamp(username, history.workout_ids)
+    history.health_watermark = latest.isoformat() if latest is not None else None
+
+
+# The user's userWorkouts starting at or after since, ordered for paging
+def _user_workouts(client, username, since=None):
+    query = client.table('userWorkouts').select('*').eq('username', username).order('workout_id')
+    return query.gte('startDT', since) if since is not None else query
+
+
+def _full_sync(client, username, history):
+    workout_rows = execute_paged(lambda: _user_workouts(client, username, history.since), 'select userWorkouts')
+    history.replace(workout_rows)
+    if history.health_loaded:
+        _archive_health(client, username, history, history.workout_ids, refresh=True)
+        _update_health_watermark(username, history)
+    history.full_synced_at = time.monotonic()
+    history.full_resync_needed = False
+
+
+def _delta_sync(client, username, history):
+    # Workouts that started after the newest one already held
+    def newer():
+        query = _user_workouts(client, username, history.since)
+        if history.workouts_watermark is not None:
+            query = query.gt('startDT', history.workouts_watermark)
+        return query
+    workout_rows = execute_paged(newer, 'select userWorkouts (delta)')
+
+    # All samples of new workouts, plus late samples of the most recent known workout
+    if history.health_loaded:
+        if not history.df_workouts.empty and history.health_watermark is not None:
+            latest_id = history.df_workouts.loc[
+                pd.to_datetime(history.df_workouts['startDT'], utc=True, format='ISO8601').idxmax(), 'workout_id']
+            late_rows = execute_paged(lambda: client.table('userWorkoutHealth').select('*')
+                                      .eq('workout_id', latest_id).gt('timestamp', history.health_watermark)
+                                      .order('timestamp'), 'select userWorkoutHealth (late)')
+            hr_archive.append_frame(username, _health_frame(late_rows))
+        _archive_health(client, username, history, [workout['workout_id'] for workout in workout_rows], refresh=True)
+    history.merge(workout_rows)
+    if history.health_loaded:
+        _update_health_watermark(username, history)
+
+    # Deleted or back-dated rows leave the counts out of step; fall back to a full resync
+    count_query = client.table('userWorkouts').select('workout_id', count='exact', head=True).eq('username', username)
+    if history.since is not None:
+        count_query = count_query.gte('startDT', history.since)
+    remote_count = execute(count_query, 'count userWorkouts').count
+    if remote_count is not None and remote_count != len(history.df_workouts):
+        _full_sync(client, username, history)
+
+
+# Fetch the workouts starting in [since, history.since) so the history reaches back to since
+def _extend(client, username, history, since):
+    query = lambda: _user_workouts(client, username, since).lt('startDT', history.since)
+    history.merge(execute_paged(query, 'select userWorkouts (earlier)'))
+    history.since = since
+
+
+# The earlier of two lower bounds, None (unbounded) if either is
+def _earliest(since, start):
+    return None if since is None or start is None else min(since, start)
+
+
+def _in_range(df_workouts, start, end):
+    if df_workouts.empty:
+        return df_workouts
+    keep = pd.Series(True, index=df_workouts.index)
+    if start is not None:
+        keep &= df_workouts['startDT'] >= pd.Timestamp(start)
+    if end is not None:
+        keep &= df_workouts['startDT'] < pd.Timestamp(end)
+    return df_workouts[keep].reset_index(drop=True)
+
+
+# Workouts of a past date range that is not held, read once and cached like other reads
+def _past_workouts(client, username, start, end):
+    rows = cached_rows((username, 'userWorkouts', start, end),
+                       lambda: _user_workouts(client, username, start).lt('startDT', end), paged=True)
+    return schema.workouts_frame(rows) if rows else pd.DataFrame()
+
+
+# Bring the user's workout history up to date and return (df_workouts, df_health) for the
+# workouts starting in [start, end) (UTC ISO timestamps; None leaves that side open).
+# Only rows newer than the stored watermarks, or older than the range already held, are
+# fetched unless a full resync is due; a range ending before the held history starts is
+# read on its own. df_health is None unless with_health is set; the range's samples are
+# archived on first request and then read back from the memory-mapped archive.
+def sync_history(client, username, with_health=False, full=False, start=None, end=None):
+    with _histories_lock:
+        history = _histories.setdefault(username, WorkoutHistory())
+
+    with history.lock:
+        now = time.monotonic()
+        past = end is not None and history.since is not None and end <= history.since \
+            and not history.full_resync_needed
+        if past:
+            df_workouts = _past_workouts(client, username, start, end)
+        else:
+            since = start if history.full_synced_at == 0 else _earliest(history.since, start)
+            if full or history.full_resync_needed or now - history.full_synced_at > FULL_RESYNC_SECONDS:
+                history.since = since
+                _full_sync(client, username, history)
+            else:
+                if since != history.since:
+                    _extend(client, username, history, since)
+                if history.stale or now - history.synced_at > CACHE_TTL_SECONDS:
+                    _delta_sync(client, username, history)
+            history.synced_at = now
+            history.stale = False
+            df_workouts = _in_range(history.df_workouts, start, end)
+
+        if not with_health:
+            return df_workouts.copy(), None
+        workout_ids = df_workouts['workout_id'].tolist() if not df_workouts.empty else []
+        _archive_health(client, username, history, workout_ids, since=start)
+        if not history.health_loaded:
+            history.health_loaded = True
+            _update_health_watermark(username, history)
+        return df_workouts.copy(), hr_archive.load_frame(username, workout_ids)
+
+
+# Force the next sync_history() call for this user to re-fetch everything (e.g. after rows were edited)
+def request_full_resync(username):
+    history = _histories.get(username)
+    if history is not None:
+        history.full_resync_needed = True
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Reduce heart-rate series before plotting so the payload sent to the browser stays
+# flat as history grows. Line charts use Largest-Triangle-Three-Buckets (with a
+# min-max preselection for very long series); histogram and box plots are built
+# from pre-binned counts and quantiles instead of raw samples, with box plot outliers
+# reduced to a bounded number of distinct points.
+
+# Total number of points drawn across all workouts in the heart-rate line chart
+HEART_RATE_POINT_BUDGET = 5000
+# Never reduce a single workout below this many points
+MIN_POINTS_PER_WORKOUT = 50
+# Outliers drawn per box at most; the most extreme distinct values are kept
+MAX_OUTLIERS_PER_GROUP = 50
+
+
+def _as_numeric(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float)
+    return values.to_numpy(dtype=float)
+
+
+# Indices of the min and max sample of each of n_buckets equal-count buckets (keeps peaks)
+def minmax_indices(y, n_buckets):
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    buckets = pd.Series(y).groupby(np.arange(n) * n_buckets // n)
+    return np.unique(np.concatenate(([0, n - 1], buckets.idxmin().to_numpy(), buckets.idxmax().to_numpy())))
+
+
+# Largest-Triangle-Three-Buckets: indices of n_out points that preserve the visual shape
+def lttb_indices(x, y, n_out):
+    x = _as_numeric(x)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the n_out - 2 inner buckets (first and last point are always kept)
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    starts, ends = edges[:-1], edges[1:]
+
+    # Average point of every bucket from cumulative sums, plus the fixed last point
+    x_sum = np.concatenate(([0.0], np.cumsum(x)))
+    y_sum = np.concatenate(([0.0], np.cumsum(y)))
+    counts = ends - starts
+    avg_x = np.append((x_sum[ends] - x_sum[starts]) / counts, x[-1])
+    avg_y = np.append((y_sum[ends] - y_sum[starts]) / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        bx, by = x[starts[i]:ends[i]], y[starts[i]:ends[i]]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = starts[i] + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+# Min-max preselection for very long series, then LTTB down to n_out points
+def downsample_indices(x, y, n_out):
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    candidates = minmax_indices(y, 2 * n_out) if n > 8 * n_out else np.arange(n)
+    keep = lttb_indices(np.asarray(x)[candidates], np.asarray(y)[candidates], n_out)
+    return candidates[keep]
+
+
+# Downsample each group (e.g. workout_id) of a long frame, splitting a total point budget evenly
+def downsample_groups(df, x, y, group, budget=HEART_RATE_POINT_BUDGET):
+    if df.empty:
+        return df
+    df = df.sort_values([group, x], kind='stable').reset_index(drop=True)
+    groups = df.groupby(group, sort=False).indices
+    per_group = max(MIN_POINTS_PER_WORKOUT, budget // max(len(groups), 1))
+
+    # Convert the columns once; tz-aware timestamps would otherwise become object arrays per group
+    xs, ys = _as_numeric(df[x]), df[y].to_numpy(dtype=float)
+    keep = [positions[downsample_indices(xs[positions], ys[positions], per_group)] for positions in groups.values()]
+    return df.take(np.concatenate(keep)) if keep else df
+
+
+def histogram_figure(values, nbins=50, title=None):
+    samples = pd.Series(values).dropna().to_numpy(dtype=float)
+    counts, edges = np.histogram(samples, bins=nbins) if len(samples) else (np.array([]), np.array([0.0]))
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), name='count'))
+    fig.update_layout(title=title, bargap=0, xaxis_title=getattr(values, 'name', None), yaxis_title='count')
+    return fig
+
+
+# Quartiles and 1.5 IQR whisker ends per group, the statistics a box plot draws, and the
+# samples outside the whiskers (group, value): each distinct value once and at most
+# max_outliers per group, the farthest from the fences first
+def box_stats(df, group, value, max_outliers=MAX_OUTLIERS_PER_GROUP):
+    grouped = df.groupby(group)[value]
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    iqr = stats['q3'] - stats['q1']
+
+    # Whiskers reach the most extreme samples inside the fences
+    low = (stats['q1'] - 1.5 * iqr).rename('low')
+    high = (stats['q3'] + 1.5 * iqr).rename('high')
+    bounds = df[[group, value]].join(low, on=group).join(high, on=group)
+    in_fences = (bounds[value] >= bounds['low']) & (bounds[value] <= bounds['high'])
+    inside = bounds[in_fences].groupby(group)[value]
+    stats['lowerfence'] = inside.min()
+    stats['upperfence'] = inside.max()
+    stats['min'] = grouped.min()
+    stats['max'] = grouped.max()
+
+    outside = bounds[~in_fences & bounds[value].notna()].drop_duplicates([group, value])
+    distance = np.maximum(outside['low'] - outside[value], outside[value] - outside['high'])
+    outliers = outside.assign(distance=distance).sort_values('distance', ascending=False, kind='stable') \
+        .groupby(group, observed=True).head(max_outliers).sort_values([group, value])[[group, value]]
+    return stats.reset_index(), outliers.reset_index(drop=True)
+
+
+def box_figure(df, group, value, title=None):
+    stats, outliers = box_stats(df, group, value)
+    fig = go.Figure(go.Box(
+        x=stats[group].astype(str),
+        q1=stats['q1'], median=stats['median'], q3=stats['q3'],
+        lowerfence=stats['lowerfence'], upperfence=stats['upperfence'],
+        name=value,
+    ))
+    fig.add_trace(go.Scatter(x=outliers[group].astype(str), y=outliers[value], mode='markers',
+                             marker={'size': 4}, name='outliers'))
+    fig.update_layout(title=title, xaxis_title=group, yaxis_title=value)
+    return fig
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import plotly.graph_objects as go
+import metrics
+from sections import fingerprint
+
+# Process-wide cache of built dashboard figures, keyed by the chart spec name and a
+# fingerprint of the frame slice it is drawn from, so identical data is only plotted
+# once across reruns and sessions. A repeat render skips building the figure (and
+# plotly express's grouping); st.plotly_chart still serializes the cached figure, as
+# Streamlit takes no pre-serialized spec through its public API. Cache size is estimated
+# from the trace arrays rather than by serializing. Scatter/line traces with many points
+# are switched to WebGL on the way in. Only public plotly APIs are used, so the cache
+# does not depend on the internals of a particular plotly or Streamlit release.
+
+# Scatter traces with more points than this are drawn with scattergl
+WEBGL_POINT_THRESHOLD = 1000
+FIGURE_CACHE_MAX_ENTRIES = 256
+# Total estimated size kept (see _size); the least recently used figures are evicted beyond it
+FIGURE_CACHE_MAX_BYTES = 128 * 2**20
+# Estimated bytes per element of object arrays and lists (a pointer plus a small value)
+OBJECT_ITEM_BYTES = 32
+
+
+# Length of a trace's x or y (a list or array; absent or scalar is 0)
+def _length(values):
+    return len(values) if isinstance(values, (list, tuple, np.ndarray)) else 0
+
+
+def _points(trace):
+    return max(_length(trace.get('x')), _length(trace.get('y')))
+
+
+# Estimated in-memory size of a figure spec (to_plotly_json) in bytes, dominated by the
+# trace data arrays, without serializing it
+def _size(value):
+    if isinstance(value, np.ndarray):
+        return value.size * OBJECT_ITEM_BYTES if value.dtype == object else value.nbytes
+    if isinstance(value, dict):
+        return sum(len(key) + _size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_size(item) if isinstance(item, (dict, list, tuple, np.ndarray)) else OBJECT_ITEM_BYTES
+                   for item in value)
+    return len(value) if isinstance(value, str) else 8
+
+
+# The figure with its scatter traces of more than threshold points switched to scattergl,
+# and its estimated size; properties WebGL traces do not have are dropped (skip_invalid)
+def use_webgl(fig, threshold=WEBGL_POINT_THRESHOLD):
+    spec = fig.to_plotly_json()
+    size = _size(spec)
+    traces = spec.get('data', [])
+    if not any(trace.get('type', 'scatter') == 'scatter' and _points(trace) > threshold for trace in traces):
+        return fig, size
+    for index, trace in enumerate(traces):
+        if trace.get('type', 'scatter') == 'scatter' and _points(trace) > threshold:
+            properties = {key: value for key, value in trace.items() if key != 'type'}
+            traces[index] = go.Scattergl(properties, skip_invalid=True)
+    return go.Figure(data=traces, layout=spec.get('layout')), size
+
+
+class FigureCache:
+    def __init__(self, max_entries=FIGURE_CACHE_MAX_ENTRIES, max_bytes=FIGURE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (figures, size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    # size is the figures' estimated size in bytes
+    def set(self, key, figures, size):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._entries[key] = (figures, size)
+            self.size += size
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+_cache = FigureCache()
+
+
+# Return build()'s figures (a list) for the chart spec `name` drawn from `inputs`,
+# building them only when no figures are cached for the same spec and inputs. The figures
+# are shared by every session, so callers must not modify them.
+def cached_figures(name, build, *inputs):
+    key = (name, fingerprint(*inputs))
+    figures = _cache.get(key)
+    if figures is None:
+        with metrics.span(f"build {name}", kind='figures'):
+            figures, size = [], 0
+            for fig in build():
+                fig, fig_size = use_webgl(fig)
+                figures.append(fig)
+                size += fig_size
+        _cache.set(key, figures, size)
+    else:
+        metrics.record(f"build {name}", kind='cache', requests=0)
+    return figures
@@ -0,0 +1,191 @@
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+from schema import DISPLAY_TIMEZONE
+
+# On-disk columnar archive of heart-rate samples, one directory per user/workout
+# holding timestamp.npy (int64 epoch nanoseconds, UTC) and heartrate.npy (uint8 when
+# the values allow it, float32 otherwise). Files are written once when a workout is
+# synced and read through short-lived mmaps, so the samples come from the OS page cache
+# shared by every process and no file stays open after a read. A frame built from the
+# archive is one private copy of its samples; the last FRAME_CACHE_SIZE frames are kept
+# per user and workout list until any of their files change, so repeated loads do not
+# copy the samples again and the copies held stay bounded.
+
+ARCHIVE_DIR = os.environ.get('HR_ARCHIVE_DIR', '.hr_archive')
+
+FRAME_CACHE_SIZE = 32
+
+_frames = OrderedDict()  # (username, workout ids) -> (file mtimes, frame), least recently used first
+_frames_lock = threading.Lock()
+
+
+def _workout_dir(username, workout_id):
+    return os.path.join(ARCHIVE_DIR, quote(str(username), safe=''), quote(str(workout_id), safe=''))
+
+
+def _compact_heartrate(values):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) and np.all(np.isfinite(values)) and np.all(values == np.round(values)) \
+            and values.min() >= 0 and values.max() <= 255:
+        return values.astype(np.uint8)
+    return values.astype(np.float32)
+
+
+def _save_atomic(path, array):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def has_workout(username, workout_id):
+    directory = _workout_dir(username, workout_id)
+    return os.path.exists(os.path.join(directory, 'timestamp.npy')) and os.path.exists(os.path.join(directory, 'heartrate.npy'))
+
+
+# Write (or replace) the samples of one workout; timestamps are int64 epoch nanoseconds
+def write_workout(username, workout_id, timestamps, heartrates):
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    order = np.argsort(timestamps, kind='stable')
+    directory = _workout_dir(username, workout_id)
+    os.makedirs(directory, exist_ok=True)
+    _save_atomic(os.path.join(directory, 'heartrate.npy'), _compact_heartrate(np.asarray(heartrates)[order]))
+    _save_atomic(os.path.join(directory, 'timestamp.npy'), timestamps[order])
+
+
+# Drop a workout's samples, so it counts as not archived
+def remove_workout(username, workout_id):
+    directory = _workout_dir(username, workout_id)
+    for name in ('timestamp.npy', 'heartrate.npy'):
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+# (timestamps, heartrates) memmaps for one workout, or None if it is not archived. The
+# mappings (and their file descriptors) are released once the caller drops the arrays.
+def open_workout(username, workout_id):
+    if not has_workout(username, workout_id):
+        return None
+    directory = _workout_dir(username, workout_id)
+    try:
+        timestamps = np.load(os.path.join(directory, 'timestamp.npy'), mmap_mode='r')
+        heartrates = np.load(os.path.join(directory, 'heartrate.npy'), mmap_mode='r')
+    except FileNotFoundError:
+        return None  # Removed since the check
+    if len(timestamps) != len(heartrates):
+        return None  # Caught mid-rewrite; treat as missing
+    return timestamps, heartrates
+
+
+def _epoch_ns(timestamps):
+    return pd.to_datetime(timestamps, utc=True, format='ISO8601').to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+# Archive a userWorkoutHealth frame. workout_ids without rows are removed from the archive
+# rather than stored empty, so they are fetched again until samples arrive.
+def store_frame(username, df_health, workout_ids=()):
+    if df_health.empty:
+        groups = {}
+    else:
+        workout_column = df_health['workout_id'].to_numpy()
+        order = np.argsort(workout_column, kind='stable')
+        sorted_ids = workout_column[order]
+        bounds = np.flatnonzero(sorted_ids[1:] != sorted_ids[:-1]) + 1
+        timestamps = _epoch_ns(df_health['timestamp'])[order]
+        heartrates = df_health['heartrate'].to_numpy(dtype=np.float64)[order]
+        groups = {
+            ids[0]: (ts, hr)
+            for ids, ts, hr in zip(np.split(sorted_ids, bounds), np.split(timestamps, bounds), np.split(heartrates, bounds))
+        }
+
+    for workout_id, (timestamps, heartrates) in groups.items():
+        write_workout(username, workout_id, timestamps, heartrates)
+    for workout_id in set(workout_ids) - set(groups):
+        remove_workout(username, workout_id)
+
+
+# Add late samples to already archived workouts, dropping duplicate timestamps
+def append_frame(username, df_health):
+    if df_health.empty:
+        return
+    df_health = df_health.assign(timestamp=_epoch_ns(df_health['timestamp']))
+    for workout_id, rows in df_health.groupby('workout_id'):
+        existing = open_workout(username, workout_id)
+        timestamps = rows['timestamp'].to_numpy(dtype=np.int64)
+        heartrates = rows['heartrate'].to_numpy(dtype=np.float64)
+        if existing is not None:
+            timestamps = np.concatenate([existing[0], timestamps])
+            heartrates = np.concatenate([existing[1], heartrates])
+        timestamps, first = np.unique(timestamps, return_index=True)
+        write_workout(username, workout_id, timestamps, heartrates[first])
+
+
+# Newest sample timestamp across the given workouts, or None
+def latest_timestamp(username, workout_ids):
+    latest = None
+    for workout_id in workout_ids:
+        samples = open_workout(username, workout_id)
+        if samples is not None and len(samples[0]):
+            latest = samples[0][-1] if latest is None else max(latest, samples[0][-1])
+    return None if latest is None else pd.Timestamp(int(latest), tz='UTC')
+
+
+# Modification times of a workout's files, None while it is not archived
+def _mtimes(username, workout_id):
+    directory = _workout_dir(username, workout_id)
+    try:
+        return tuple(os.stat(os.path.join(directory, name)).st_mtime_ns for name in ('timestamp.npy', 'heartrate.npy'))
+    except FileNotFoundError:
+        return None
+
+
+# userWorkoutHealth-shaped frame (workout_id, timestamp, heartrate) of the workouts from
+# the archive. The frame is shared by every caller until the files change, so callers
+# must not modify it in place.
+def load_frame(username, workout_ids):
+    workout_ids = tuple(workout_ids)
+    key = (username, workout_ids)
+    signature = tuple(_mtimes(username, workout_id) for workout_id in workout_ids)
+    with _frames_lock:
+        cached = _frames.get(key)
+        if cached is not None and cached[0] == signature:
+            _frames.move_to_end(key)
+            return cached[1]
+    frame = _build_frame(username, workout_ids)
+    with _frames_lock:
+        _frames[key] = (signature, frame)
+        _frames.move_to_end(key)
+        while len(_frames) > FRAME_CACHE_SIZE:
+            _frames.popitem(last=False)
+    return frame
+
+
+def _build_frame(username, workout_ids):
+    ids, timestamps, heartrates = [], [], []
+    for workout_id in workout_ids:
+        samples = open_workout(username, workout_id)
+        if samples is not None and len(samples[0]):
+            ids.append(workout_id)
+            timestamps.append(samples[0])
+            heartrates.append(samples[1])
+
+    if not ids:
+        return pd.DataFrame({
+            'workout_id': pd.Series(dtype='category'),
+            'timestamp': pd.Series(dtype=f'datetime64[ns, {DISPLAY_TIMEZONE}]'),
+            'heartrate': pd.Series(dtype=np.float32),
+        })
+    # Each column is copied out of the mappings once; the frame holds no reference to them
+    return pd.DataFrame({
+        # Repeated on every sample, so stored as codes into the list of workout ids
+        'workout_id': pd.Categorical.from_codes(np.repeat(np.arange(len(ids)), [len(ts) for ts in timestamps]), ids),
+        'timestamp': pd.DatetimeIndex(np.concatenate(timestamps).view('datetime64[ns]'))
+                       .tz_localize('UTC').tz_convert(DISPLAY_TIMEZONE),
+        'heartrate': np.concatenate(heartrates),
+    })
@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import hmac
+import logging
+import os
+import time
+from datetime import datetime
+from aiohttp import web
+
+# Heart-rate ingestion service. Wearables POST single samples or small batches; samples
+# are buffered per workout_id and written to userWorkoutHealth as bulk upserts. A
+# workout's buffer is flushed when it holds FLUSH_ROWS samples or its oldest sample has
+# waited FLUSH_SECONDS. Flushes pack many workouts into each insert request.
+#
+# Delivery is at-least-once: a post is answered 200 only after all of its samples are
+# written; failed writes answer 503 and the device retries. Retried samples are
+# dropped by the (workout_id, timestamp) unique index from sql/ingest.sql, so a retry
+# never duplicates rows. When too many samples are buffered or being written, posts
+# wait for space and then get 503 with Retry-After (backpressure).
+#
+# Writes use the service-role key, so posts must carry the shared INGEST_TOKEN as
+# "Authorization: Bearer <token>"; others get 401.
+#
+#   SUPABASE_URL=... SUPABASE_SERVICE_ROLE_KEY=... INGEST_TOKEN=... python -m ingest --port 8080
+#
+#   POST /samples  {"workout_id": 1, "timestamp": "2024-05-01T10:00:00+08:00", "heartrate": 92}
+#                  {"workout_id": 1, "samples": [{"timestamp": ..., "heartrate": ...}, ...]}
+#                  or a list of either
+#   GET  /health   buffer and write counters
+
+TABLE = 'userWorkoutHealth'
+CONFLICT_COLUMNS = 'workout_id,timestamp'
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 1.0
+MAX_INSERT_ROWS = 1000  # Rows per insert request
+MAX_POST_SAMPLES = 1000
+MAX_BUFFERED_ROWS = 100_000  # Buffered plus in-flight rows before posts are held back
+BACKPRESSURE_WAIT_SECONDS = 5.0
+RETRY_AFTER_SECONDS = 2
+WRITE_CONCURRENCY = 4  # Insert requests in flight
+WRITE_ATTEMPTS = 4
+BACKOFF_SECONDS = 0.25
+HEARTRATE_RANGE = (20, 250)
+
+logger = logging.getLogger(__name__)
+
+
+class Backpressure(Exception):
+    pass
+
+
+class WriteFailed(Exception):
+    pass
+
+
+# Rows {workout_id, timestamp, heartrate} from a POST body; raises ValueError when malformed
+# or holding more than MAX_POST_SAMPLES samples, which is checked before any row is built
+def parse_samples(payload):
+    items = payload if isinstance(payload, list) else [payload]
+    if _sample_count(items) > MAX_POST_SAMPLES:
+        raise ValueError(f"At most {MAX_POST_SAMPLES} samples per request")
+    rows = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Each entry must be an object")
+        workout_id = item.get('workout_id')
+        if not isinstance(workout_id, int) or isinstance(workout_id, bool):
+            raise ValueError("workout_id must be an integer")
+        samples = item['samples'] if 'samples' in item else [item]
+        if not isinstance(samples, list) or not all(isinstance(sample, dict) for sample in samples):
+            raise ValueError("samples must be a list of objects")
+        for sample in samples:
+            rows.append({'workout_id': workout_id, 'timestamp': _timestamp(sample.get('timestamp')),
+                         'heartrate': _heartrate(sample.get('heartrate'))})
+    if not rows:
+        raise ValueError("No samples")
+    return rows
+
+
+# Samples in the entries of a POST body as sent; malformed entries count as one
+def _sample_count(items):
+    return sum(len(item['samples']) if isinstance(item, dict) and isinstance(item.get('samples'), list) else 1
+               for item in items)
+
+
+def _timestamp(value):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid timestamp: {value!r}") from None
+    if parsed.tzinfo is None:
+        raise ValueError(f"Timestamp without a UTC offset: {value!r}")
+    return parsed.isoformat()
+
+
+def _heartrate(value):
+    if not isinstance(value, (int, float)) or isinstance(value, bool) \
+            or not HEARTRATE_RANGE[0] <= value <= HEARTRATE_RANGE[1]:
+        raise ValueError(f"Invalid heartrate: {value!r}")
+    return value
+
+
+class _Buffer:
+    def __init__(self, now):
+        self.rows = []
+        self.acks = []
+        self.first_at = now
+
+
+# Per-workout sample buffers flushed through write(rows), a blocking bulk insert that is
+# run on the default executor
+class Ingestor:
+    def __init__(self, write, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS, max_buffered=MAX_BUFFERED_ROWS,
+                 max_insert_rows=MAX_INSERT_ROWS, write_concurrency=WRITE_CONCURRENCY):
+        self.write = write
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_buffered = max_buffered
+        self.max_insert_rows = max_insert_rows
+        self.buffers = {}  # workout_id -> _Buffer
+        self.pending_rows = 0  # Buffered plus being written
+        self.space = asyncio.Condition()
+        self.wakeup = asyncio.Event()
+        self.writers = asyncio.Semaphore(write_concurrency)
+        self.flushes = set()
+        self.stats = {'accepted': 0, 'written': 0, 'inserts': 0, 'retries': 0, 'failed': 0, 'rejected': 0}
+        self.flusher = None
+
+    def start(self):
+        self.flusher = asyncio.create_task(self._flush_loop())
+
+    # Buffer the rows; returns futures resolved once they are written. Waits for space
+    # (up to wait_seconds) when the buffers are full, then raises Backpressure.
+    async def add(self, rows, wait_seconds=BACKPRESSURE_WAIT_SECONDS):
+        async with self.space:
+            try:
+                await asyncio.wait_for(
+                    self.space.wait_for(lambda: self.pending_rows + len(rows) <= self.max_buffered), wait_seconds)
+            except asyncio.TimeoutError:
+                self.stats['rejected'] += len(rows)
+                raise Backpressure() from None
+            self.pending_rows += len(rows)
+
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        by_workout = {}
+        for row in rows:
+            by_workout.setdefault(row['workout_id'], []).append(row)
+        acks = []
+        for workout_id, workout_rows in by_workout.items():
+            buffer = self.buffers.get(workout_id)
+            if buffer is None:
+                buffer = self.buffers[workout_id] = _Buffer(now)
+            buffer.rows.extend(workout_rows)
+            ack = loop.create_future()
+            buffer.acks.append(ack)
+            acks.append(ack)
+            if len(buffer.rows) >= self.flush_rows:
+                self.wakeup.set()
+        self.stats['accepted'] += len(rows)
+        return acks
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_seconds / 4)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            self._flush(force=False)
+
+    # Hand full or expired buffers (all of them when forced) to a background flush
+    def _flush(self, force):
+        now = time.monotonic()
+        due = [workout_id for workout_id, buffer in self.buffers.items()
+               if force or len(buffer.rows) >= self.flush_rows or now - buffer.first_at >= self.flush_seconds]
+        if due:
+            task = asyncio.create_task(self._write_buffers([self.buffers.pop(workout_id) for workout_id in due]))
+            self.flushes.add(task)
+            task.add_done_callback(self.flushes.discard)
+
+    # Pack buffers into insert requests of at most max_insert_rows; a buffer's acks are
+    # resolved once every request holding its rows has succeeded
+    async def _write_buffers(self, buffers):
+        chunks, owners = [[]], [[]]
+        for buffer in buffers:
+            for start in range(0, len(buffer.rows), self.max_insert_rows):
+                part = buffer.rows[start:start + self.max_insert_rows]
+                if len(chunks[-1]) + len(part) > self.max_insert_rows:
+                    chunks.append([])
+                    owners.append([])
+                chunks[-1].extend(part)
+                owners[-1].append(buffer)
+        results = await asyncio.gather(*(self._write_chunk(chunk) for chunk in chunks))
+
+        failed = {id(buffer) for ok, chunk_owners in zip(results, owners) if not ok for buffer in chunk_owners}
+        for buffer in buffers:
+            for ack in buffer.acks:
+                if ack.done():
+                    continue
+                if id(buffer) in failed:
+                    ack.set_exception(WriteFailed())
+                else:
+                    ack.set_result(None)
+        async with self.space:
+            self.pending_rows -= sum(len(buffer.rows) for buffer in buffers)
+            self.space.notify_all()
+
+    async def _write_chunk(self, rows):
+        loop = asyncio.get_running_loop()
+        async with self.writers:
+            for attempt in range(WRITE_ATTEMPTS):
+                try:
+                    await loop.run_in_executor(None, self.write, rows)
+                    self.stats['inserts'] += 1
+                    self.stats['written'] += len(rows)
+                    return True
+                except Exception as e:
+                    logger.warning("Insert of %d samples failed (attempt %d): %s", len(rows), attempt + 1, e)
+                    if attempt < WRITE_ATTEMPTS - 1:
+                        self.stats['retries'] += 1
+                        await asyncio.sleep(BACKOFF_SECONDS * 2 ** attempt)
+        self.stats['failed'] += len(rows)
+        return False
+
+    # Write everything still buffered and wait for all flushes
+    async def close(self):
+        if self.flusher is not None:
+            self.flusher.cancel()
+        self._flush(force=True)
+        while self.flushes:
+            await asyncio.gather(*list(self.flushes))
+
+    def health(self):
+        return {**self.stats, 'buffered_workouts': len(self.buffers), 'pending_rows': self.pending_rows}
+
+
+INGESTOR = web.AppKey('ingestor', Ingestor)
+TOKEN = web.AppKey('token', str)
+
+
+# Bulk upsert into userWorkoutHealth that skips samples already stored
+def supabase_writer(client):
+    from postgrest.types import ReturnMethod
+
+    def write(rows):
+        client.table(TABLE).upsert(rows, on_conflict=CONFLICT_COLUMNS, ignore_duplicates=True,
+                                   returning=ReturnMethod.minimal).execute()
+    return write
+
+
+def _authorized(request):
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), request.app[TOKEN].encode())
+
+
+async def post_samples(request):
+    if not _authorized(request):
+        return web.json_response({'error': "Missing or invalid bearer token"}, status=401,
+                                 headers={'WWW-Authenticate': 'Bearer'})
+    try:
+        rows = parse_samples(await request.json())
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+    ingestor = request.app[INGESTOR]
+    try:
+        acks = await ingestor.add(rows)
+    except Backpressure:
+        return web.json_response({'error': "Ingestion is busy, retry later"}, status=503,
+                                 headers={'Retry-After': str(RETRY_AFTER_SECONDS)})
+    try:
+        await asyncio.gather(*acks)
+    except WriteFailed:
+        return web.json_response({'error': "Samples could not be stored, retry later"}, status=503,
+                                 headers={'Retry-After': str(RETRY_AFTER_SECONDS)})
+    return web.json_response({'accepted': len(rows)})
+
+
+async def get_health(request):
+    return web.json_response(request.app[INGESTOR].health())
+
+
+# The ingestion app writing through write(rows) for posts bearing token; options are
+# passed to Ingestor
+def create_app(write, token, **options):
+    if not token:
+        raise ValueError("An ingestion token is required")
+    app = web.Application()
+    app[TOKEN] = token
+    app.router.add_post('/samples', post_samples)
+    app.router.add_get('/health', get_health)
+
+    async def lifecycle(app):
+        app[INGESTOR] = Ingestor(write, **options)
+        app[INGESTOR].start()
+        yield
+        await app[INGESTOR].close()
+
+    app.cleanup_ctx.append(lifecycle)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Heart-rate ingestion service')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    token = os.environ.get('INGEST_TOKEN')
+    if not token:
+        parser.error("INGEST_TOKEN must be set")
+
+    import supabase
+    logging.basicConfig(level=logging.INFO)
+    client = supabase.create_client(os.environ['SUPABASE_URL'], os.environ['SUPABASE_SERVICE_ROLE_KEY'])
+    web.run_app(create_app(supabase_writer(client), token), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import socketio
+from schema import DISPLAY_TIMEZONE
+from streaming import WorkoutStats
+
+# Live heart-rate feed for a running workout. A background socket.io client pushes
+# samples into a fixed-size ring buffer, so memory stays constant however long the
+# workout runs; the dashboard redraws only the live panel from the buffer. Every sample
+# also updates the feed's streaming statistics (streaming.WorkoutStats) for the panel's
+# rolling averages, zone times and alert.
+
+LIVE_BUFFER_SIZE = 3600  # Samples kept for the live chart
+LIVE_EVENT = 'heartrate'
+CONNECT_TIMEOUT_SECONDS = 5
+
+
+class RingBuffer:
+    def __init__(self, capacity=LIVE_BUFFER_SIZE):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)  # epoch seconds
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.total = 0  # Samples ever appended; also a sequence number for readers
+        self.lock = threading.Lock()
+
+    def append(self, timestamp, value):
+        with self.lock:
+            slot = self.total % self.capacity
+            self.timestamps[slot] = timestamp
+            self.values[slot] = value
+            self.total += 1
+
+    def extend(self, timestamps, values):
+        count = len(values)  # Only the last `capacity` are kept, but all of them count
+        timestamps = np.asarray(timestamps, dtype=np.float64)[-self.capacity:]
+        values = np.asarray(values, dtype=np.float32)[-self.capacity:]
+        with self.lock:
+            slots = (self.total + count - len(values) + np.arange(len(values))) % self.capacity
+            self.timestamps[slots] = timestamps
+            self.values[slots] = values
+            self.total += count
+
+    # (timestamps, values, total) in arrival order; only samples after `since` when given
+    def snapshot(self, since=0):
+        with self.lock:
+            count = min(self.total - since, self.capacity)
+            slots = (self.total - count + np.arange(count)) % self.capacity
+            return self.timestamps[slots], self.values[slots], self.total
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+
+def _epoch_seconds(value):
+    if value is None:
+        return time.time()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+class LiveFeed:
+    def __init__(self, url, username, age=None, capacity=LIVE_BUFFER_SIZE):
+        self.url = url
+        self.username = username
+        self.age = age
+        self.buffer = RingBuffer(capacity)
+        self.stats = WorkoutStats(age)
+        self.stats_lock = threading.Lock()
+        self.error = None
+        self.client = socketio.Client(reconnection=True, handle_sigint=False)
+        self.client.on('connect', self._on_connect)
+        self.client.on(LIVE_EVENT, self._on_samples)
+        threading.Thread(target=self._connect, daemon=True, name=f'live-{username}').start()
+
+    def _connect(self):
+        try:
+            self.client.connect(self.url, wait_timeout=CONNECT_TIMEOUT_SECONDS, retry=True)
+        except Exception as e:
+            self.error = str(e)
+
+    def _on_connect(self):
+        self.error = None
+        self.client.emit('subscribe', {"username": self.username})
+
+    # Accepts one {"timestamp", "heartrate"} sample or a list of them
+    def _on_samples(self, payload):
+        samples = payload if isinstance(payload, list) else [payload]
+        timestamps = [_epoch_seconds(sample.get('timestamp')) for sample in samples]
+        values = [sample['heartrate'] for sample in samples]
+        if len(samples) == 1:
+            self.buffer.append(timestamps[0], values[0])
+        else:
+            self.buffer.extend(timestamps, values)
+        with self.stats_lock:
+            for timestamp, value in zip(timestamps, values):
+                self.stats.update(timestamp, value)
+
+    @property
+    def connected(self):
+        return self.client.connected
+
+    # Current streaming statistics (WorkoutStats.snapshot())
+    def statistics(self):
+        with self.stats_lock:
+            return self.stats.snapshot()
+
+    # Buffered samples as a frame for charting
+    def frame(self, timezone=DISPLAY_TIMEZONE):
+        timestamps, values, _ = self.buffer.snapshot()
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(timestamps, unit='s', utc=True).tz_convert(timezone),
+            'heartrate': values,
+        })
+
+    def close(self):
+        self.client.disconnect()
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+# Process-wide live feed for the user's running workout, reused across reruns; age (from
+# the user's profile) sets the heart-rate zones and the alert threshold
+def get_feed(url, username, age=None):
+    with _feeds_lock:
+        feed = _feeds.get(username)
+        if feed is not None and feed.url != url:
+            feed.close()
+            feed = None
+        if feed is not None and feed.age != age:
+            # The profile changed mid-workout; keep the connection and restart the statistics
+            with feed.stats_lock:
+                feed.age, feed.stats = age, WorkoutStats(age)
+        if feed is None:
+            feed = LiveFeed(url, username, age)
+            _feeds[username] = feed
+        return feed
+
+
+# The disconnect runs in the background: with the polling transport it waits for the
+# pending long-poll request, which would hold the caller's script thread for seconds
+def close_feed(username):
+    with _feeds_lock:
+        feed = _feeds.pop(username, None)
+    if feed is not None:
+        threading.Thread(target=feed.close, daemon=True, name=f'live-close-{username}').start()
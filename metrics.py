@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Opt-in performance instrumentation. Spans time queries, storage calls and dashboard
+# sections and carry row/byte counts; each script rerun collects its spans into a run
+# record with totals. Records are kept per session for the debug sidebar, logged as
+# JSON lines and aggregated process-wide for a Prometheus text export.
+#
+# Enable per session with ?debug=1 in the URL, or for every session with
+# DASHBOARD_METRICS=1. While disabled, span() returns a shared no-op object.
+
+ENV_FLAG = 'DASHBOARD_METRICS'
+QUERY_PARAM = 'debug'
+RUN_HISTORY = 20  # Run records kept per session
+
+logger = logging.getLogger(__name__)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_payload(self, rows):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    __slots__ = ('run', 'name', 'kind', 'started', 'seconds', 'requests', 'rows', 'bytes')
+
+    def __init__(self, run, name, kind):
+        self.run = run
+        self.name = name
+        self.kind = kind
+        self.seconds = 0.0
+        self.requests = 1 if kind in ('query', 'storage') else 0
+        self.rows = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
+        self.run.add(self)
+        return False
+
+    # Count the rows of a response and the size of its JSON body
+    def add_payload(self, rows):
+        if rows is None:
+            return
+        if isinstance(rows, (bytes, bytearray)):
+            self.bytes += len(rows)
+            return
+        if isinstance(rows, dict):
+            rows = [rows]
+        self.rows += len(rows)
+        self.bytes += len(json.dumps(rows, default=str, separators=(',', ':')).encode())
+
+    def as_dict(self):
+        return {'name': self.name, 'kind': self.kind, 'seconds': self.seconds,
+                'requests': self.requests, 'rows': self.rows, 'bytes': self.bytes}
+
+
+class Run:
+    def __init__(self, page):
+        self.page = page
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.spans = []
+
+    def add(self, span):
+        self.spans.append(span)
+        _registry.observe(span)
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        _registry.observe_run(self)
+
+    def totals(self):
+        queries = [span for span in self.spans if span.kind in ('query', 'storage')]
+        return {
+            'seconds': self.seconds,
+            'requests': sum(span.requests for span in queries),
+            'query_seconds': sum(span.seconds for span in queries),
+            'rows': sum(span.rows for span in queries),
+            'bytes': sum(span.bytes for span in queries),
+            'section_seconds': sum(span.seconds for span in self.spans if span.kind == 'section'),
+        }
+
+    def as_dict(self):
+        return {'page': self.page, 'started_at': self.started_at, **self.totals(),
+                'spans': [span.as_dict() for span in self.spans]}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = {}  # (kind, name) -> [count, seconds, requests, rows, bytes]
+        self.runs = {}  # page -> [count, seconds]
+
+    def observe(self, span):
+        with self.lock:
+            entry = self.spans.setdefault((span.kind, span.name), [0, 0.0, 0, 0, 0])
+            entry[0] += 1
+            entry[1] += span.seconds
+            entry[2] += span.requests
+            entry[3] += span.rows
+            entry[4] += span.bytes
+
+    def observe_run(self, run):
+        with self.lock:
+            entry = self.runs.setdefault(run.page, [0, 0.0])
+            entry[0] += 1
+            entry[1] += run.seconds
+
+
+_registry = Registry()
+
+
+def _session():
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    return st.session_state
+
+
+def enabled():
+    session = _session()
+    return session is not None and session.get('metrics_enabled', False)
+
+
+def _current_run():
+    session = _session()
+    if session is None or not session.get('metrics_enabled', False):
+        return None
+    return session.get('metrics_run')
+
+
+# Time a block; returns an object with add_payload(rows) for queries
+def span(name, kind='block'):
+    run = _current_run()
+    if run is None:
+        return _NO_SPAN
+    return Span(run, name, kind)
+
+
+# Record work measured elsewhere (e.g. on a worker thread) as a finished span
+def record(name, kind='query', seconds=0.0, requests=1, rows=0, payload_bytes=0):
+    run = _current_run()
+    if run is not None:
+        finished = Span(run, name, kind)
+        finished.seconds, finished.requests, finished.rows, finished.bytes = seconds, requests, rows, payload_bytes
+        run.add(finished)
+
+
+class _Rerun:
+    def __init__(self, page):
+        self.page = page
+        self.run = None
+
+    def __enter__(self):
+        session = _session()
+        if session is None:
+            return self
+        if os.environ.get(ENV_FLAG) == '1' or st.query_params.get(QUERY_PARAM) == '1':
+            session['metrics_enabled'] = True
+        if session.get('metrics_enabled', False):
+            self.run = Run(self.page)
+            session['metrics_run'] = self.run
+        return self
+
+    # Also runs when the page calls st.rerun()/st.stop(), which raise to leave the script
+    def __exit__(self, *exc):
+        if self.run is not None:
+            self.run.finish()
+            st.session_state.setdefault('metrics_runs', deque(maxlen=RUN_HISTORY)).append(self.run)
+            logger.info(json.dumps(self.run.as_dict()))
+        return False
+
+
+# Wrap one script run of a page; spans recorded until the next rerun (including fragment reruns) land in it
+def rerun(page):
+    return _Rerun(page)
+
+
+def json_lines(runs):
+    return ''.join(json.dumps(run.as_dict()) + '\n' for run in runs)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Process-wide aggregates in the Prometheus text exposition format
+def prometheus_text():
+    with _registry.lock:
+        spans = sorted(_registry.spans.items())
+        runs = sorted(_registry.runs.items())
+
+    lines = [
+        '# HELP dashboard_span_seconds Time spent in instrumented queries, storage calls and sections.',
+        '# TYPE dashboard_span_seconds summary',
+    ]
+    for (kind, name), (count, seconds, _, _, _) in spans:
+        labels = f'kind="{_label(kind)}",name="{_label(name)}"'
+        lines.append(f'dashboard_span_seconds_sum{{{labels}}} {seconds:.6f}')
+        lines.append(f'dashboard_span_seconds_count{{{labels}}} {count}')
+    for metric, position, help_text in (
+            ('dashboard_requests_total', 2, 'Supabase and storage requests.'),
+            ('dashboard_rows_total', 3, 'Rows returned by Supabase requests.'),
+            ('dashboard_payload_bytes_total', 4, 'JSON payload bytes of Supabase requests and uploaded bytes.')):
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for (kind, name), entry in spans:
+            if kind in ('query', 'storage'):
+                lines.append(f'{metric}{{kind="{_label(kind)}",name="{_label(name)}"}} {entry[position]}')
+    lines += ['# HELP dashboard_rerun_seconds Script run time per page.', '# TYPE dashboard_rerun_seconds summary']
+    for page, (count, seconds) in runs:
+        lines.append(f'dashboard_rerun_seconds_sum{{page="{_label(page)}"}} {seconds:.6f}')
+        lines.append(f'dashboard_rerun_seconds_count{{page="{_label(page)}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+# Debug sidebar: totals and spans of the latest run, plus exports
+def render_panel():
+    if not enabled():
+        return
+    runs = list(st.session_state.get('metrics_runs', ()))
+    with st.sidebar.expander("Performance", expanded=True):
+        if not runs:
+            st.write("No runs recorded yet.")
+            return
+        latest = runs[-1]
+        totals = latest.totals()
+        st.write(f"**{latest.page}** rerun: {totals['seconds'] * 1000:.0f} ms")
+        st.write(f"Supabase: {totals['requests']} requests, {totals['query_seconds'] * 1000:.0f} ms, "
+                 f"{totals['rows']} rows, {totals['bytes'] / 1024:.1f} KB")
+        st.write(f"Sections: {totals['section_seconds'] * 1000:.0f} ms")
+        st.dataframe([span.as_dict() for span in latest.spans], hide_index=True)
+        st.download_button("Export JSON log", json_lines(runs), file_name='dashboard-metrics.jsonl',
+                           mime='application/x-ndjson')
+        st.download_button("Export Prometheus metrics", prometheus_text(), file_name='dashboard-metrics.prom',
+                           mime='text/plain')
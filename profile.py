@@ -1,10 +1,11 @@
 import streamlit as st
-import supabase
-import io
+import data
+import rollups
+from profile_images import upload_profile_image, delete_profile_image
 
 def profile_page():
-    # Initialize Supabase client
-    supabase_client = supabase.create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_SERVICE_ROLE_KEY"])
+    # Shared Supabase client for this process
+    supabase_client = data.get_client("SUPABASE_SERVICE_ROLE_KEY")
 
     col1, col2, col3 = st.columns([4, 1, 1])
     with col1:
@@ -27,10 +28,10 @@ def profile_page():
 
     try:
         # Fetch user details from 'user' table
-        user_response = supabase_client.table('user').select('*').eq('username', username).single().execute()
+        user_rows = data.fetch_user(supabase_client, username)
 
-        if user_response:
-            user_data = user_response.data
+        if user_rows:
+            user_data = user_rows[0]
 
             # Profile form with pre-filled values
             with st.form("profile_form"):
@@ -48,7 +49,7 @@ def profile_page():
 
                 with col2:
                     # File uploader for profile picture
-                    uploaded_file = st.file_uploader("Upload Profile Picture", type=["png", "jpg", "jpeg"])
+                    uploaded_file = st.file_uploader("Upload Profile Picture", type=["png", "jpg", "jpeg", "webp"])
 
                 st.divider()
                 st.subheader("Basic Info")
@@ -85,25 +86,14 @@ def profile_page():
             if save_button:
                 if uploaded_file is not None:
                     try:
-                        # Handle profile picture upload
-                        image_bytes = uploaded_file.read()  # Read raw bytes from the uploaded file
-                        file_ext = uploaded_file.name.split('.')[-1]
-                        file_name = f"profile_{username}.{file_ext}"
-
-                        public_url_response = supabase_client.storage.from_('profileImages').get_public_url(f"{username}/{file_name}")
-                        # Check if the user already has a profile picture, and delete the old one if it exists
-                        if public_url_response:
-                            delete_response = supabase_client.storage.from_('profileImages').remove(f"{username}/{file_name}")
-
-                        # Upload the file directly using raw bytes
-                        upload_response = supabase_client.storage.from_('profileImages').upload(f"{username}/{file_name}", image_bytes)
-                        public_url_response = supabase_client.storage.from_('profileImages').get_public_url(f"{username}/{file_name}")
-                        profile_picture_url = public_url_response
+                        # Resize, strip and recompress the picture, then upsert it with its thumbnail
+                        profile_picture_url = upload_profile_image(supabase_client, username, uploaded_file.getvalue())
 
                         # Update the user table with the profile picture URL
-                        update_profile_picture_response = supabase_client.table('user').update({
+                        update_profile_picture_response = data.execute(supabase_client.table('user').update({
                             'profilePicture': profile_picture_url
-                        }).eq('username', username).execute()
+                        }).eq('username', username), 'update user')
+                        data.invalidate_user(username)
 
                         st.success("Profile picture updated successfully!")
                         st.rerun()
@@ -113,14 +103,19 @@ def profile_page():
 
                 try:
                     # Update the rest of the user profile data
-                    update_response = supabase_client.table('user').update({
+                    profile_update = {
                         'caloriesBurnPerDay': calories_burn,
                         'workoutDurationPerDay': workout_duration_per_day,
                         'workoutFrequencyPerWeek': workout_frequency,
                         'age': age,
                         'weight': weight,
                         'gender': gender
-                    }).eq('username', username).execute()
+                    }
+                    update_response = data.execute(supabase_client.table('user').update(profile_update)
+                                                   .eq('username', username), 'update user')
+                    data.invalidate_user(username)
+                    # Goal changes re-evaluate the rollup flags; weight, age or gender rebuild the rollups
+                    rollups.get_worker().profile_changed(username, user_data, profile_update)
 
                     st.success("Profile updated successfully!")
                     st.rerun()
@@ -131,13 +126,13 @@ def profile_page():
             if delete_button:
                 try:
                     # Remove profile picture from Supabase storage
-                    file_name = f"profile_{username}.{user_data['profilePicture'].split('/')[-1].split('.')[0]}.jpg"
-                    delete_response = supabase_client.storage.from_('profileImages').remove(f"{username}/{file_name}")
+                    delete_profile_image(supabase_client, username)
 
                     # Remove the profile picture URL from the user table
-                    update_profile_picture_response = supabase_client.table('user').update({
+                    update_profile_picture_response = data.execute(supabase_client.table('user').update({
                         'profilePicture': None
-                    }).eq('username', username).execute()
+                    }).eq('username', username), 'update user')
+                    data.invalidate_user(username)
 
                     st.success("Profile picture deleted successfully!")
                     st.rerun()
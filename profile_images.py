@@ -0,0 +1,90 @@
+import hashlib
+import io
+import threading
+from PIL import Image, ImageOps, features
+import metrics
+
+# Profile picture pipeline: uploads are decoded once, re-oriented, stripped of EXIF
+# and other metadata, downscaled to the size the profile page shows and re-encoded
+# under a byte budget. Only that thumbnail is stored (the page has no larger view),
+# written with one upsert at a fixed per-user path, and the page links it.
+
+PROFILE_BUCKET = 'profileImages'
+THUMBNAIL_SIZE = 150  # Width the profile page displays the picture at
+THUMBNAIL_MAX_BYTES = 15 * 1024
+QUALITY_STEPS = (85, 75, 65, 55, 45)
+# Files are overwritten in place and the stored URL carries a content version, so browsers may cache them for good
+CACHE_CONTROL_SECONDS = 31536000
+# Extensions the original upload code used, removed together with the current file
+LEGACY_EXTENSIONS = ('png', 'jpg', 'jpeg')
+
+IMAGE_FORMAT, CONTENT_TYPE, EXTENSION = ('WEBP', 'image/webp', 'webp') if features.check('webp') \
+    else ('JPEG', 'image/jpeg', 'jpg')
+
+
+# Path of the stored thumbnail; without thumbnail, the full-size picture earlier versions also stored
+def profile_path(username, thumbnail=True):
+    suffix = '_thumb' if thumbnail else ''
+    return f"{username}/profile_{username}{suffix}.{EXTENSION}"
+
+
+def _encode(image, max_bytes):
+    if IMAGE_FORMAT == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    for quality in QUALITY_STEPS:
+        buffer = io.BytesIO()
+        # Saving without exif=/icc_profile= drops the metadata of the upload
+        if IMAGE_FORMAT == 'WEBP':
+            image.save(buffer, IMAGE_FORMAT, quality=quality, method=4)
+        else:
+            image.save(buffer, IMAGE_FORMAT, quality=quality, optimize=True, progressive=True)
+        if buffer.tell() <= max_bytes:
+            break
+    return buffer.getvalue()
+
+
+# Thumbnail bytes re-encoded from raw uploaded image bytes
+def process_profile_image(raw_bytes):
+    with Image.open(io.BytesIO(raw_bytes)) as upload:
+        # Let the JPEG decoder skip detail that the downscale would throw away
+        upload.draft('RGB', (THUMBNAIL_SIZE * 2, THUMBNAIL_SIZE * 2))
+        image = ImageOps.exif_transpose(upload)
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE * 4), Image.LANCZOS)
+    return _encode(image, THUMBNAIL_MAX_BYTES)
+
+
+_public_urls = {}
+_public_urls_lock = threading.Lock()
+
+
+def public_url(client, path):
+    with _public_urls_lock:
+        url = _public_urls.get(path)
+        if url is None:
+            url = client.storage.from_(PROFILE_BUCKET).get_public_url(path)
+            _public_urls[path] = url
+        return url
+
+
+# Process and store a user's picture; returns the versioned thumbnail URL to save on the user row
+def upload_profile_image(client, username, raw_bytes):
+    with metrics.span('process profile image'):
+        thumbnail_bytes = process_profile_image(raw_bytes)
+    file_options = {"content-type": CONTENT_TYPE, "cache-control": str(CACHE_CONTROL_SECONDS), "upsert": "true"}
+    with metrics.span(f"upload {PROFILE_BUCKET}", kind='storage') as span:
+        client.storage.from_(PROFILE_BUCKET).upload(profile_path(username), thumbnail_bytes, file_options=file_options)
+        span.add_payload(thumbnail_bytes)
+
+    version = hashlib.sha256(thumbnail_bytes).hexdigest()[:12]
+    return f"{public_url(client, profile_path(username))}?v={version}"
+
+
+# Remove every stored picture of the user (the thumbnail, the full-size picture and the
+# original upload names earlier versions stored) in one call
+def delete_profile_image(client, username):
+    paths = [profile_path(username), profile_path(username, thumbnail=False)]
+    paths += [f"{username}/profile_{username}.{extension}" for extension in LEGACY_EXTENSIONS]
+    with metrics.span(f"remove {PROFILE_BUCKET}", kind='storage'):
+        client.storage.from_(PROFILE_BUCKET).remove(paths)
@@ -0,0 +1,294 @@
+import logging
+import threading
+import time
+import pandas as pd
+import cohorts
+import data
+import summaries
+from analytics import prepare_workouts
+from backend import SupabaseBackend, DAILY_ROLLUP_COLUMNS, WEEKLY_ROLLUP_COLUMNS
+from schema import parse_timestamps, utc_bounds
+
+# Per-user daily and weekly workout rollups (sql/rollups.sql): workout count, total
+# duration, calories, sample-weighted average heart rate and goal-met flags. A
+# background worker keeps them current. It polls userWorkouts past the highest
+# workout_id it has seen, and Stop schedules the day just recorded. Only the weeks
+# holding those days are recomputed. Goal changes re-evaluate the flags of the
+# stored rows without reading any workouts. The dashboard reads the two small tables
+# instead of aggregating every workout on each page load. Workouts are summarized
+# (summaries.py) before the rollups of their week are computed, and every poll adds
+# the newly summarized workouts to the cohort sketches (cohorts.py). Work that fails is
+# queued again and retried after a delay that doubles with each consecutive failure.
+
+POLL_SECONDS = 30
+RETRY_SECONDS = 5
+MAX_RETRY_SECONDS = 300
+GOAL_COLUMNS = ('workoutDurationPerDay', 'caloriesBurnPerDay', 'workoutFrequencyPerWeek')
+# Calories depend on these, so changing them re-summarizes the user's workouts and rebuilds
+# all of their rollups
+CALORIE_COLUMNS = ('weight', 'age', 'gender')
+ROLLUP_SUMS = {'workouts': ('workout_id', 'count'), 'duration': ('duration', 'sum'),
+               'calories_burned': ('calories_burned', 'sum'), 'heart_beats': ('heart_beats', 'sum'),
+               'samples': ('samples', 'sum')}
+
+logger = logging.getLogger(__name__)
+
+
+# Local calendar day ('YYYY-MM-DD') of each workout start time
+def local_days(start_times):
+    return parse_timestamps(start_times).dt.strftime('%Y-%m-%d')
+
+
+# Monday ('YYYY-MM-DD') of the week of each day
+def week_starts(days):
+    days = pd.to_datetime(pd.Series(days, dtype=object))
+    return (days - pd.to_timedelta(days.dt.weekday, unit='D')).dt.strftime('%Y-%m-%d')
+
+
+def _rollup(df_workouts, key):
+    rollup = df_workouts.groupby(key, sort=True).agg(**ROLLUP_SUMS).reset_index()
+    rollup['avg_heartrate'] = (rollup['heart_beats'] / rollup['samples']).where(rollup['samples'] > 0)
+    return rollup
+
+
+# Goal-met flags as the dashboard evaluates them: mean workout duration and total calories
+# per day, number of workouts per week
+def apply_goals(daily, weekly, user):
+    duration_goal, calories_goal, frequency_goal = (user.get(column) for column in GOAL_COLUMNS)
+    workouts = daily['workouts'].astype(float)
+    daily = daily.assign(
+        met_duration_goal=daily['duration'].astype(float) / workouts >= duration_goal if duration_goal is not None else False,
+        met_calories_goal=daily['calories_burned'].astype(float) >= calories_goal if calories_goal else False,
+    )
+    weekly = weekly.assign(
+        met_frequency_goal=weekly['workouts'].astype(float) >= frequency_goal if frequency_goal else False)
+    return daily[DAILY_ROLLUP_COLUMNS], weekly[WEEKLY_ROLLUP_COLUMNS]
+
+
+# (daily, weekly) rollup frames of one user from their userWorkouts rows (raw or prepared)
+# and workout summaries (workout_id, avg_heartrate, samples, calories_burned; see summaries.py)
+def build_rollups(df_workouts, workout_summary, user):
+    if df_workouts.empty:
+        return pd.DataFrame(columns=DAILY_ROLLUP_COLUMNS), pd.DataFrame(columns=WEEKLY_ROLLUP_COLUMNS)
+
+    df = prepare_workouts(df_workouts[['workout_id', 'startDT', 'endDT']])
+    summary = workout_summary[['workout_id', 'avg_heartrate', 'samples', 'calories_burned']].astype(
+        {'workout_id': df['workout_id'].dtype, 'calories_burned': float})
+    df = df.merge(summary, on='workout_id', how='left')
+
+    # Daily and weekly heart rate are weighted by samples, i.e. the mean over all samples
+    samples = df['samples'].astype(float).fillna(0)
+    df = df.assign(username=user['username'], day=local_days(df['startDT']), samples=samples,
+                   heart_beats=df['avg_heartrate'].astype(float).fillna(0) * samples)
+    df['week_start'] = week_starts(df['day']).to_numpy()
+    return apply_goals(_rollup(df, ['username', 'day']), _rollup(df, ['username', 'week_start']), user)
+
+
+# Recompute the rollups of the weeks holding the given days ('YYYY-MM-DD'). Weeks between
+# the first and last one are rewritten too, unchanged if they had no new workouts.
+def refresh_days(backend, username, days):
+    user = backend.user_row(username)
+    if user is None or not days:
+        return
+    mondays = week_starts(sorted(days))
+    first_day = mondays.min()
+    last_day = (pd.Timestamp(mondays.max()) + pd.Timedelta(days=6)).strftime('%Y-%m-%d')
+    start, end = utc_bounds(first_day, last_day)
+    df_workouts = backend.user_workouts(username, start, end)
+    summary = summaries.ensure_summaries(backend, user, df_workouts, start, end)
+    daily, weekly = build_rollups(df_workouts, summary, user)
+    backend.replace_rollups(username, first_day, last_day, daily, weekly)
+
+
+# Recompute all of the user's rollups; with resummarize also every workout summary, whose
+# calories and zone times depend on the profile
+def rebuild(backend, username, resummarize=False):
+    user = backend.user_row(username)
+    if user is None:
+        return
+    if resummarize:
+        summaries.resummarize(backend, user)
+    df_workouts = backend.user_workouts(username)
+    daily, weekly = build_rollups(df_workouts, summaries.ensure_summaries(backend, user, df_workouts), user)
+    backend.replace_rollups(username, None, None, daily, weekly)
+
+
+# Re-evaluate the goal flags of the stored rollups against the user's current goals
+def refresh_goals(backend, username):
+    user = backend.user_row(username)
+    if user is None:
+        return
+    daily, weekly = apply_goals(backend.daily_rollup(username), backend.weekly_rollup(username), user)
+    backend.replace_rollups(username, None, None, daily, weekly)
+
+
+# Background thread applying scheduled refreshes and polling for new workouts.
+# on_refresh(username) is called after a user's rollups were written.
+class RollupWorker:
+    def __init__(self, backend, poll_seconds=POLL_SECONDS, on_refresh=None):
+        self.backend = backend
+        self.poll_seconds = poll_seconds
+        self.on_refresh = on_refresh
+        self.watermark = None  # Highest workout_id seen by the poll
+        self.pending = {}  # username -> set of days, or None for a full rebuild
+        self.goals = set()  # Users whose goal flags need re-evaluating
+        self.profiles = set()  # Users whose workout summaries need recomputing
+        self.error = None
+        self.failures = 0  # Consecutive failed runs
+        self.retry_at = 0.0  # Queued work waits until this monotonic time after a failure
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True, name='rollup-worker')
+        self.thread.start()
+
+    # Refresh the weeks of the given days, or rebuild all of the user's rollups when days is None
+    def schedule(self, username, days=None):
+        with self.condition:
+            if days is None:
+                self.pending[username] = None
+            elif self.pending.get(username, ()) is not None:
+                self.pending.setdefault(username, set()).update(days)
+            self.condition.notify()
+
+    def goals_changed(self, username):
+        with self.condition:
+            self.goals.add(username)
+            self.condition.notify()
+
+    # Schedule what a profile update invalidates; before and after are user rows
+    def profile_changed(self, username, before, after):
+        if any(before.get(column) != after.get(column) for column in CALORIE_COLUMNS):
+            with self.condition:
+                self.profiles.add(username)
+            self.schedule(username)
+        elif any(before.get(column) != after.get(column) for column in GOAL_COLUMNS):
+            self.goals_changed(username)
+
+    # Schedule the days of workouts added since the last poll. The first poll only records
+    # the watermark; workouts from before the worker started are caught by the dashboard's
+    # coverage check in load_rollups().
+    def poll(self):
+        if self.watermark is None:
+            self.watermark = self.backend.latest_workout_id() or 0
+            return
+        new_workouts = self.backend.workouts_after(self.watermark)
+        if new_workouts.empty:
+            return
+        self.watermark = int(new_workouts['workout_id'].max())
+        days = local_days(new_workouts['startDT'])
+        for username, user_days in days.groupby(new_workouts['username'].to_numpy()):
+            self.schedule(username, set(user_days))
+
+    # Queue work again after it failed; anything scheduled since is merged with it
+    def _requeue(self, pending, goals, profiles):
+        for username, days in pending.items():
+            self.schedule(username, days)
+        with self.condition:
+            self.goals |= goals
+            self.profiles |= profiles
+
+    def _process(self, pending, goals, profiles=()):
+        for username, days in pending.items():
+            if days is None:
+                rebuild(self.backend, username, resummarize=username in profiles)
+            else:
+                refresh_days(self.backend, username, days)
+        # A rebuild already applies the current goals
+        for username in goals - {username for username, days in pending.items() if days is None}:
+            refresh_goals(self.backend, username)
+        for username in set(pending) | goals:
+            if self.on_refresh is not None:
+                self.on_refresh(username)
+
+    def _run(self):
+        next_poll = 0.0
+        while True:
+            with self.condition:
+                wake = next_poll if self.retry_at <= time.monotonic() else min(next_poll, self.retry_at)
+                self.condition.wait_for(
+                    lambda: self.stopped or ((self.pending or self.goals) and time.monotonic() >= self.retry_at),
+                    timeout=max(wake - time.monotonic(), 0))
+                if self.stopped:
+                    return
+                pending, goals, profiles = {}, set(), set()
+                if time.monotonic() >= self.retry_at:
+                    pending, self.pending = self.pending, {}
+                    goals, self.goals = self.goals, set()
+                    profiles, self.profiles = self.profiles, set()
+            try:
+                polled = time.monotonic() >= next_poll
+                if polled:
+                    next_poll = time.monotonic() + self.poll_seconds
+                    self.poll()
+                self._process(pending, goals, profiles)
+                pending, goals, profiles = {}, set(), set()
+                if polled:
+                    cohorts.update(self.backend)
+                self.error = None
+                self.failures, self.retry_at = 0, 0.0
+            except Exception as e:
+                self.error = str(e)
+                logger.exception("Rollup refresh failed")
+                self._requeue(pending, goals, profiles)
+                self.failures += 1
+                self.retry_at = time.monotonic() + min(RETRY_SECONDS * 2 ** (self.failures - 1), MAX_RETRY_SECONDS)
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# Process-wide worker writing to Supabase with the service role key, started on first use
+def get_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            backend = SupabaseBackend(data.get_client("SUPABASE_SERVICE_ROLE_KEY"), cached=False)
+            _worker = RollupWorker(backend, on_refresh=data.invalidate_user)
+        return _worker
+
+
+def stop_worker():
+    global _worker
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is not None:
+        worker.stop()
+
+
+# The user's (daily, weekly) rollups for the dashboard, limited to first_day..last_day
+# ('YYYY-MM-DD') when given (weeks starting in that range, see
+# QueryBackend.weekly_rollup), with df_workouts holding the workouts of those days. When the
+# stored rows do not cover every workout (the worker has not caught up, or the tables
+# were just created) they are built here from the workouts already loaded and a rebuild
+# is scheduled.
+def load_rollups(backend, user, df_workouts, workout_summary, first_day=None, last_day=None):
+    username = user['username']
+    worker = get_worker()
+    try:
+        daily = backend.daily_rollup(username, first_day, last_day)
+        weekly = backend.weekly_rollup(username, first_day, last_day)
+        if daily['workouts'].astype(float).sum() == len(df_workouts):
+            return daily, weekly
+    except Exception as e:
+        logger.warning("Reading the rollups of %s failed: %s", username, e)
+    worker.schedule(username)
+    daily, weekly = build_rollups(df_workouts, workout_summary, user)
+    if first_day is not None:
+        weekly = weekly[weekly['week_start'] >= first_day].reset_index(drop=True)
+    return daily, weekly
+
+
+# The user's lifetime totals (see backend.lifetime_summary), or None when they cannot be read
+def load_lifetime_summary(backend, username):
+    try:
+        return backend.lifetime_summary(username)
+    except Exception as e:
+        logger.warning("Reading the lifetime summary of %s failed: %s", username, e)
+        return None
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+# Compact in-memory dtypes for the Supabase tables. Rows arrive as JSON (object
+# strings, int64/float64 numbers); frames held per session are converted once:
+# repeated strings become categoricals, counts and heart rates small integers or
+# float32, and timestamps are parsed once (ISO-8601, converted to the display
+# timezone) instead of on every rerun.
+
+TIMESTAMP_FORMAT = 'ISO8601'
+# Timezone the dashboard displays timestamps and calendar days in (matches the workout
+# start times the trainer records)
+DISPLAY_TIMEZONE = 'Asia/Singapore'
+
+# column -> dtype; 'timestamp' and 'small_int' are handled by the converters below
+WORKOUT_DTYPES = {
+    'workout_id': 'int32',  # Unique per row, so a plain integer is smaller than a categorical
+    'username': 'category',
+    'workout': 'category',
+    'startDT': 'timestamp',
+    'endDT': 'timestamp',
+    'reps': 'small_int',
+    'overallAccuracy': 'float32',
+}
+HEALTH_DTYPES = {
+    'workout_id': 'category',  # Repeated on every sample
+    'timestamp': 'timestamp',
+    'heartrate': 'small_int',
+}
+
+
+# Timestamps as datetime64 in the display timezone; already parsed values are only converted
+def parse_timestamps(values):
+    values = pd.Series(values)
+    if not isinstance(values.dtype, pd.DatetimeTZDtype):
+        values = pd.to_datetime(values, utc=True, format=TIMESTAMP_FORMAT)
+    return values.dt.tz_convert(DISPLAY_TIMEZONE)
+
+
+# UTC ISO timestamps of local midnight at the start of first_day and after last_day,
+# the [start, end) bounds of those calendar days for startDT/timestamp filters
+def utc_bounds(first_day, last_day):
+    start = pd.Timestamp(first_day).tz_localize(DISPLAY_TIMEZONE)
+    end = (pd.Timestamp(last_day) + pd.Timedelta(days=1)).tz_localize(DISPLAY_TIMEZONE)
+    return start.tz_convert('UTC').isoformat(), end.tz_convert('UTC').isoformat()
+
+
+# Smallest unsigned integer dtype that holds the values, float32 when they are fractional or missing
+def small_int(values):
+    values = pd.Series(values)
+    numbers = pd.to_numeric(values, errors='coerce')
+    finite = numbers.dropna()
+    if len(finite) == len(numbers) and (finite == np.round(finite)).all() and (finite >= 0).all():
+        maximum = finite.max() if len(finite) else 0
+        for dtype in (np.uint8, np.uint16, np.uint32):
+            if maximum <= np.iinfo(dtype).max:
+                return numbers.astype(dtype)
+    return numbers.astype(np.float32)
+
+
+def _convert(values, dtype):
+    if dtype == 'timestamp':
+        return parse_timestamps(values)
+    if dtype == 'small_int':
+        return small_int(values)
+    if dtype == 'category' and isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.remove_unused_categories()
+    return values.astype(dtype)
+
+
+# Frame (or list of row dicts) with the given column dtypes applied; other columns are kept as they are
+def apply_dtypes(frame, dtypes):
+    frame = pd.DataFrame(frame)
+    return frame.assign(**{column: _convert(frame[column], dtype)
+                           for column, dtype in dtypes.items() if column in frame})
+
+
+def workouts_frame(rows):
+    return apply_dtypes(rows, WORKOUT_DTYPES)
+
+
+def health_frame(rows):
+    return apply_dtypes(rows, HEALTH_DTYPES)
@@ -0,0 +1,52 @@
+import time
+from contextlib import contextmanager
+import pandas as pd
+import streamlit as st
+import metrics
+
+# Per-session helpers for the dashboard sections: a section's results are reused
+# while its inputs are unchanged, and every section records how long it took.
+
+
+# Cheap identity of a section's inputs (frame contents and dtypes, or scalar reprs)
+def fingerprint(*inputs):
+    parts = []
+    for value in inputs:
+        if isinstance(value, pd.DataFrame):
+            # Hashes of the rows in order, so reordered rows give a different fingerprint
+            content = pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes()
+            parts.append((tuple(value.columns), tuple(map(str, value.dtypes)), len(value), content))
+        else:
+            parts.append(repr(value))
+    return hash(tuple(parts))
+
+
+# Return build() for this section, reusing the previous result while the inputs are unchanged
+def cached_build(name, build, *inputs):
+    cache = st.session_state.setdefault('section_cache', {})
+    key = fingerprint(*inputs)
+    cached = cache.get(name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    result = build()
+    cache[name] = (key, result)
+    return result
+
+
+# Time a section's compute + render and show it under the section
+@contextmanager
+def timed(name):
+    started = time.perf_counter()
+    with metrics.span(name, kind='section'):
+        yield
+    elapsed = time.perf_counter() - started
+    st.session_state.setdefault('section_timings', {})[name] = elapsed
+    st.caption(f"Computed in {elapsed * 1000:.0f} ms")
+
+
+def render_timings():
+    timings = st.session_state.get('section_timings')
+    if timings:
+        with st.sidebar.expander("Section compute time"):
+            for name, elapsed in timings.items():
+                st.write(f"{name}: {elapsed * 1000:.0f} ms")
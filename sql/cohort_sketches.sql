@@ -0,0 +1,79 @@
+-- Quantile sketches of workout duration, overallAccuracy and calories per workout type
+-- and cohort, for the dashboard's cohort comparison (cohorts.py). cohort is 'all' or a
+-- gender and age band such as 'Female 25-34'; sketch is a base64 quantiles.KLLSketch.
+-- A cohort may hold several rows (one per batch a worker process added); readers merge
+-- them and the worker merges them into one once there are too many.
+-- workoutCohortMember records the workouts already added, so each is added once
+-- however many worker processes race for it. Workers only write through the two
+-- functions below, which claim and insert, or merge, in one transaction.
+-- Apply in the Supabase SQL editor; the rollup worker writes with the service role key.
+
+create table if not exists "workoutCohortSketch" (
+    "id" uuid primary key,
+    "workout" text not null,
+    "cohort" text not null,
+    "metric" text not null,
+    "count" bigint not null,
+    "sketch" text not null,
+    "created_at" timestamptz not null default now()
+);
+
+create index if not exists "workoutCohortSketch_workout_cohort"
+    on "workoutCohortSketch" ("workout", "cohort", "metric");
+
+create table if not exists "workoutCohortMember" (
+    "workout_id" bigint primary key references "userWorkouts" ("workout_id") on delete cascade,
+    "sketched_at" timestamptz not null default now()
+);
+
+-- Summarized workouts not in the sketches yet, with the values the sketches hold
+create or replace view "unsketchedWorkouts" as
+select s."workout_id", s."username", w."workout", s."duration", w."overallAccuracy", s."calories_burned"
+from "userWorkoutSummary" s
+join "userWorkouts" w on w."workout_id" = s."workout_id"
+left join "workoutCohortMember" m on m."workout_id" = s."workout_id"
+where m."workout_id" is null;
+
+-- Claim the workouts and insert the sketch rows holding them in one transaction, so a
+-- workout is never claimed without being sketched. Returns false, writing nothing, when
+-- another worker claimed any of them first; the caller re-reads unsketchedWorkouts.
+create or replace function "add_cohort_sketches"(workout_ids bigint[], sketches jsonb)
+returns boolean language plpgsql as $$
+declare
+    claimed integer;
+begin
+    insert into "workoutCohortMember" ("workout_id")
+    select unnest(workout_ids)
+    on conflict do nothing;
+    get diagnostics claimed = row_count;
+    if claimed < cardinality(workout_ids) then
+        raise exception using errcode = 'CS001', message = 'cohort workouts already claimed';
+    end if;
+    insert into "workoutCohortSketch" ("id", "workout", "cohort", "metric", "count", "sketch")
+    select "id", "workout", "cohort", "metric", "count", "sketch"
+    from jsonb_to_recordset(sketches)
+        as s("id" uuid, "workout" text, "cohort" text, "metric" text, "count" bigint, "sketch" text);
+    return true;
+exception when sqlstate 'CS001' then
+    return false;
+end $$;
+
+-- Replace the sketch rows ids with their merged row in one transaction. Returns false,
+-- writing nothing, when another worker already merged any of them.
+create or replace function "merge_cohort_sketches"(ids uuid[], merged jsonb)
+returns boolean language plpgsql as $$
+declare
+    taken integer;
+begin
+    delete from "workoutCohortSketch" where "id" = any(ids);
+    get diagnostics taken = row_count;
+    if taken < cardinality(ids) then
+        raise exception using errcode = 'CS002', message = 'cohort sketches already merged';
+    end if;
+    insert into "workoutCohortSketch" ("id", "workout", "cohort", "metric", "count", "sketch")
+    select "id", "workout", "cohort", "metric", "count", "sketch"
+    from jsonb_populate_record(null::"workoutCohortSketch", merged);
+    return true;
+exception when sqlstate 'CS002' then
+    return false;
+end $$;
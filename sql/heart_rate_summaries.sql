@@ -0,0 +1,40 @@
+-- Heart-rate aggregates served to the dashboard instead of raw userWorkoutHealth samples.
+-- Apply in the Supabase SQL editor; backend.SupabaseBackend reads these views.
+-- workoutHeartRateSummary carries startDT so the dashboard's date range is filtered in the database.
+
+create or replace view "workoutHeartRateSummary" as
+select
+    w."workout_id",
+    w."username",
+    avg(h."heartrate")::float8 as "avg_heartrate",
+    min(h."heartrate")::float8 as "min_heartrate",
+    max(h."heartrate")::float8 as "max_heartrate",
+    count(h."heartrate") as "samples",
+    w."startDT"
+from "userWorkouts" w
+join "userWorkoutHealth" h on h."workout_id" = w."workout_id"
+group by w."workout_id", w."username", w."startDT";
+
+create or replace view "dailyHeartRateSummary" as
+select
+    w."username",
+    (h."timestamp" at time zone 'Asia/Singapore')::date as "day",
+    avg(h."heartrate")::float8 as "avg_heartrate",
+    min(h."heartrate")::float8 as "min_heartrate",
+    max(h."heartrate")::float8 as "max_heartrate",
+    count(h."heartrate") as "samples"
+from "userWorkouts" w
+join "userWorkoutHealth" h on h."workout_id" = w."workout_id"
+group by w."username", 2;
+
+create or replace view "weeklyHeartRateSummary" as
+select
+    w."username",
+    date_trunc('week', h."timestamp" at time zone 'Asia/Singapore')::date as "week_start",
+    avg(h."heartrate")::float8 as "avg_heartrate",
+    min(h."heartrate")::float8 as "min_heartrate",
+    max(h."heartrate")::float8 as "max_heartrate",
+    count(h."heartrate") as "samples"
+from "userWorkouts" w
+join "userWorkoutHealth" h on h."workout_id" = w."workout_id"
+group by w."username", 2;
@@ -0,0 +1,6 @@
+-- Lets the ingestion service (ingest.py) upsert with on_conflict=workout_id,timestamp and
+-- ignore_duplicates, so samples re-sent after a failed or unacknowledged post are
+-- stored once. Apply in the Supabase SQL editor.
+
+create unique index if not exists "userWorkoutHealth_workout_id_timestamp"
+    on "userWorkoutHealth" ("workout_id", "timestamp");
@@ -0,0 +1,42 @@
+-- Per-user daily and weekly workout rollups, kept up to date by rollups.RollupWorker
+-- and read by the dashboard instead of aggregating userWorkouts on every page load.
+-- Days and weeks are calendar dates in Asia/Singapore; weeks start on Monday.
+-- duration is the total minutes, so the mean per workout is duration / workouts.
+-- Apply in the Supabase SQL editor; the worker writes with the service role key.
+
+create table if not exists "userDailyRollup" (
+    "username" text not null,
+    "day" date not null,
+    "workouts" integer not null,
+    "duration" float8 not null,
+    "calories_burned" float8 not null,
+    "avg_heartrate" float8,
+    "met_duration_goal" boolean not null,
+    "met_calories_goal" boolean not null,
+    primary key ("username", "day")
+);
+
+create table if not exists "userWeeklyRollup" (
+    "username" text not null,
+    "week_start" date not null,
+    "workouts" integer not null,
+    "duration" float8 not null,
+    "calories_burned" float8 not null,
+    "avg_heartrate" float8,
+    "met_frequency_goal" boolean not null,
+    primary key ("username", "week_start")
+);
+
+-- One row of lifetime totals per user, summed over the daily rollup, so the dashboard
+-- can show them without loading any history outside its date range.
+create or replace view "userLifetimeSummary" as
+select
+    "username",
+    sum("workouts")::integer as "workouts",
+    sum("duration")::float8 as "duration",
+    sum("calories_burned")::float8 as "calories_burned",
+    count(*)::integer as "active_days",
+    min("day") as "first_day",
+    max("day") as "last_day"
+from "userDailyRollup"
+group by "username";
@@ -0,0 +1,33 @@
+-- Per-workout summary written once after a workout is recorded (summaries.py), so the
+-- dashboard reads these columns instead of recomputing them from userWorkoutHealth on
+-- every page load. duration is in minutes; zoneN_seconds is the time spent in heart-rate
+-- zone N (percent of the age-predicted maximum, see HEART_RATE_ZONES in zones.py). Calories
+-- and zone times are null while the user's profile lacks weight, age or gender.
+-- Apply in the Supabase SQL editor; the rollup worker writes with the service role key.
+
+create table if not exists "userWorkoutSummary" (
+    "workout_id" bigint primary key references "userWorkouts" ("workout_id") on delete cascade,
+    "username" text not null,
+    "startDT" timestamptz not null,
+    "duration" float8 not null,
+    "avg_heartrate" float8,
+    "max_heartrate" float8,
+    "samples" integer not null,
+    "zone1_seconds" float8,
+    "zone2_seconds" float8,
+    "zone3_seconds" float8,
+    "zone4_seconds" float8,
+    "zone5_seconds" float8,
+    "calories_burned" float8,
+    "summarized_at" timestamptz not null default now()
+);
+
+create index if not exists "userWorkoutSummary_username_startDT"
+    on "userWorkoutSummary" ("username", "startDT");
+
+-- Workouts without a summary yet, for the backfill job (python -m summaries)
+create or replace view "unsummarizedWorkouts" as
+select w.*
+from "userWorkouts" w
+left join "userWorkoutSummary" s on s."workout_id" = w."workout_id"
+where s."workout_id" is null;
@@ -0,0 +1,132 @@
+import math
+import threading
+from bisect import bisect_right
+from collections import deque
+from zones import HEART_RATE_ZONES, MAX_SAMPLE_GAP_SECONDS, max_heart_rate
+
+# Streaming heart-rate statistics for running workouts. Each sample updates a workout's
+# state in O(1) (amortized for the window): an exponentially weighted mean, the mean and
+# maximum over the last WINDOW_SECONDS (a running sum and a monotonic deque), the peak,
+# seconds in each heart-rate zone and an over-threshold alert from the user's age. The
+# state of one workout is a __slots__ object of a few numbers and two deques bounded by
+# the window, so one process can track thousands of live workouts; nothing is kept per
+# sample once it leaves the window.
+
+WINDOW_SECONDS = 30.0
+EWMA_HALF_LIFE_SECONDS = 10.0
+# Alert while the smoothed heart rate is at or above this fraction of the age-predicted
+# maximum, i.e. in the top zone
+ALERT_FRACTION = HEART_RATE_ZONES[-1]
+
+
+class WorkoutStats:
+    __slots__ = ('window_seconds', 'half_life_seconds', 'max_heart_rate', 'alert_threshold', 'samples',
+                 'last_time', 'last_zone', 'ewma', 'peak', 'window', 'window_sum', 'window_peaks', 'zone_seconds')
+
+    # Without an age there are no zones and no alert
+    def __init__(self, age=None, window_seconds=WINDOW_SECONDS, half_life_seconds=EWMA_HALF_LIFE_SECONDS):
+        self.window_seconds = window_seconds
+        self.half_life_seconds = half_life_seconds
+        maximum = self.max_heart_rate = max_heart_rate(age) if age else None
+        self.alert_threshold = ALERT_FRACTION * maximum if maximum else None
+        self.samples = 0
+        self.last_time = None
+        self.last_zone = -1
+        self.ewma = None
+        self.peak = None
+        self.window = deque()  # (timestamp, heart rate) of the last window_seconds
+        self.window_sum = 0.0
+        self.window_peaks = deque()  # Decreasing heart rates; the first is the window's maximum
+        self.zone_seconds = [0.0] * len(HEART_RATE_ZONES) if maximum else None
+
+    # Add one sample (epoch seconds, bpm); samples older than the last one and samples
+    # without a heart rate (None or NaN, a sensor dropout) are ignored
+    def update(self, timestamp, heartrate):
+        if heartrate is None or math.isnan(heartrate):
+            return
+        if self.last_time is not None:
+            elapsed = timestamp - self.last_time
+            if elapsed < 0:
+                return
+            # The time since the previous sample is credited to its zone, like summaries.summarize()
+            if self.last_zone >= 0:
+                self.zone_seconds[self.last_zone] += min(elapsed, MAX_SAMPLE_GAP_SECONDS)
+            self.ewma = heartrate + (self.ewma - heartrate) * 0.5 ** (elapsed / self.half_life_seconds)
+            self.peak = max(self.peak, heartrate)
+        else:
+            self.ewma = self.peak = heartrate
+        self.samples += 1
+        self.last_time = timestamp
+        if self.max_heart_rate is not None:
+            self.last_zone = bisect_right(HEART_RATE_ZONES, heartrate / self.max_heart_rate) - 1
+
+        cutoff = timestamp - self.window_seconds
+        window, peaks = self.window, self.window_peaks
+        window.append((timestamp, heartrate))
+        self.window_sum += heartrate
+        while window[0][0] <= cutoff:
+            self.window_sum -= window.popleft()[1]
+        while peaks and peaks[-1][1] <= heartrate:
+            peaks.pop()
+        peaks.append((timestamp, heartrate))
+        while peaks[0][0] <= cutoff:
+            peaks.popleft()
+
+    @property
+    def window_mean(self):
+        return self.window_sum / len(self.window) if self.window else None
+
+    @property
+    def window_max(self):
+        return self.window_peaks[0][1] if self.window_peaks else None
+
+    @property
+    def alert(self):
+        return self.alert_threshold is not None and self.ewma is not None and self.ewma >= self.alert_threshold
+
+    def snapshot(self):
+        return {
+            'samples': self.samples,
+            'heartrate': self.window[-1][1] if self.window else None,
+            'ewma': self.ewma,
+            'window_mean': self.window_mean,
+            'window_max': self.window_max,
+            'peak': self.peak,
+            'zone_seconds': tuple(self.zone_seconds) if self.zone_seconds is not None else None,
+            'alert': self.alert,
+            'alert_threshold': self.alert_threshold,
+        }
+
+
+# WorkoutStats of many concurrent workouts, keyed by any hashable id
+class StatsTracker:
+    def __init__(self, **options):
+        self.options = options  # Passed to every WorkoutStats
+        self.workouts = {}
+        self.lock = threading.Lock()
+
+    def start(self, key, age=None):
+        with self.lock:
+            stats = self.workouts[key] = WorkoutStats(age, **self.options)
+        return stats
+
+    # Add samples [(timestamp, heartrate), ...] to a workout, starting it without an age if needed
+    def update(self, key, samples):
+        with self.lock:
+            stats = self.workouts.get(key)
+            if stats is None:
+                stats = self.workouts[key] = WorkoutStats(**self.options)
+            for timestamp, heartrate in samples:
+                stats.update(timestamp, heartrate)
+
+    def snapshot(self, key):
+        with self.lock:
+            stats = self.workouts.get(key)
+            return stats.snapshot() if stats is not None else None
+
+    def finish(self, key):
+        with self.lock:
+            return self.workouts.pop(key, None)
+
+    def __len__(self):
+        return len(self.workouts)
@@ -1,7 +1,10 @@
 import streamlit as st
-from workout import workout_page  # Import workout page
-from profile import profile_page  # Import profile page
 from login import login_page  # Import login page
+import metrics
+
+# Page modules (and pandas, plotly.express, the trainer client, ...) are imported on the
+# first run that routes to them, so a cold process serves the login screen with only
+# Streamlit and the login form loaded. `python -m benchmarks.import_bench` checks this.
 
 st.set_page_config(layout="wide", page_icon=":material/fitness_center:", page_title="Smart Fitness Trainer")
 
@@ -12,12 +15,18 @@ if "authenticated" not in st.session_state:
 if "current_page" not in st.session_state:
     st.session_state["current_page"] = "workout"  # Default to workout page
 
-# Navigation logic
+# Navigation logic; each run is timed when performance metrics are enabled (?debug=1)
 if st.session_state.get("authenticated"):
     # Switch between pages based on session state
-    if st.session_state['current_page'] == 'workout':
-        workout_page()
-    elif st.session_state['current_page'] == 'profile':
-        profile_page()
+    with metrics.rerun(st.session_state['current_page']):
+        if st.session_state['current_page'] == 'workout':
+            from workout import workout_page
+            workout_page()
+        elif st.session_state['current_page'] == 'profile':
+            from profile import profile_page
+            profile_page()
 else:
-    login_page()
\ No newline at end of file
+    with metrics.rerun('login'):
+        login_page()
+
+metrics.render_panel()
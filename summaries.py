@@ -0,0 +1,174 @@
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from analytics import prepare_workouts
+from backend import WORKOUT_TOTALS_COLUMNS, ZONE_COLUMNS
+from calories import sample_calories, sample_seconds
+from zones import HEART_RATE_ZONES, max_heart_rate
+
+# Per-workout summaries (sql/workout_summaries.sql): duration, average and maximum heart
+# rate, time in each heart-rate zone and calories. A finished workout never changes, so
+# they are computed once when it is recorded: Stop (and the rollup worker's poll)
+# schedule its day, and the worker summarizes the workouts of those days that have no
+# summary yet before refreshing the rollups. The dashboard reads the stored columns
+# and only summarizes workouts the worker has not reached yet. `python -m summaries`
+# backfills the existing history in batches.
+
+# Calories and zone times depend on these
+PROFILE_COLUMNS = ('weight', 'age', 'gender')
+BACKFILL_BATCH_SIZE = 200
+
+logger = logging.getLogger(__name__)
+
+
+def _profile_complete(user):
+    return user is not None and all(user.get(column) is not None for column in PROFILE_COLUMNS)
+
+
+# ISO timestamps as stored in userWorkouts; parsed values are written back in UTC
+def _iso(values):
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        return values.dt.tz_convert('UTC').map(pd.Timestamp.isoformat)
+    return values
+
+
+# Summary rows (WORKOUT_TOTALS_COLUMNS) of the given userWorkouts rows (raw or prepared) from
+# their userWorkoutHealth samples. users maps each username to its user row; calories and
+# zone times are NaN for users whose profile lacks weight, age or gender.
+def summarize(df_workouts, df_health, users):
+    if df_workouts.empty:
+        return pd.DataFrame(columns=WORKOUT_TOTALS_COLUMNS)
+
+    df = prepare_workouts(df_workouts[['workout_id', 'username', 'startDT', 'endDT']])
+    workout_ids = df['workout_id'].astype(np.int64).to_numpy()
+    profiles = pd.DataFrame([users.get(username) or {} for username in df['username']],
+                            columns=list(PROFILE_COLUMNS), index=df.index)
+    complete = np.array([_profile_complete(users.get(username)) for username in df['username']])
+
+    samples = df_health[df_health['workout_id'].isin(workout_ids)] if not df_health.empty else df_health
+    sample_ids = samples['workout_id'].astype(np.int64).to_numpy()
+    heartrate = samples['heartrate'].astype(np.float64).to_numpy()
+    position = np.searchsorted(np.sort(workout_ids), sample_ids)
+    row = np.argsort(workout_ids)[position] if len(sample_ids) else np.empty(0, dtype=np.int64)
+
+    counts = np.bincount(row, minlength=len(df))
+    beats = np.bincount(row, weights=heartrate, minlength=len(df))
+    max_heartrate = np.full(len(df), np.nan)
+    np.fmax.at(max_heartrate, row, heartrate)
+
+    # Zone of every sample from its user's maximum heart rate, weighted by the time until the next sample
+    seconds = sample_seconds(sample_ids, samples['timestamp'])
+    age = profiles['age'].astype(float).to_numpy()
+    max_predicted = max_heart_rate(age[row])
+    zone = np.searchsorted(HEART_RATE_ZONES, heartrate / max_predicted, side='right') - 1
+    zones = np.zeros((len(df), len(HEART_RATE_ZONES)))
+    in_zone = zone >= 0
+    np.add.at(zones, (row[in_zone], zone[in_zone]), seconds[in_zone])
+    zones[~complete] = np.nan
+
+    # Calories integrated over the same sample intervals (gaps capped the same way) as the zone times
+    calories = np.bincount(row, weights=sample_calories(
+        sample_ids, samples['timestamp'], heartrate, profiles['gender'].to_numpy()[row],
+        profiles['weight'].astype(float).to_numpy()[row], age[row]), minlength=len(df))
+    calories[counts == 0] = np.nan
+
+    avg_heartrate = np.where(counts > 0, beats / np.maximum(counts, 1), np.nan)
+    summary = pd.DataFrame({
+        'workout_id': workout_ids,
+        'username': df['username'].astype(str).to_numpy(),
+        'startDT': _iso(df_workouts['startDT']).to_numpy(),
+        'duration': df['duration'].to_numpy(),
+        'avg_heartrate': avg_heartrate,
+        'max_heartrate': max_heartrate,
+        'samples': counts,
+        **{column: zones[:, i] for i, column in enumerate(ZONE_COLUMNS)},
+        'calories_burned': np.where(complete, calories, np.nan),
+    })
+    return summary[WORKOUT_TOTALS_COLUMNS]
+
+
+# Summarize and store the given workouts of one user; returns the summary rows
+def summarize_workouts(backend, user, df_workouts):
+    if df_workouts.empty:
+        return pd.DataFrame(columns=WORKOUT_TOTALS_COLUMNS)
+    summary = summarize(df_workouts, backend.heart_rate_samples(df_workouts['workout_id'].tolist()),
+                        {user['username']: user})
+    backend.upsert_workout_summaries(summary)
+    return summary
+
+
+# Stored summaries of the user's workouts in df_workouts (raw rows starting in [start, end),
+# ISO timestamps or None), summarizing and storing the ones that have none yet
+def ensure_summaries(backend, user, df_workouts, start=None, end=None):
+    stored = backend.workout_summaries(user['username'], start, end)
+    missing = df_workouts[~df_workouts['workout_id'].astype(np.int64).isin(stored['workout_id'].astype(np.int64))]
+    if missing.empty:
+        return stored
+    return pd.concat([stored, summarize_workouts(backend, user, missing)], ignore_index=True)
+
+
+# Re-summarize all of the user's workouts, after a profile change altered their calories or zones
+def resummarize(backend, user, batch_size=BACKFILL_BATCH_SIZE):
+    df_workouts = backend.user_workouts(user['username'])
+    for begin in range(0, len(df_workouts), batch_size):
+        summarize_workouts(backend, user, df_workouts.iloc[begin:begin + batch_size])
+
+
+# The dashboard's summaries of df_workouts (prepared rows starting in [start, end)): the
+# stored rows, plus summaries built here from the samples of workouts the worker has not
+# summarized yet, which are left for the worker to store. Returns (summary, unsummarized days).
+def load_summaries(backend, user, df_workouts, start=None, end=None):
+    stored = backend.workout_summaries(user['username'], start, end)
+    missing = df_workouts[~df_workouts['workout_id'].astype(np.int64).isin(stored['workout_id'].astype(np.int64))]
+    if missing.empty:
+        return stored, []
+
+    summary = summarize(missing, backend.heart_rate_samples(missing['workout_id'].tolist()), {user['username']: user})
+    days = sorted(set(missing['startDT'].dt.strftime('%Y-%m-%d')))
+    return pd.concat([stored, summary], ignore_index=True), days
+
+
+# Replace the recomputed columns of prepared workouts with the summary's: duration,
+# avg_heartbeat, max_heartrate, calories_burned and the zone times
+def apply_summaries(df_workouts, summary):
+    columns = summary[['workout_id', 'duration', 'avg_heartrate', 'max_heartrate', 'calories_burned'] + ZONE_COLUMNS]
+    columns = columns.astype({'workout_id': df_workouts['workout_id'].dtype, 'duration': float,
+                              'avg_heartrate': float, 'max_heartrate': float, 'calories_burned': float})
+    df = df_workouts.drop(columns=['duration'])
+    return df.merge(columns.rename(columns={'avg_heartrate': 'avg_heartbeat'}), on='workout_id', how='left')
+
+
+# Summarize every workout without a summary, batch_size workouts at a time; returns the
+# number of workouts summarized
+def backfill(backend, batch_size=BACKFILL_BATCH_SIZE):
+    after, summarized, users = 0, 0, {}
+    while True:
+        batch = backend.unsummarized_workouts(after, batch_size)
+        if batch.empty:
+            return summarized
+        after = int(batch['workout_id'].max())
+        for username in batch['username'].unique():
+            if username not in users:
+                users[username] = backend.user_row(username)
+        batch = batch[batch['username'].map(lambda username: users[username] is not None)]
+        summary = summarize(batch, backend.heart_rate_samples(batch['workout_id'].tolist()), users)
+        backend.upsert_workout_summaries(summary)
+        summarized += len(summary)
+        logger.info("Summarized %d workouts (up to workout_id %d)", summarized, after)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize the workouts that have no userWorkoutSummary row')
+    parser.add_argument('--batch', type=int, default=BACKFILL_BATCH_SIZE, help='workouts per batch')
+    args = parser.parse_args()
+
+    import data
+    from backend import SupabaseBackend
+    logging.basicConfig(level=logging.INFO)
+    backend = SupabaseBackend(data.get_client("SUPABASE_SERVICE_ROLE_KEY"), cached=False)
+    print(f"Summarized {backfill(backend, args.batch)} workouts")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import pytest
+
+# The app's modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data
+import hr_archive
+
+
+# Process-wide sync state and heart-rate archive of the data module, fresh per test
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(hr_archive, 'ARCHIVE_DIR', str(tmp_path / 'hr_archive'))
+    hr_archive._frames.clear()
+    data._histories.clear()
+    data._cache.clear()
+    yield tmp_path
+    hr_archive._frames.clear()
+    data._histories.clear()
+    data._cache.clear()
+
+
+# The fake trainer server (benchmarks/fake_trainer.py) on a local port, served from a
+# background event loop; yields (base URL, the FakeSupabase it records workouts in)
+@pytest.fixture
+def trainer_server():
+    import asyncio
+    import threading
+    from aiohttp import web
+    from benchmarks import fake_trainer
+    from benchmarks.fake_supabase import FakeSupabase
+    from benchmarks.synthetic import generate
+
+    client = FakeSupabase(generate(users=1, workouts=1, samples=1))
+    loop = asyncio.new_event_loop()
+    # Open socket.io long-polls would otherwise hold the shutdown for its 60 s default
+    runner = web.AppRunner(fake_trainer.create_app(client, latency=0.2), shutdown_timeout=1)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{port}', client
+
+    async def shutdown():
+        await runner.cleanup()
+        # socket.io keeps per-client tasks (pings, queues) past the cleanup
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=10)
+    loop.close()
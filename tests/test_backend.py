@@ -0,0 +1,106 @@
+import json
+import pandas as pd
+import pytest
+import rollups
+import summaries
+from backend import SQLiteBackend, SupabaseBackend
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.synthetic import generate
+
+# SQLiteBackend is the local stand-in for SupabaseBackend: on the same tables every read
+# must return the same rows, before and after the worker writes summaries and rollups.
+
+USERNAMES = ('user0', 'user1')
+
+
+def _records(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+
+@pytest.fixture(scope='module')
+def backends():
+    tables = generate(users=len(USERNAMES), workouts=40, samples=20)
+    sqlite = SQLiteBackend()
+    sqlite.insert('user', _records(tables['user']))
+    sqlite.insert('userWorkouts', _records(tables['userWorkouts']))
+    sqlite.insert('userWorkoutHealth', _records(tables['userWorkoutHealth'][['workout_id', 'timestamp', 'heartrate']]))
+    supabase = SupabaseBackend(FakeSupabase(tables), cached=False)
+    for backend in (sqlite, supabase):
+        summaries.backfill(backend)
+        for username in USERNAMES:
+            rollups.rebuild(backend, username)
+    return sqlite, supabase
+
+
+def _same(left, right, key):
+    left = left.sort_values(key).reset_index(drop=True)
+    right = right.sort_values(key).reset_index(drop=True)
+    assert sorted(left.columns) == sorted(right.columns)
+    pd.testing.assert_frame_equal(left, right[left.columns], check_dtype=False)
+
+
+# The first and last day of the user's rollups, moved to mid-week so the range has partial weeks
+def _mid_week_range(backend, username):
+    days = backend.daily_rollup(username)['day']
+    first = pd.Timestamp(days.iloc[len(days) // 4])
+    first += pd.Timedelta(days=(2 - first.weekday()) % 7)
+    return first.strftime('%Y-%m-%d'), days.iloc[3 * len(days) // 4]
+
+
+@pytest.mark.parametrize('read, key', [
+    (lambda backend, username: backend.user_workouts(username), 'workout_id'),
+    (lambda backend, username: backend.workout_heart_rate_summary(username), 'workout_id'),
+    (lambda backend, username: backend.daily_heart_rate_summary(username), 'day'),
+    (lambda backend, username: backend.weekly_heart_rate_summary(username), 'week_start'),
+    (lambda backend, username: backend.workout_summaries(username), 'workout_id'),
+    (lambda backend, username: backend.daily_rollup(username), 'day'),
+    (lambda backend, username: backend.weekly_rollup(username), 'week_start'),
+    (lambda backend, username: backend.daily_rollup(username, *_mid_week_range(backend, username)), 'day'),
+    (lambda backend, username: backend.weekly_rollup(username, *_mid_week_range(backend, username)), 'week_start'),
+])
+@pytest.mark.parametrize('username', USERNAMES)
+def test_reads_match(backends, read, key, username):
+    sqlite, supabase = backends
+    _same(read(sqlite, username), read(supabase, username), key)
+
+
+def test_workout_reads_match(backends):
+    sqlite, supabase = backends
+    assert sqlite.latest_workout_id() == supabase.latest_workout_id()
+    _same(sqlite.workouts_after(10), supabase.workouts_after(10), 'workout_id')
+    # Supabase rows also carry the table's id column
+    workout_ids, columns = [1, 2, 41], ['workout_id', 'timestamp', 'heartrate']
+    _same(sqlite.heart_rate_samples(workout_ids)[columns], supabase.heart_rate_samples(workout_ids)[columns], columns[:2])
+
+
+@pytest.mark.parametrize('username', USERNAMES)
+def test_user_reads_match(backends, username):
+    sqlite, supabase = backends
+    assert sqlite.user_row(username) == supabase.user_row(username)
+    lifetime, expected = sqlite.lifetime_summary(username), supabase.lifetime_summary(username)
+    assert lifetime.keys() == expected.keys()
+    for column, value in expected.items():
+        assert lifetime[column] == (pytest.approx(value) if isinstance(value, float) else value)
+
+
+def test_ranged_weekly_rollup_starts_on_or_after_first_day(backends):
+    for backend in backends:
+        first_day, last_day = _mid_week_range(backend, 'user0')
+        weekly = backend.weekly_rollup('user0', first_day, last_day)
+        assert len(weekly) and (weekly['week_start'] >= first_day).all()
+
+
+def test_replace_rollups_removes_stale_rows_of_the_partial_first_week(backends):
+    for backend in backends:
+        daily, weekly = backend.daily_rollup('user1'), backend.weekly_rollup('user1')
+        first_day, last_day = _mid_week_range(backend, 'user1')
+        partial_week = rollups.week_starts([first_day]).iloc[0]
+        assert partial_week < first_day and partial_week in set(weekly['week_start'])
+
+        # Rewrite the range without the partial week's row, then restore the rollups
+        in_range = daily[(daily['day'] >= first_day) & (daily['day'] <= last_day)]
+        backend.replace_rollups('user1', first_day, last_day, in_range,
+                                weekly[(weekly['week_start'] > partial_week) & (weekly['week_start'] <= last_day)])
+        assert partial_week not in set(backend.weekly_rollup('user1')['week_start'])
+        rollups.rebuild(backend, 'user1')
+        _same(backend.weekly_rollup('user1'), weekly, 'week_start')
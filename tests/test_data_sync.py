@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import pytest
+import data
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.synthetic import generate
+
+USERNAME = 'user0'
+
+
+def _iso(value):
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def _sorted(df_health):
+    return df_health.sort_values(['workout_id', 'timestamp']).reset_index(drop=True)
+
+
+# The user's workouts and samples as the tables hold them now
+def _expected(client):
+    workouts = client.tables['userWorkouts']
+    workouts = workouts[workouts['username'] == USERNAME]
+    health = client.tables['userWorkoutHealth']
+    health = health[health['workout_id'].isin(workouts['workout_id'])]
+    return workouts, health
+
+
+def _assert_synced(client, df_workouts, df_health):
+    workouts, health = _expected(client)
+    assert sorted(df_workouts['workout_id']) == sorted(workouts['workout_id'])
+    df_health = _sorted(df_health)
+    assert df_health['workout_id'].astype(int).tolist() == \
+        _sorted(health)['workout_id'].astype(int).tolist()
+    expected = pd.to_datetime(_sorted(health)['timestamp'], utc=True, format='ISO8601')
+    assert (df_health['timestamp'].dt.tz_convert('UTC').to_numpy() == expected.to_numpy()).all()
+
+
+# A workout that started after every synced one, with its samples
+def _add_workout(client, workout_id, samples=5):
+    started = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(minutes=workout_id)
+    client.table('userWorkouts').insert({
+        'workout_id': workout_id, 'username': USERNAME, 'workout': 'Squat', 'startDT': _iso(started),
+        'endDT': _iso(started + timedelta(minutes=10)), 'reps': 10, 'overallAccuracy': 90.0,
+    }).execute()
+    client.table('userWorkoutHealth').insert([
+        {'workout_id': workout_id, 'timestamp': _iso(started + timedelta(seconds=second)), 'heartrate': 100 + second}
+        for second in range(samples)]).execute()
+    return started
+
+
+def _sync(client):
+    data.invalidate_user(USERNAME)
+    client.reset_stats()
+    return data.sync_history(client, USERNAME, with_health=True)
+
+
+@pytest.fixture
+def client(archive):
+    return FakeSupabase(generate(users=2, workouts=30, samples=20), max_rows=data.PAGE_SIZE)
+
+
+def test_first_sync_fetches_history_and_samples(client):
+    df_workouts, df_health = data.sync_history(client, USERNAME, with_health=True)
+    _assert_synced(client, df_workouts, df_health)
+
+
+def test_delta_sync_fetches_only_new_rows(client):
+    data.sync_history(client, USERNAME, with_health=True)
+    workout_id = int(client.tables['userWorkouts']['workout_id'].max()) + 1
+    _add_workout(client, workout_id)
+
+    df_workouts, df_health = _sync(client)
+    _assert_synced(client, df_workouts, df_health)
+    stats = client.stats()
+    # The new workout and its samples only, no full resync
+    assert stats['userWorkouts']['rows'] == 1
+    assert stats['userWorkoutHealth']['rows'] == 5
+
+
+def test_delta_sync_appends_late_samples_of_the_latest_workout(client):
+    data.sync_history(client, USERNAME, with_health=True)
+    workout_id = int(client.tables['userWorkouts']['workout_id'].max()) + 1
+    started = _add_workout(client, workout_id)
+    _sync(client)
+
+    client.table('userWorkoutHealth').insert(
+        {'workout_id': workout_id, 'timestamp': _iso(started + timedelta(seconds=30)), 'heartrate': 150}).execute()
+    df_workouts, df_health = _sync(client)
+    _assert_synced(client, df_workouts, df_health)
+    assert (df_health['workout_id'] == workout_id).sum() == 6
+
+
+def test_deleted_workout_triggers_full_resync(client):
+    df_workouts, _ = data.sync_history(client, USERNAME, with_health=True)
+    deleted = int(df_workouts['workout_id'].iloc[0])
+    client.table('userWorkouts').delete().eq('workout_id', deleted).execute()
+
+    df_workouts, df_health = _sync(client)
+    assert deleted not in set(df_workouts['workout_id'])
+    _assert_synced(client, df_workouts, df_health)
+
+
+def test_histories_longer_than_a_page_are_complete(archive):
+    client = FakeSupabase(generate(users=1, workouts=data.PAGE_SIZE + 200, samples=2), max_rows=data.PAGE_SIZE)
+    df_workouts, df_health = data.sync_history(client, USERNAME, with_health=True)
+    _assert_synced(client, df_workouts, df_health)
+
+    # The row count matches, so a later sync stays incremental
+    workout_id = int(client.tables['userWorkouts']['workout_id'].max()) + 1
+    _add_workout(client, workout_id)
+    df_workouts, df_health = _sync(client)
+    _assert_synced(client, df_workouts, df_health)
+    assert client.stats()['userWorkouts']['rows'] == 1
+
+
+def test_health_fetch_is_chunked(client):
+    workout_ids = client.tables['userWorkouts']['workout_id'].tolist()
+    df_health, stats = data.fetch_health_batched(client, workout_ids, chunk_size=7, page_size=50)
+    assert len(stats) == -(-len(workout_ids) // 7)
+    assert sum(chunk['rows'] for chunk in stats) == len(client.tables['userWorkoutHealth'])
+    pd.testing.assert_frame_equal(_sorted(df_health), _sorted(client.tables['userWorkoutHealth']), check_dtype=False)
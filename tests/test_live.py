@@ -0,0 +1,88 @@
+import threading
+import time
+import numpy as np
+import pytest
+import live
+from schema import DISPLAY_TIMEZONE
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_ring_buffer_keeps_the_latest_samples_in_arrival_order():
+    buffer = live.RingBuffer(capacity=4)
+    for second in range(6):
+        buffer.append(second, 100 + second)
+    timestamps, values, total = buffer.snapshot()
+    assert timestamps.tolist() == [2, 3, 4, 5]
+    assert values.tolist() == [102, 103, 104, 105]
+    assert total == 6 and len(buffer) == 4
+
+
+def test_ring_buffer_extend_wraps_and_keeps_order():
+    buffer = live.RingBuffer(capacity=5)
+    buffer.append(0, 100)
+    buffer.extend([1, 2, 3], [101, 102, 103])
+    buffer.extend(list(range(4, 11)), list(range(104, 111)))  # More than the capacity at once
+    timestamps, values, total = buffer.snapshot()
+    assert timestamps.tolist() == [6, 7, 8, 9, 10]
+    assert values.tolist() == [106, 107, 108, 109, 110]
+    assert total == 11
+
+
+def test_ring_buffer_snapshot_since_returns_only_newer_samples():
+    buffer = live.RingBuffer(capacity=4)
+    buffer.extend([0, 1, 2], [100, 101, 102])
+    _, _, seen = buffer.snapshot()
+    buffer.append(3, 103)
+    buffer.append(4, 104)
+    timestamps, _, total = buffer.snapshot(since=seen)
+    assert timestamps.tolist() == [3, 4] and total == 5
+    # Readers further behind than the capacity get what is still held
+    assert buffer.snapshot(since=0)[0].tolist() == [1, 2, 3, 4]
+    assert len(buffer.snapshot(since=total)[0]) == 0
+
+
+# Disconnects in the background like live.close_feed; with the polling transport a
+# blocking close waits out the pending long-poll
+def _close(feed):
+    threading.Thread(target=feed.close, daemon=True).start()
+
+
+@pytest.fixture
+def fast_samples(monkeypatch):
+    from benchmarks import fake_trainer
+    monkeypatch.setattr(fake_trainer, 'SAMPLE_SECONDS', 0.05)
+
+
+def test_live_feed_buffers_pushed_samples_in_order(fast_samples, trainer_server):
+    url, _ = trainer_server
+    feed = live.LiveFeed(url, 'user0', age=30, capacity=8)
+    try:
+        _wait_for(lambda: feed.buffer.total >= 12)
+        frame = feed.frame()
+        assert len(frame) == 8
+        assert str(frame['timestamp'].dt.tz) == DISPLAY_TIMEZONE
+        assert frame['timestamp'].is_monotonic_increasing
+        assert feed.statistics()['samples'] >= 12
+    finally:
+        _close(feed)
+
+
+def test_live_feed_batches_keep_their_order(fast_samples, trainer_server):
+    url, _ = trainer_server
+    feed = live.LiveFeed(url, 'user0', capacity=64)
+    try:
+        _wait_for(lambda: feed.connected)
+        _, _, seen = feed.buffer.snapshot()
+        start = time.time() + 3600  # Later than anything the server pushes
+        feed._on_samples([{'timestamp': start + second, 'heartrate': 100 + second} for second in range(10)])
+        timestamps, values, _ = feed.buffer.snapshot(since=seen)
+        batch = values[np.isin(timestamps, start + np.arange(10))]
+        assert batch.tolist() == list(range(100, 110))
+    finally:
+        _close(feed)
@@ -0,0 +1,97 @@
+import json
+import time
+import pytest
+import rollups
+from backend import SQLiteBackend
+from benchmarks.synthetic import generate
+
+# A failed RollupWorker run queues its work again and retries it after RETRY_SECONDS,
+# doubling with each consecutive failure; a success clears the error and the backoff.
+
+
+def _records(frame):
+    return json.loads(frame.to_json(orient='records'))
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+# Fails the first `failures` rollup writes, recording when each was attempted
+class FlakyBackend(SQLiteBackend):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.attempts = []
+
+    def replace_rollups(self, username, first_day, last_day, daily, weekly):
+        self.attempts.append(time.monotonic())
+        if len(self.attempts) <= self.failures:
+            raise RuntimeError("rollup write failed")
+        super().replace_rollups(username, first_day, last_day, daily, weekly)
+
+
+def _backend(failures):
+    tables = generate(users=2, workouts=10, samples=10)
+    backend = FlakyBackend(failures)
+    backend.insert('user', _records(tables['user']))
+    backend.insert('userWorkouts', _records(tables['userWorkouts']))
+    backend.insert('userWorkoutHealth', _records(tables['userWorkoutHealth'][['workout_id', 'timestamp', 'heartrate']]))
+    return backend
+
+
+@pytest.fixture
+def worker_factory(monkeypatch):
+    monkeypatch.setattr(rollups, 'RETRY_SECONDS', 0.2)
+    workers = []
+
+    def start(backend, on_refresh=None):
+        # Polls only once, at startup, so every run after it is scheduled work
+        worker = rollups.RollupWorker(backend, poll_seconds=3600, on_refresh=on_refresh)
+        _wait_for(lambda: worker.watermark is not None)
+        workers.append(worker)
+        return worker
+
+    yield start
+    for worker in workers:
+        worker.stop()
+
+
+def test_failed_work_is_retried_with_doubling_backoff(worker_factory):
+    backend = _backend(failures=2)
+    refreshed = []
+    worker = worker_factory(backend, on_refresh=refreshed.append)
+    worker.schedule('user0')
+
+    _wait_for(lambda: worker.failures == 1)
+    assert worker.error == "rollup write failed"
+    assert worker.pending == {'user0': None}  # Queued again, waiting for the retry
+    assert refreshed == []
+
+    _wait_for(lambda: len(backend.attempts) == 3 and worker.failures == 0)
+    assert worker.error is None and worker.retry_at == 0.0
+    assert worker.pending == {}
+    assert refreshed == ['user0']
+    first, second, third = backend.attempts
+    assert second - first >= 0.2
+    assert third - second >= 0.4  # Doubled after the second consecutive failure
+    assert len(backend.daily_rollup('user0')) > 0
+
+
+def test_work_scheduled_during_backoff_waits_and_is_merged(worker_factory):
+    backend = _backend(failures=1)
+    refreshed = []
+    worker = worker_factory(backend, on_refresh=refreshed.append)
+    worker.schedule('user0')
+    _wait_for(lambda: worker.failures == 1)
+    failed_at = backend.attempts[0]
+
+    worker.schedule('user1')
+    _wait_for(lambda: worker.failures == 0)
+    # Both users ran in the one retry, not before it
+    assert len(backend.attempts) == 3
+    assert min(backend.attempts[1:]) - failed_at >= 0.2
+    assert sorted(refreshed) == ['user0', 'user1']
@@ -0,0 +1,105 @@
+import socket
+import time
+from datetime import datetime, timezone
+import pytest
+import requests
+import trainer
+
+
+def _stats(url):
+    return requests.get(f'{url}/stats', timeout=5).json()
+
+
+def _start_dt():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S%z')
+
+
+# A local address nothing listens on
+def _closed_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f'http://127.0.0.1:{sock.getsockname()[1]}'
+
+
+# Wait for the done callbacks of finished stops, which run just after their result is set
+def _settle(trainer_client):
+    deadline = time.monotonic() + 5
+    while trainer_client._stops and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_repeated_stops_share_one_request(trainer_server):
+    url, client = trainer_server
+    trainer_client = trainer.TrainerClient(url)
+    start_dt = _start_dt()
+    first = trainer_client.stop_async('user0', 'Squat', start_dt)
+    # Clicked again while the first stop is in flight
+    assert trainer_client.stop_async('user0', 'Squat', start_dt) is first
+    assert first.result(timeout=10) == {'status': 'stopped'}
+    _settle(trainer_client)
+
+    # Clicked again after it finished
+    assert trainer_client.stop_async('user0', 'Squat', start_dt) is first
+    assert _stats(url) == {'start': 0, 'stop': 1, 'recorded': 1}
+    assert len(client.tables['userWorkouts']) == 2
+
+
+def test_retried_stop_is_recorded_once(trainer_server):
+    url, client = trainer_server
+    start_dt = _start_dt()
+    # A second client (another process or a retry after a lost response) sends the same key
+    for _ in range(2):
+        trainer.TrainerClient(url).stop('user0', 'Squat', start_dt)
+    assert _stats(url) == {'start': 0, 'stop': 2, 'recorded': 1}
+    assert len(client.tables['userWorkouts']) == 2
+
+
+def test_different_workouts_are_stopped_separately(trainer_server):
+    url, _ = trainer_server
+    trainer_client = trainer.TrainerClient(url)
+    futures = [trainer_client.stop_async('user0', workout, _start_dt()) for workout in ('Squat', 'Lunge')]
+    for future in futures:
+        future.result(timeout=10)
+    assert _stats(url)['recorded'] == 2
+
+
+def test_failed_stop_is_retried_by_the_next_stop(monkeypatch):
+    monkeypatch.setattr(trainer, 'BACKOFF_SECONDS', 0)
+    trainer_client = trainer.TrainerClient(_closed_url())
+    failed = trainer_client.stop_async('user0', 'Squat', _start_dt())
+    with pytest.raises(trainer.TrainerError):
+        failed.result(timeout=30)
+    _settle(trainer_client)
+    retried = trainer_client.stop_async('user0', 'Squat', _start_dt())
+    assert retried is not failed
+    with pytest.raises(trainer.TrainerError):
+        retried.result(timeout=30)
+
+
+def test_completed_stops_are_bounded(trainer_server, monkeypatch):
+    monkeypatch.setattr(trainer, 'COMPLETED_STOPS', 2)
+    url, _ = trainer_server
+    trainer_client = trainer.TrainerClient(url)
+    start_dt = _start_dt()
+    for workout in ('Squat', 'Lunge', 'Push Up'):
+        trainer_client.stop_async('user0', workout, start_dt).result(timeout=10)
+    _settle(trainer_client)
+    assert list(trainer_client._completed) == [trainer.stop_key('user0', workout, start_dt)
+                                               for workout in ('Lunge', 'Push Up')]
+
+
+def test_start_is_sent_once(trainer_server):
+    url, _ = trainer_server
+    assert trainer.TrainerClient(url).start_async('Squat').result(timeout=10)['watch_url']
+    assert _stats(url)['start'] == 1
+
+
+@pytest.mark.parametrize('address', ['abc-12-34', ' abc '])
+def test_ngrok_ids_become_ngrok_urls(address):
+    assert trainer.base_url_for(address) == f'https://{address.strip()}.ngrok-free.app'
+
+
+@pytest.mark.parametrize('address', ['http://127.0.0.1:8080', 'evil.example.com', 'a/b', 'a@b', '-abc', ''])
+def test_typed_urls_and_hosts_are_rejected(address):
+    with pytest.raises(trainer.TrainerError):
+        trainer.base_url_for(address)
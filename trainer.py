@@ -0,0 +1,143 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Client for the trainer server's /start and /stop control endpoints. One pooled
+# requests.Session per server address, bounded timeouts with retry/backoff, and
+# background dispatch so the Streamlit script thread never blocks on the server.
+
+CONNECT_TIMEOUT_SECONDS = 3.05
+READ_TIMEOUT_SECONDS = 15
+MAX_ATTEMPTS = 3
+BACKOFF_SECONDS = 0.5
+DISPATCH_WORKERS = 8
+# Gateway errors returned by ngrok when the trainer server is unreachable; retried for
+# idempotent requests
+RETRY_STATUS_CODES = (502, 503, 504)
+# Stops that finished are remembered per client so repeating them does not send them again
+COMPLETED_STOPS = 256
+# An ngrok subdomain: one DNS label
+NGROK_ID = re.compile(r'[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?')
+
+
+class TrainerError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# Base URL of the server address typed in the dashboard, which is only ever an ngrok
+# subdomain. Full URLs (a trainer on the local network, the fake trainer) come from the
+# TRAINER_URL secret instead, so user input never picks the host the app connects to.
+def base_url_for(address):
+    address = address.strip()
+    if not NGROK_ID.fullmatch(address):
+        raise TrainerError(f"Not a server address: {address!r}")
+    return f"https://{address}.ngrok-free.app"
+
+
+# Key identifying one recorded workout, sent so retried stops cannot record it twice
+def stop_key(username, workout, start_dt):
+    return hashlib.sha256(f"{username}|{workout}|{start_dt}".encode()).hexdigest()
+
+
+_dispatch_pool = ThreadPoolExecutor(max_workers=DISPATCH_WORKERS, thread_name_prefix='trainer')
+
+
+class TrainerClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=DISPATCH_WORKERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+        self._stops = {}  # stop key -> Future of a stop in flight, so repeated stops share it
+        self._completed = OrderedDict()  # stop key -> Future of a successful stop, last COMPLETED_STOPS
+        self._lock = threading.Lock()
+
+    # POST with bounded timeouts. Idempotent requests are retried with exponential backoff
+    # on connection failures, gateway errors and read timeouts; any of these may follow a
+    # request the server already acted on, so other requests are sent once.
+    def _post(self, path, payload, headers=None, idempotent=False):
+        url = f"{self.base_url}/{path}"
+        attempts = MAX_ATTEMPTS if idempotent else 1
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                response = self.session.post(url, json=payload, headers=headers,
+                                             timeout=(CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS))
+            except requests.ConnectionError as e:
+                if last_attempt:
+                    raise TrainerError(f"Could not reach the trainer server: {e}") from e
+            except requests.Timeout as e:
+                if last_attempt:
+                    raise TrainerError("The trainer server did not respond in time.") from e
+            except requests.RequestException as e:
+                raise TrainerError(str(e)) from e
+            else:
+                if response.status_code == 200:
+                    return response.json() if response.content else {}
+                if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                    raise TrainerError(f"Status code: {response.status_code}", response.status_code)
+            time.sleep(BACKOFF_SECONDS * 2 ** attempt)
+
+    # Starts a new session on every call, so it is never retried
+    def start(self, workout):
+        return self._post('start', {"workout": workout})
+
+    def stop(self, username, workout, start_dt):
+        payload = {
+            "username": username,
+            "workout": workout,
+            "startDT": start_dt,
+        }
+        return self._post('stop', payload, headers={"Idempotency-Key": stop_key(username, workout, start_dt)},
+                          idempotent=True)
+
+    def start_async(self, workout):
+        return _dispatch_pool.submit(self.start, workout)
+
+    # Stopping the same workout again while its stop is in flight, or after it succeeded,
+    # returns that request instead of sending another one. Failed stops are forgotten, so
+    # stopping again retries them (with the same Idempotency-Key, so the server records
+    # the workout once).
+    def stop_async(self, username, workout, start_dt):
+        key = stop_key(username, workout, start_dt)
+        with self._lock:
+            future = self._stops.get(key) or self._completed.get(key)
+            if future is not None:
+                return future
+            future = self._stops[key] = _dispatch_pool.submit(self.stop, username, workout, start_dt)
+        # Runs at once if the stop already finished, so it is added outside the lock
+        future.add_done_callback(lambda done: self._finish_stop(key, done))
+        return future
+
+    def _finish_stop(self, key, future):
+        with self._lock:
+            if self._stops.get(key) is future:
+                del self._stops[key]
+            if not future.cancelled() and future.exception() is None:
+                self._completed[key] = future
+                self._completed.move_to_end(key)
+                while len(self._completed) > COMPLETED_STOPS:
+                    self._completed.popitem(last=False)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+# Process-wide client (and connection pool) for a trainer server base URL
+def get_trainer(base_url):
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = TrainerClient(base_url)
+            _clients[base_url] = client
+        return client
@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import cv2
+import numpy as np
+
+# Local rep counting and form accuracy for the workouts in the `workouts` table, so
+# reps and overallAccuracy can be computed on our own CPU nodes instead of the trainer
+# server. A producer thread decodes the video (or consumes a frame stream), keeps every
+# frame_step-th frame, shrinks it to grayscale and groups frames into batches. The
+# batches are analyzed in a process pool, with a bounded number in flight. Each frame
+# is reduced to the mean vertical motion of whatever moves since the previous kept frame
+# (dense optical flow). Its running sum is the body's vertical position, and reps are
+# the cycles of that signal.
+#
+# Without a pose model, form accuracy scores how close each rep comes to the user's own
+# deepest reps (range of motion) and whether its tempo is in the workout's range.
+#
+#   python -m video_analysis workout.mp4 --workout Squat --workers 4
+
+ANALYSIS_WIDTH = 160  # Frames are downscaled to this width before analysis
+TARGET_FPS = 15  # Default frame skipping keeps about this many frames per second
+BATCH_FRAMES = 32
+QUEUE_BATCHES = 8  # Decoded batches buffered ahead of the pool
+IN_FLIGHT_PER_WORKER = 2  # Batches submitted to the pool but not yet finished, per worker
+MOTION_THRESHOLD = 0.5  # Pixels moving less than this between kept frames are treated as still
+MIN_MOVING_FRACTION = 0.005  # Frames where less of the picture moves count as no motion
+SMOOTHING_SECONDS = 0.25
+# Depth as a fraction of the signal's range: a rep starts when the position moves this far
+# from the starting position and ends when it comes back within REST_DEPTH of it, so
+# shallow reps are counted (and score low on range) while jitter is not
+REP_DEPTH = 0.35
+REST_DEPTH = 0.15
+MIN_RANGE = 0.02  # Signals moving less than this fraction of the frame height have no reps
+
+# Workout name -> (min, max) seconds of one rep at a controlled tempo
+REP_SECONDS = {
+    "Squat": (1.0, 6.0),
+    "Push Up": (0.8, 5.0),
+    "Lunge": (1.0, 6.0),
+    "Bicep Curl": (0.8, 5.0),
+}
+DEFAULT_REP_SECONDS = (0.8, 6.0)
+FEATURES = ('velocity', 'moving')
+
+
+# Grayscale frame at ANALYSIS_WIDTH, keeping the aspect ratio
+def prepare_frame(frame):
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    height, width = frame.shape
+    size = (ANALYSIS_WIDTH, max(1, round(height * ANALYSIS_WIDTH / width)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+# Per-frame (velocity, moving) for a (frames + 1, height, width) batch whose first frame
+# is the last kept frame of the previous batch. velocity is the mean vertical flow of the
+# moving pixels in frame heights (positive is down), moving the fraction of pixels moving.
+# Runs in the pool, so it returns its CPU time alongside the features.
+def analyze_batch(frames):
+    started = time.process_time()
+    height = frames.shape[1]
+    features = np.zeros((len(frames) - 1, len(FEATURES)))
+    for index in range(1, len(frames)):
+        flow = cv2.calcOpticalFlowFarneback(frames[index - 1], frames[index], None, 0.5, 3, 15, 3, 5, 1.2, 0)
+        moving = np.hypot(flow[..., 0], flow[..., 1]) > MOTION_THRESHOLD
+        fraction = moving.mean()
+        if fraction >= MIN_MOVING_FRACTION:
+            features[index - 1] = flow[..., 1][moving].mean() / height, fraction
+    return features, time.process_time() - started
+
+
+# Decode and batch frames on the producer thread; puts (frames, frame indexes) batches
+# and a final None, and records decode time and counts in stats. Each batch starts with
+# the previous batch's last frame, so motion across batch boundaries is not lost.
+def _produce(frames, frame_step, batch_frames, batches, stop, stats):
+    batch, indexes = [], []
+    previous = None
+    iterator = iter(frames)
+    index = 0
+    try:
+        while not stop.is_set():
+            started = time.perf_counter()
+            frame = next(iterator, None)
+            if frame is None:
+                break
+            if index % frame_step == 0:
+                batch.append(prepare_frame(frame))
+                indexes.append(index)
+            stats['decode_seconds'] += time.perf_counter() - started
+            stats['frames_decoded'] += 1
+            index += 1
+            if len(batch) == batch_frames:
+                previous = batch[0] if previous is None else previous
+                batches.put((np.stack([previous] + batch), np.array(indexes)))
+                previous, batch, indexes = batch[-1], [], []
+        if batch:
+            previous = batch[0] if previous is None else previous
+            batches.put((np.stack([previous] + batch), np.array(indexes)))
+    except Exception as e:
+        stats['error'] = e
+    finally:
+        batches.put(None)
+
+
+# Frames of a video file, camera index or stream URL, and its frame rate
+def read_frames(source):
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video source {source!r}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def frames():
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                yield frame
+        finally:
+            capture.release()
+
+    return frames(), fps
+
+
+def _moving_average(values, window):
+    if window <= 1 or len(values) < window:
+        return values
+    padded = np.pad(values, (window // 2, window - 1 - window // 2), mode='edge')
+    return np.convolve(padded, np.ones(window) / window, mode='valid')
+
+
+# Reps as (start, end) sample positions, from the last sample at rest before each rep to
+# the first one back at rest. Rest is the end of the signal's range it starts at (the
+# starting position of the exercise), so exercises moving either way are counted alike.
+def rep_bounds(signal):
+    low, high = np.percentile(signal, [5, 95])
+    if high - low < MIN_RANGE:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    rest, far = (low, high) if abs(signal[0] - low) <= abs(signal[0] - high) else (high, low)
+    depth = (signal - rest) / (far - rest)
+    at_rest, in_rep = depth <= REST_DEPTH, depth >= REP_DEPTH
+    # 0 = at rest, 1 = in a rep, carried forward through the band in between
+    known = np.flatnonzero(at_rest | in_rep)
+    phase = in_rep.astype(np.int8)[known[np.maximum(np.searchsorted(known, np.arange(len(signal)), side='right') - 1, 0)]]
+
+    changes = np.flatnonzero(np.diff(phase)) + 1
+    starts = changes[phase[changes] == 1]
+    ends = changes[phase[changes] == 0]
+    # Only complete reps count: started from rest and back at rest before the video ends
+    if len(starts):
+        ends = ends[ends > starts[0]]
+    starts = starts[:len(ends)]
+    # Back up to the last sample at rest before each rep
+    resting = np.flatnonzero(at_rest)
+    before = np.searchsorted(resting, starts) - 1
+    starts = np.where(before >= 0, resting[np.maximum(before, 0)], starts)
+    return starts, ends
+
+
+# Reps and per-rep form scores from vertical positions (frame heights) at the given times (seconds)
+def score_reps(times, positions, rep_seconds=DEFAULT_REP_SECONDS):
+    if len(times) < 2:
+        return []
+    sample_seconds = np.median(np.diff(times))
+    signal = _moving_average(positions, max(1, round(SMOOTHING_SECONDS / sample_seconds)))
+
+    starts, ends = rep_bounds(signal)
+    min_seconds, max_seconds = rep_seconds
+    durations = times[ends] - times[starts]
+    # Shorter cycles are jitter, not reps
+    keep = durations >= min_seconds / 2
+    starts, ends, durations = starts[keep], ends[keep], durations[keep]
+    if not len(starts):
+        return []
+
+    amplitudes = np.array([np.ptp(signal[start:end + 1]) for start, end in zip(starts, ends)])
+    reference = np.percentile(amplitudes, 90)
+    range_scores = np.minimum(1.0, amplitudes / reference) if reference > 0 else np.ones(len(amplitudes))
+    tempo_scores = np.clip(np.minimum(durations / min_seconds, max_seconds / durations), 0.0, 1.0)
+    accuracy = 100 * range_scores * tempo_scores
+    return [{'start': float(times[start]), 'end': float(times[end]), 'seconds': float(duration),
+             'range': float(amplitude), 'accuracy': float(score)}
+            for start, end, duration, amplitude, score in zip(starts, ends, durations, amplitudes, accuracy)]
+
+
+def _collect(futures, results):
+    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+    for future in done:
+        futures.remove(future)
+        results.append((*future.result(), future.indexes))
+
+
+# Reps, overallAccuracy and throughput metrics for an iterable of frames (BGR or grayscale
+# arrays) recorded at fps. frame_step=None keeps about TARGET_FPS frames per second.
+def analyze_frames(frames, fps, workout, frame_step=None, batch_frames=BATCH_FRAMES, workers=None):
+    rep_seconds = REP_SECONDS.get(workout, DEFAULT_REP_SECONDS)
+    frame_step = frame_step or max(1, round(fps / TARGET_FPS))
+    workers = workers or os.cpu_count() or 1
+    stats = {'frames_decoded': 0, 'decode_seconds': 0.0, 'error': None}
+    batches = queue.Queue(maxsize=QUEUE_BATCHES)
+    stop = threading.Event()
+    started = time.perf_counter()
+    producer = threading.Thread(target=_produce, args=(frames, frame_step, batch_frames, batches, stop, stats),
+                                daemon=True, name='video-decode')
+    producer.start()
+
+    results, futures = [], set()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                while len(futures) >= workers * IN_FLIGHT_PER_WORKER:
+                    _collect(futures, results)
+                frames_batch, indexes = batch
+                future = pool.submit(analyze_batch, frames_batch)
+                future.indexes = indexes
+                futures.add(future)
+            while futures:
+                _collect(futures, results)
+    finally:
+        stop.set()
+        # Unblock a producer waiting on a full queue, then wait for it to finish
+        while producer.is_alive():
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        producer.join()
+    if stats['error'] is not None:
+        raise stats['error']
+    wall_seconds = time.perf_counter() - started
+
+    # Results arrive out of order; each carries the frame indexes it was submitted with
+    features = np.concatenate([result[0] for result in results]) if results else np.empty((0, len(FEATURES)))
+    indexes = np.concatenate([result[2] for result in results]) if results else np.empty(0, dtype=np.int64)
+    order = np.argsort(indexes, kind='stable')
+    times = indexes[order] / fps
+    positions = np.cumsum(features[order, FEATURES.index('velocity')])
+    reps = score_reps(times, positions, rep_seconds)
+
+    video_seconds = stats['frames_decoded'] / fps
+    analysis_cpu_seconds = sum(result[1] for result in results)
+    return {
+        'workout': workout,
+        'reps': len(reps),
+        'overallAccuracy': float(np.mean([rep['accuracy'] for rep in reps])) if reps else 0.0,
+        'rep_details': reps,
+        'metrics': {
+            'source_fps': fps,
+            'frame_step': frame_step,
+            'batch_frames': batch_frames,
+            'workers': workers,
+            'frames_decoded': stats['frames_decoded'],
+            'frames_analyzed': int(len(indexes)),
+            'video_seconds': video_seconds,
+            'wall_seconds': wall_seconds,
+            'decode_seconds': stats['decode_seconds'],
+            'analysis_cpu_seconds': analysis_cpu_seconds,
+            # Frames consumed from the source per wall-clock second
+            'throughput_fps': stats['frames_decoded'] / wall_seconds if wall_seconds else 0.0,
+            'analyzed_fps': len(indexes) / wall_seconds if wall_seconds else 0.0,
+            # Above 1 the engine keeps up with a live camera at the source frame rate
+            'realtime_factor': video_seconds / wall_seconds if wall_seconds else 0.0,
+            # Decode plus analysis CPU seconds spent per second of video
+            'cpu_per_video_second': (stats['decode_seconds'] + analysis_cpu_seconds) / video_seconds
+            if video_seconds else 0.0,
+        },
+    }
+
+
+def analyze_video(source, workout, **options):
+    frames, fps = read_frames(source)
+    return analyze_frames(frames, fps, workout, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count reps and score form in a workout video')
+    parser.add_argument('source', help='video file, stream URL or camera index')
+    parser.add_argument('--workout', default='Squat', help=f"workout name ({', '.join(REP_SECONDS)})")
+    parser.add_argument('--step', type=int, help='analyze every Nth frame (default: about %d per second)' % TARGET_FPS)
+    parser.add_argument('--batch', type=int, default=BATCH_FRAMES, help='frames per pool task')
+    parser.add_argument('--workers', type=int, help='analysis processes (default: CPU count)')
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    result = analyze_video(source, args.workout, frame_step=args.step, batch_frames=args.batch, workers=args.workers)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,69 +1,381 @@
 import streamlit as st
-import supabase
 import pandas as pd
 import plotly.express as px
-import requests
 import time
 from datetime import datetime, timedelta
 import pytz
 from streamlit_calendar import calendar
-
-# Function to calculate calories burned using the formula based on gender
-def calculate_calories_burned(gender, duration, heart_rate, weight, age):
-    if gender == "Female":
-        return duration * ((0.4472 * heart_rate - 0.1263 * weight + 0.074 * age - 20.4022) / 4.184)
-    elif gender == "Male":
-        return duration * ((0.6309 * heart_rate + 0.1988 * weight + 0.2017 * age - 55.0969) / 4.184)
-    else:
-        return 0  # Return 0 if gender is not valid
-
-def workout_page():
-    st.markdown("""
-    <style>
-    /* Styling for the sidebar links */
-    .sidebar-link {
-        font-size: 18px;
-        font-weight: bold;
-        color: white;  /* Set text color to white */
-        text-decoration: none;  /* Remove underline */
-        padding: 10px 15px;
-        display: block;
-        margin-bottom: 10px;
-        border-radius: 5px;
-        transition: background-color 0.3s ease;
+from analytics import prepare_workouts, build_rollup_calendar_events, date_window, local_today, \
+    DATE_WINDOWS, CUSTOM_WINDOW
+from downsample import downsample_groups, histogram_figure, box_figure
+import data
+from backend import SupabaseBackend
+from trainer import get_trainer, base_url_for, TrainerError
+from live import get_feed, close_feed
+from streaming import WINDOW_SECONDS, ALERT_FRACTION
+from sections import cached_build, timed, render_timings
+from figures import cached_figures
+from schema import utc_bounds, DISPLAY_TIMEZONE
+import rollups
+import summaries
+import cohorts
+
+# How often a pending Start/Stop request is polled while the trainer server responds
+TRAINER_POLL_SECONDS = 1
+
+# Poll the pending Start/Stop request without re-running the whole dashboard
+@st.fragment(run_every=TRAINER_POLL_SECONDS)
+def trainer_request_status():
+    pending = st.session_state.get('trainer_request')
+    if pending is None:
+        return
+
+    action, future = pending
+    if not future.done():
+        st.info("Starting workout..." if action == 'start' else "Stopping workout...")
+        return
+
+    del st.session_state['trainer_request']
+    try:
+        result = future.result()
+        if action == 'start':
+            watch_url = result.get("watch_url")
+            if watch_url:
+                st.session_state['watch_url'] = watch_url
+                st.session_state['workout_running'] = True
+            else:
+                st.session_state['trainer_message'] = ('error', "Failed to retrieve the watch URL from the response.")
+        else:
+            st.session_state['trainer_message'] = ('write', "Workout stopped successfully.")
+            st.session_state['workout_running'] = False
+            close_feed(st.session_state['username'])
+            # A new workout was recorded, drop this user's cached history; the rollup worker
+            # summarizes it and refreshes its day's rollups
+            data.invalidate_user(st.session_state['username'])
+            rollups.get_worker().schedule(st.session_state['username'], [st.session_state['startDT'][:10]])
+    except TrainerError as e:
+        st.session_state['trainer_message'] = ('error', f"Failed to {action} the workout stream. {e}")
+    except Exception as e:
+        st.session_state['trainer_message'] = ('error', f"An error occurred: {str(e)}")
+    st.rerun()
+
+# How often the live heart-rate panel redraws while a workout is running
+LIVE_REFRESH_SECONDS = 1
+
+# Redraw only the live heart-rate panel from the feed's ring buffer and streaming statistics
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_heart_rate_panel(feed):
+    df_live = feed.frame()
+    if df_live.empty:
+        if feed.error:
+            st.warning(f"Live heart rate is unavailable: {feed.error}")
+        else:
+            st.info("Waiting for live heart rate data...")
+        return
+
+    stats = feed.statistics()
+    if stats['alert']:
+        st.error(f"Heart rate is above {stats['alert_threshold']:.0f} bpm ({ALERT_FRACTION:.0%} of your maximum). Consider slowing down.")
+
+    col1, col2 = st.columns([1, 5])
+    with col1:
+        st.metric("Heart Rate", f"{df_live['heartrate'].iloc[-1]:.0f} bpm")
+        st.metric(f"{WINDOW_SECONDS:.0f}s Average", f"{stats['window_mean']:.0f} bpm")
+        st.metric(f"{WINDOW_SECONDS:.0f}s Peak", f"{stats['window_max']:.0f} bpm")
+    with col2:
+        st.line_chart(df_live, x='timestamp', y='heartrate', height=200)
+    if stats['zone_seconds'] is not None:
+        zone_columns = st.columns(len(stats['zone_seconds']))
+        for zone, (column, seconds) in enumerate(zip(zone_columns, stats['zone_seconds']), start=1):
+            column.metric(f"Zone {zone}", f"{int(seconds) // 60}:{int(seconds) % 60:02d}")
+
+# Calendar options
+CALENDAR_OPTIONS = {
+    "editable": "false",
+    "selectable": "false",
+    "headerToolbar": {
+        "left": "today prev,next",
+        "center": "title",
+        "right": "dayGridMonth,dayGridWeek,dayGridDay",
+    },
+    "slotMinTime": "06:00:00",
+    "slotMaxTime": "18:00:00",
+    "initialView": "dayGridMonth",
+    "resourceGroupField": "building",
+    "firstDay": 1,
+    "resources": [
+        {"id": "a", "building": "Goals", "title": "Goals Tracking"}
+    ]
+}
+
+# Custom CSS for calendar styling
+CALENDAR_CSS = """
+    .fc-event-past {
+        opacity: 0.8;
     }
-    
-    .sidebar-link:hover {
-        background-color: #3498db;
-        color: white;
-        text-decoration: none;  /* Ensure no underline on hover */
+    .fc-event-time {
+        font-style: italic;
     }
-    
-    .sidebar-link:active {
-        background-color: #2980b9;
-        color: white;
+    .fc-event-title {
+        font-weight: 700;
     }
-
-    /* Custom styles for the sidebar header */
-    .sidebar .sidebar-content {
-        padding-top: 20px;
+    .fc-toolbar-title {
+        font-size: 2rem;
+    }
+    .fc-event { 
+        background-color: var(--fc-event-background-color); 
     }
-    </style>
-    """, unsafe_allow_html=True)
-    
-    # Sidebar content with styled links
-    st.sidebar.subheader("Goals")
-    st.sidebar.markdown('<a href="#overall-goal-tracking" class="sidebar-link">Overall Goal Tracking</a>', unsafe_allow_html=True)
-    st.sidebar.markdown('<a href="#goal-tracking-calendar-view" class="sidebar-link">Goal Tracking Calendar</a>', unsafe_allow_html=True)
-    st.sidebar.subheader("Data")
-    st.sidebar.markdown('<a href="#workout-history-data" class="sidebar-link">Workout History Data</a>', unsafe_allow_html=True)
-    st.sidebar.markdown('<a href="#workout-analysis" class="sidebar-link">Workout Analysis</a>', unsafe_allow_html=True)
-    st.sidebar.markdown('<a href="#workout-performance-analysis" class="sidebar-link">Workout Performance Analysis</a>', unsafe_allow_html=True)
-    st.sidebar.markdown('<a href="#heart-rate-analysis" class="sidebar-link">Heart Rate Analysis</a>', unsafe_allow_html=True)
-    st.sidebar.markdown('<a href="#over-time-trend-analysis" class="sidebar-link">Over Time Trend Analysis</a>', unsafe_allow_html=True)
-
-    # Initialize Supabase client
-    supabase_client = supabase.create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+    /* Reduce calendar event font size */
+    .fc-event-title {
+        font-size: 0.8rem; /* Make event titles smaller */
+    }
+    /* Reduce height of calendar cells */
+    .fc-daygrid-day-frame {
+        min-height: 20px; /* Adjust this value to decrease cell height */
+    }
+    .fc-event-title {
+        white-space: normal !important; /* Allow text to wrap */
+        word-wrap: break-word; /* Break long words if necessary */
+        font-size: 0.9em; /* Optional: Make the text slightly smaller */
+        line-height: 1.2em; /* Optional: Adjust the line height */
+    }
+    .fc-daygrid-event {
+        height: auto !important; /* Allow the height to adjust to content */
+    }
+"""
+
+# Each dashboard section is a fragment: it is only computed when selected, widgets inside it
+# rerun just that section, and its figures are reused while its inputs are unchanged.
+# Goal tracking and the calendar read the daily/weekly rollup tables (see rollups.py).
+
+@st.fragment
+def goals_section(daily_rollup, weekly_rollup, daily_duration_goal, frequency_goal, calories_goal):
+    st.subheader("Overall Goal Tracking")
+    with timed("Overall Goal Tracking"):
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            # Check daily duration goal
+            if daily_duration_goal:
+                avg_duration = daily_rollup['duration'].astype(float).sum() / daily_rollup['workouts'].astype(float).sum()
+                st.write(f"**Daily Duration Goal:** {daily_duration_goal} minutes")
+                st.write(f"**Average Workout Duration:** {avg_duration:.2f} minutes")
+                if avg_duration >= daily_duration_goal:
+                    st.success("You are meeting your daily workout duration goal on average!")
+                else:
+                    st.warning("You are not meeting your daily workout duration goal on average.")
+
+        with col2:
+            # Check weekly frequency goal
+            if frequency_goal:
+                avg_frequency = weekly_rollup['workouts'].astype(float).mean()
+                st.write(f"**Weekly Frequency Goal:** {frequency_goal} workouts/week")
+                st.write(f"**Average Workouts Per Week:** {avg_frequency:.2f} workouts/week")
+                if avg_frequency >= frequency_goal:
+                    st.success("You are meeting your weekly workout frequency goal on average!")
+                else:
+                    st.warning("You are not meeting your weekly workout frequency goal on average.")
+
+        with col3:
+            # Check daily calories goal and display related metrics
+            if calories_goal and 'calories_burned' in daily_rollup.columns:
+                total_calories_burned = daily_rollup['calories_burned'].astype(float).sum()
+                st.write(f"**Daily Calories Burn Goal:** {calories_goal} calories")
+                st.write(f"**Total Calories Burned:** {total_calories_burned:.2f} calories")
+                if total_calories_burned >= calories_goal:
+                    st.success("You are meeting your daily calories burn goal on average!")
+                else:
+                    st.warning("You are not meeting your daily calories burn goal on average.")
+            else:
+                st.warning("Calories burned data is not available. Please ensure your weight, age, and gender are set.")
+
+@st.fragment
+def calendar_section(daily_rollup, weekly_rollup, frequency_goal, first_day, last_day):
+    st.subheader("Goal Tracking Calendar View")
+    with timed("Goal Tracking Calendar View"):
+        # Build daily goal, streak and weekly events for the days of the date range
+        calendar_events = cached_build(
+            'calendar',
+            lambda: build_rollup_calendar_events(daily_rollup, weekly_rollup, frequency_goal,
+                                                 today=last_day, start=first_day),
+            daily_rollup, weekly_rollup, frequency_goal, first_day, last_day,
+        )
+
+        # Create the calendar object, opened on the last day of the range
+        options = {**CALENDAR_OPTIONS, "initialDate": last_day.strftime("%Y-%m-%d")}
+        calendar_view = calendar(events=calendar_events, options=options, custom_css=CALENDAR_CSS)
+
+        # Render the calendar
+        st.write(calendar_view)
+
+@st.fragment
+def history_section(df_workouts):
+    st.subheader(f"Workout History Data")
+    with timed("Workout History Data"):
+        st.dataframe(df_workouts[['startDT', 'endDT', 'duration', 'workout', 'reps', 'overallAccuracy', 'avg_heartbeat', 'calories_burned']])
+
+# Figure builders for the sections below; plain functions of the prepared frames so they
+# can also be timed outside Streamlit (see benchmarks/dashboard_bench.py). Each *_COLUMNS
+# list is the slice of df_workouts its builder reads, which keys its cached figures.
+
+ANALYSIS_COLUMNS = ['startDT', 'workout_date', 'duration', 'calories_burned']
+PERFORMANCE_COLUMNS = ['workout_date', 'workout', 'overallAccuracy', 'duration', 'calories_burned', 'reps']
+AVERAGE_HEART_RATE_COLUMNS = ['startDT', 'avg_heartbeat']
+TREND_COLUMNS = ['startDT', 'workout_date', 'duration', 'reps', 'calories_burned']
+
+def analysis_figures(df_workouts):
+    day_of_week = df_workouts.assign(day_of_week=df_workouts['startDT'].dt.day_name())
+    return [
+        px.bar(day_of_week, x='day_of_week', title='Workout Frequency by Day of the Week'),
+        px.bar(df_workouts, x='workout_date', y='duration', title='Total Duration per Workout'),
+        px.bar(df_workouts, x='workout_date', y='calories_burned', title='Calories Burned per Workout'),
+    ]
+
+def performance_figures(df_workouts):
+    return [
+        # Line chart of workout_date vs overallAccuracy, colored by workout
+        px.line(df_workouts, x='workout_date', y='overallAccuracy', color='workout',
+                title='Form Accuracy Over Time by Workout Type'),
+        # Box plots comparing workout against duration, calories_burned and overallAccuracy
+        px.box(df_workouts, x='workout', y='duration', title='Workout Type vs Duration'),
+        px.box(df_workouts, x='workout', y='calories_burned', title='Workout Type vs Calories Burned'),
+        px.box(df_workouts, x='workout', y='overallAccuracy', title='Workout Type vs Accuracy'),
+        # Scatter plot of reps vs duration, colored by workout
+        px.scatter(df_workouts, x='reps', y='duration', color='workout', title='Reps vs Duration'),
+    ]
+
+def average_heart_rate_figure(df_workouts):
+    return px.line(df_workouts.rename(columns={'avg_heartbeat': 'heartrate'}), x='startDT', y='heartrate',
+                   title='Average Heart Rate per Workout')
+
+# df_health comes from the archive with parsed timestamps and compact dtypes; the charts
+# only need its own columns, so workout columns are not copied onto every sample
+def heart_rate_sample_figures(df_health):
+    # Downsample per workout so the chart payload stays flat as history grows
+    samples_plot = downsample_groups(df_health, 'timestamp', 'heartrate', 'workout_id')
+    return [
+        px.line(samples_plot, x='timestamp', y='heartrate', color='workout_id', title='Heart Rate per Workout'),
+        # Built from pre-binned counts and per-workout quartiles rather than raw samples
+        histogram_figure(df_health['heartrate'], nbins=50, title='Heart Rate Distribution'),
+        box_figure(df_health, 'workout_id', 'heartrate', title='Workout Intensity Distribution'),
+    ]
+
+def trend_figures(df_workouts):
+    return [
+        # Workout duration over time
+        px.line(df_workouts, x='startDT', y='duration', title='Workout Duration Over Time', markers=True),
+        # Reps over time graph
+        px.line(df_workouts, x='startDT', y='reps', title='Total Reps Over Time', markers=True),
+        px.line(df_workouts, x='workout_date', y='calories_burned', title='Calories Burned Over Time', markers=True),
+    ]
+
+@st.fragment
+def analysis_section(df_workouts):
+    st.subheader("Workout Analysis")
+    with timed("Workout Analysis"):
+        columns = df_workouts[ANALYSIS_COLUMNS]
+        for fig in cached_figures('analysis', lambda: analysis_figures(columns), columns):
+            st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+def performance_section(df_workouts):
+    st.subheader("Workout Performance Analysis")
+    with timed("Workout Performance Analysis"):
+        columns = df_workouts[PERFORMANCE_COLUMNS]
+        for fig in cached_figures('performance', lambda: performance_figures(columns), columns):
+            st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+def heart_rate_section(df_workouts, supabase_client, username, start, end):
+    st.subheader("Heart Rate Analysis")
+    with timed("Heart Rate Analysis"):
+        columns = df_workouts[AVERAGE_HEART_RATE_COLUMNS]
+        for fig in cached_figures('heart_rate_avg', lambda: [average_heart_rate_figure(columns)], columns):
+            st.plotly_chart(fig, use_container_width=True)
+
+        # Sample-level charts need the raw heart-rate samples, so they are only loaded on request
+        if st.toggle("Show heart rate samples per workout"):
+            _, df_health = data.sync_history(supabase_client, username, with_health=True, start=start, end=end)
+            for fig in cached_figures('heart_rate_samples', lambda: heart_rate_sample_figures(df_health), df_health):
+                st.plotly_chart(fig, use_container_width=True)
+
+@st.fragment
+def trends_section(df_workouts):
+    st.subheader("Over Time Trend Analysis")
+    with timed("Over Time Trend Analysis"):
+        columns = df_workouts[TREND_COLUMNS]
+        for fig in cached_figures('trends', lambda: trend_figures(columns), columns):
+            st.plotly_chart(fig, use_container_width=True)
+
+# The user's average duration, accuracy and calories per workout type ranked against the
+# cohort sketches of everyone and of the user's gender and age band
+@st.fragment
+def cohort_section(df_workouts, query_backend, user_info):
+    st.subheader("Cohort Comparison")
+    with timed("Cohort Comparison"):
+        sketches = cohorts.load_sketches(query_backend, user_info, set(df_workouts['workout'].dropna()))
+        comparison = cohorts.percentiles(df_workouts, sketches, user_info)
+        if not comparison['workouts_all'].any():
+            st.info("Cohort statistics are not available yet.")
+            return
+        cohort = cohorts.user_cohort(user_info) or "your cohort"
+        st.caption(f"Percentile: the share of workouts of the same type at or below each of your workouts "
+                   f"in the selected date range, among everyone and among {cohort}; the median over your workouts.")
+        st.dataframe(comparison, hide_index=True, column_config={
+            'workout': "Workout",
+            'metric': "Metric",
+            'your_workouts': "Your Workouts",
+            'your_median': st.column_config.NumberColumn("Your Median", format="%.1f"),
+            'percentile_all': st.column_config.NumberColumn("Percentile (Everyone)", format="%.0f"),
+            'workouts_all': "Workouts (Everyone)",
+            'percentile_cohort': st.column_config.NumberColumn(f"Percentile ({cohort})", format="%.0f"),
+            'workouts_cohort': f"Workouts ({cohort})",
+        })
+
+# Sidebar date range; returns its (first_day, last_day) as Timestamps
+def date_range_selector():
+    label = st.sidebar.selectbox("Date range", list(DATE_WINDOWS) + [CUSTOM_WINDOW], index=1)
+    if label != CUSTOM_WINDOW:
+        return date_window(label)
+    last_day = local_today().date()
+    picked = st.sidebar.date_input("From - to", value=(last_day - timedelta(days=29), last_day), max_value=last_day)
+    # While the second date is being picked only the first one is set
+    picked = tuple(picked) if isinstance(picked, (tuple, list)) else (picked,)
+    return date_window(CUSTOM_WINDOW, custom=(picked[0], picked[-1]))
+
+# Lifetime workouts, hours, calories and active days from the summary row
+def lifetime_totals(summary):
+    if not summary:
+        return
+    calories = summary.get('calories_burned')
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Lifetime Workouts", f"{int(summary['workouts'] or 0)}")
+    col2.metric("Lifetime Hours", f"{(summary['duration'] or 0) / 60:.1f}")
+    col3.metric("Lifetime Calories", f"{calories:.0f}" if pd.notna(calories) else "-")
+    col4.metric("Active Days", f"{int(summary['active_days'] or 0)}")
+
+# Sidebar label -> section renderer
+SECTIONS = {
+    "Overall Goal Tracking": goals_section,
+    "Goal Tracking Calendar": calendar_section,
+    "Workout History Data": history_section,
+    "Workout Analysis": analysis_section,
+    "Workout Performance Analysis": performance_section,
+    "Heart Rate Analysis": heart_rate_section,
+    "Over Time Trend Analysis": trends_section,
+    "Cohort Comparison": cohort_section,
+}
+
+def workout_page():
+    # Sidebar section selector; only the selected section is computed
+    st.sidebar.subheader("Dashboard")
+    selected_section = st.sidebar.radio("Section", list(SECTIONS))
+    first_day, last_day = date_range_selector()
+    # [start, end) of the range as UTC timestamps, the filters pushed into the Supabase queries
+    start, end = utc_bounds(first_day, last_day)
+
+    # Shared Supabase client for this process
+    supabase_client = data.get_client("SUPABASE_KEY")
 
     # Ensure 'startDT' is initialized in session state
     if 'startDT' not in st.session_state:
@@ -89,9 +401,9 @@ def workout_page():
             st.rerun()
 
     # Fetch workouts from Supabase
-    workout_response = supabase_client.table('workouts').select('*').execute()
-    if workout_response.data:
-        workouts = [workout['name'] for workout in workout_response.data]
+    workout_rows = data.fetch_workouts(supabase_client)
+    if workout_rows:
+        workouts = [workout['name'] for workout in workout_rows]
 
     # Use st.columns to arrange components side by side
     col1, col2, col3, col4 = st.columns([3, 3, 1, 1])
@@ -100,7 +412,16 @@ def workout_page():
         selected_workout = st.selectbox("Select a Workout", workouts)
 
     with col2:
-        ip_address = st.text_input("Enter Server Address")
+        # A configured TRAINER_URL replaces the address field; typed addresses are ngrok subdomains
+        trainer_url = st.secrets.get("TRAINER_URL")
+        if trainer_url:
+            st.text_input("Server Address", value=trainer_url, disabled=True)
+        else:
+            ip_address = st.text_input("Enter Server Address")
+            try:
+                trainer_url = base_url_for(ip_address) if ip_address else None
+            except TrainerError as e:
+                st.error(str(e))
 
     # Initialize the workout status if it's not in session state
     if "workout_running" not in st.session_state:
@@ -110,7 +431,7 @@ def workout_page():
     with col3:
         st.write(" ")
         st.write(" ")
-        start_button = st.button("Start Workout", disabled=not ip_address)
+        start_button = st.button("Start Workout", disabled=not trainer_url)
         
     with col4:
         st.write(" ")
@@ -118,12 +439,10 @@ def workout_page():
         stop_button = st.button("Stop Workout")
 
     # Logic to handle the Start Workout button click
-    if start_button and ip_address:
+    if start_button and trainer_url:
         try:
-            st.write("Starting workout...")
-
             # Capture the current datetime when the workout starts and store it in session state
-            tz = pytz.timezone('Asia/Singapore')  # Replace with the desired timezone
+            tz = pytz.timezone(DISPLAY_TIMEZONE)
 
             # Get the current time in the specified timezone
             current_time = datetime.now(tz)
@@ -131,114 +450,84 @@ def workout_page():
             # Format the time as a string with timezone information
             formatted_time = current_time.strftime("%Y-%m-%dT%H:%M:%S%z")  # %z adds timezone offset
             st.session_state['startDT'] = formatted_time
-            
-            # Set headers to specify the content type
-            headers = {
-                "Content-Type": "application/json"  
-            }
-            
-            # Prepare the payload
-            payload = {
-                "workout": selected_workout.replace(" ", ""), 
-            }
-
-            # Make the POST request to the server with the workout data
-            api_url = f"https://{ip_address}.ngrok-free.app/start"
-            response = requests.post(api_url, json=payload, headers=headers)
-
-            if response.status_code == 200:
-                result = response.json()
-                watch_url = result.get("watch_url")
-
-                # Display the returned watch_url
-                if watch_url:
-                    st.write("Stream started successfully! Here is your workout video:")
-                    st.video(watch_url, autoplay=True)
-                    st.session_state['workout_running'] = True
-                else:
-                    st.error("Failed to retrieve the watch URL from the response.")
-            else:
-                st.error(f"Failed to start the workout stream. Status code: {response.status_code}")
+
+            # Send the request in the background; trainer_request_status polls for the result
+            future = get_trainer(trainer_url).start_async(selected_workout.replace(" ", ""))
+            st.session_state['trainer_request'] = ('start', future)
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
 
 
     # Logic to handle the Stop Workout button click
-    if stop_button and ip_address:
+    if stop_button and trainer_url:
         try:
-            st.write("Stopping workout...")
-
             # Check if startDT is set in session state before proceeding
             if st.session_state['startDT'] is None:
                 st.error("Start time is not set. Please start the workout first.")
             else:
-                # Prepare the payload using the startDT stored in session state
-                payload = {
-                    "username": st.session_state['username'],  # Username from session state
-                    "workout": selected_workout,               # Selected workout from the dropdown
-                    "startDT": st.session_state['startDT']     # Use the startDT from session state
-                }
-
-                # Set headers to specify the content type
-                headers = {
-                    "Content-Type": "application/json"  
-                }
-
-                # Make the POST request to the server to stop the workout
-                api_url = f"https://{ip_address}.ngrok-free.app/stop"
-                response = requests.post(api_url, json=payload, headers=headers)
-
-                if response.status_code == 200:
-                    st.write("Workout stopped successfully.")
-                    st.session_state['workout_running'] = False
-                else:
-                    st.error(f"Failed to stop the workout stream. Status code: {response.status_code}")
+                # Repeated stops for the same workout reuse the same request, so it is recorded once
+                future = get_trainer(trainer_url).stop_async(
+                    st.session_state['username'],  # Username from session state
+                    selected_workout,              # Selected workout from the dropdown
+                    st.session_state['startDT'],   # Use the startDT from session state
+                )
+                st.session_state['trainer_request'] = ('stop', future)
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
 
+    if 'trainer_request' in st.session_state:
+        trainer_request_status()
+
+    # Outcome of the last finished Start/Stop request, shown once
+    trainer_message = st.session_state.pop('trainer_message', None)
+    if trainer_message:
+        level, text = trainer_message
+        if level == 'error':
+            st.error(text)
+        else:
+            st.write(text)
+
+    watch_url = st.session_state.pop('watch_url', None)
+    if watch_url:
+        st.write("Stream started successfully! Here is your workout video:")
+        st.video(watch_url, autoplay=True)
+
+    # Live heart rate streamed from the trainer server while the workout runs
+    if st.session_state['workout_running'] and trainer_url:
+        st.subheader("Live Heart Rate")
+        live_user = data.fetch_user(supabase_client, st.session_state['username'])
+        live_age = live_user[0].get('age') if live_user else None
+        live_heart_rate_panel(get_feed(trainer_url, st.session_state['username'], live_age))
+
     st.divider()
 
     # Fetch user data
     username = st.session_state['username']
 
-    # Fetch user workout data by username
-    user_workout_response = supabase_client.table('userWorkouts').select('*').eq('username', username).execute()
+    # Fetch the workouts of the date range, only pulling rows that are not already held
+    df_workouts, _ = data.sync_history(supabase_client, username, start=start, end=end)
 
-    # Extract workout_id from the fetched workout data
-    workout_ids = [workout['workout_id'] for workout in user_workout_response.data]
-
-    # Fetch health data linked to the workout_ids
-    user_health_response = supabase_client.table('userWorkoutHealth').select('*').in_('workout_id', workout_ids).execute()
+    # Heart-rate aggregates come from the database; raw samples are only fetched for the per-workout chart
+    query_backend = SupabaseBackend(supabase_client)
+    # Lifetime totals come from a one-row summary of the rollups, not from the full history
+    lifetime = rollups.load_lifetime_summary(query_backend, username)
 
     # Fetch user data by username
-    user_response = supabase_client.table('user').select('*').eq('username', username).execute()
+    user_rows = data.fetch_user(supabase_client, username)
 
-    if user_workout_response.data and user_response.data:
+    if not df_workouts.empty and user_rows:
         st.header("Workout Historical Data & Analytics")
+        lifetime_totals(lifetime)
 
-        # Load data into DataFrame
-        df_workouts = pd.DataFrame(user_workout_response.data)
-        df_health = pd.DataFrame(user_health_response.data)
-        user_info = user_response.data[0]  # Assuming only one user record
+        user_info = user_rows[0]  # Assuming only one user record
 
         # Goal tracking
         daily_duration_goal = user_info.get('workoutDurationPerDay', None)
         frequency_goal = user_info.get('workoutFrequencyPerWeek', None)
         calories_goal = user_info.get('caloriesBurnPerDay', None)
 
-        # Merge health data with workout data
-        df_health = df_health.merge(df_workouts[['workout_id', 'startDT', 'endDT']], on='workout_id', how='left')
-        df_health['timestamp'] = pd.to_datetime(df_health['timestamp'])
-        df_workouts['startDT'] = pd.to_datetime(df_workouts['startDT'])
-        df_workouts['endDT'] = pd.to_datetime(df_workouts['endDT'])
-
-        # Add calculated columns
-        df_workouts['duration'] = (df_workouts['endDT'] - df_workouts['startDT']).dt.total_seconds() / 60  # in minutes
-        df_workouts['workout_date'] = df_workouts['startDT'].dt.date
-
-        # Calculate total workouts per week
-        df_workouts['week'] = df_workouts['startDT'].dt.isocalendar().week
-        workouts_per_week = df_workouts.groupby('week').size().reset_index(name='workouts_per_week')
+        # Parse datetimes and add duration and workout_date
+        df_workouts = prepare_workouts(df_workouts)
 
         # Check for necessary user data
         weight = user_info.get('weight', None)
@@ -248,366 +537,33 @@ def workout_page():
         if weight is None or age is None or gender is None:
             st.warning("To provide more accurate analytics, please update your profile with your weight, age, and gender.")
         else: 
-            # Calories burned calculation
-            avg_heart_rate = df_health.groupby('workout_id')['heartrate'].mean().reset_index(name='avg_heartbeat')
-            df_workouts = df_workouts.merge(avg_heart_rate, on='workout_id', how='left')
-
-            # Calculate calories burned based on gender
-            if gender == "Female":
-                df_workouts['calories_burned'] = df_workouts['duration'] * (
-                    (0.4472 * df_workouts['avg_heartbeat']) - 
-                    (0.1263 * weight) + 
-                    (0.074 * age) - 
-                    20.4022) / 4.184
-            else:  # Male
-                df_workouts['calories_burned'] = df_workouts['duration'] * (
-                    (0.6309 * df_workouts['avg_heartbeat']) + 
-                    (0.1988 * weight) + 
-                    (0.2017 * age) - 
-                    55.0969) / 4.184
-
-            # Goal Tracking Section
-            st.subheader("Overall Goal Tracking")
-
-            col1, col2, col3 = st.columns(3)
-
-            with col1:
-                # Check daily duration goal
-                if daily_duration_goal:
-                    avg_duration = df_workouts['duration'].mean()
-                    st.write(f"**Daily Duration Goal:** {daily_duration_goal} minutes")
-                    st.write(f"**Average Workout Duration:** {avg_duration:.2f} minutes")
-                    if avg_duration >= daily_duration_goal:
-                        st.success("You are meeting your daily workout duration goal on average!")
-                    else:
-                        st.warning("You are not meeting your daily workout duration goal on average.")
-
-            with col2:
-                # Check weekly frequency goal
-                if frequency_goal:
-                    avg_frequency = workouts_per_week['workouts_per_week'].mean()
-                    st.write(f"**Weekly Frequency Goal:** {frequency_goal} workouts/week")
-                    st.write(f"**Average Workouts Per Week:** {avg_frequency:.2f} workouts/week")
-                    if avg_frequency >= frequency_goal:
-                        st.success("You are meeting your weekly workout frequency goal on average!")
-                    else:
-                        st.warning("You are not meeting your weekly workout frequency goal on average.")
-
-            with col3:
-                # Check daily calories goal and display related metrics
-                if calories_goal and 'calories_burned' in df_workouts.columns:
-                    total_calories_burned = df_workouts['calories_burned'].sum()
-                    st.write(f"**Daily Calories Burn Goal:** {calories_goal} calories")
-                    st.write(f"**Total Calories Burned:** {total_calories_burned:.2f} calories")
-                    if total_calories_burned >= calories_goal:
-                        st.success("You are meeting your daily calories burn goal on average!")
-                    else:
-                        st.warning("You are not meeting your daily calories burn goal on average.")
-                else:
-                    st.warning("Calories burned data is not available. Please ensure your weight, age, and gender are set.")
-
-            # Workout and health data visualization
-            st.subheader("Goal Tracking Calendar View")
-
-            # Get the current year
-            today = pd.Timestamp.today()
-            start_of_year = pd.Timestamp(today.year, 1, 1)
-
-            # Create a date range from the start of the year to today
-            date_range = pd.date_range(start=start_of_year, end=today)
-
-            # Ensure the date_range is not empty
-            if len(date_range) > 0:
-                # Create a new DataFrame for goal tracking based on the date range
-                goal_tracking = pd.DataFrame(date_range, columns=['workout_date'])
-
-                # Convert 'workout_date' to datetime in both DataFrames to avoid merge errors
-                goal_tracking['workout_date'] = pd.to_datetime(goal_tracking['workout_date'])
-                df_workouts['workout_date'] = pd.to_datetime(df_workouts['workout_date'])
-
-                # Merge with the existing workout data to track goals
-                goal_tracking = goal_tracking.merge(df_workouts.groupby('workout_date').agg({
-                    'duration': 'mean', 
-                    'calories_burned': 'sum'
-                }).reset_index(), on='workout_date', how='left')
-
-            # Fill missing workout data with zeros or NaNs
-            goal_tracking['duration'].fillna(0, inplace=True)
-            goal_tracking['calories_burned'].fillna(0, inplace=True)
-
-            # Track if the daily goals were met or not
-            goal_tracking['met_duration_goal'] = goal_tracking['duration'] >= daily_duration_goal
-            goal_tracking['met_calories_goal'] = goal_tracking['calories_burned'] >= calories_goal if calories_goal else False
-
-            # Prepare calendar events based on the goal tracking results
-            calendar_events = []
-            for index, row in goal_tracking.iterrows():
-                date = row['workout_date'].strftime("%Y-%m-%d")
-                
-                # Determine the status of the goals and set the appropriate message and background color
-                if row['duration'] == 0 and row['calories_burned'] == 0:
-                    title = "No workouts :("
-                    background_color = "gray"
-                    text_color = "white"
-                elif row['met_duration_goal'] and row['met_calories_goal']:
-                    title = "✅ Met both daily workout duration and calorie goals!"
-                    background_color = "green"
-                    text_color = "white"
-                elif row['met_duration_goal']:
-                    title = "✅ Met daily workout duration goal but ❌ did not meet daily calorie goal."
-                    background_color = "yellow"
-                    text_color = "black"
-                elif row['met_calories_goal']:
-                    title = "✅ Met daily calorie goal but ❌ did not meet daily workout duration goal."
-                    background_color = "yellow"
-                    text_color = "black"
-                else:
-                    title = "❌ Did not meet either daily workout or calorie goals."
-                    background_color = "red"
-                    text_color = "white"
-                
-                calendar_events.append({
-                    "title": title,
-                    "start": date,
-                    "end": date,
-                    "resourceId": "a",  # Assuming a single resource for simplicity
-                    "backgroundColor": background_color,  # Set background color for the event
-                    "textColor": text_color
-                })
-
-            
-            # Add workout streak progression to the calendar
-            goal_tracking['worked_out'] = goal_tracking['duration'] > 0
-            goal_tracking['day_diff'] = goal_tracking['workout_date'].diff().dt.days.fillna(0)
-
-            # Define a streak where the difference between days is 1 (consecutive days)
-            goal_tracking['is_streak'] = (goal_tracking['day_diff'] == 1) & goal_tracking['worked_out']
-
-            # Initialize streak tracking
-            streak_length = 0
-            previous_streak_end = None
-
-            # Iterate through the goal_tracking DataFrame
-            for index, row in goal_tracking.iterrows():
-                if row['worked_out']:
-                    streak_length += 1
-                    # Check if the next day breaks the streak or if this is the last day in the DataFrame
-                    if index == len(goal_tracking) - 1 or not goal_tracking.iloc[index + 1]['worked_out']:
-                        # This is the end of the current streak, append the event only here
-                        calendar_events.append({
-                            "title": f"🔥 Workout streak: {streak_length} days!",
-                            "start": row['workout_date'].strftime("%Y-%m-%d"),
-                            "end": row['workout_date'].strftime("%Y-%m-%d"),
-                            "resourceId": "a",
-                            "backgroundColor": "orange"
-                        })
-                        # Reset streak length after adding the event
-                        streak_length = 0
-                else:
-                    # Reset streak if there's no workout on that day
-                    streak_length = 0
-
-            # Get a list of all Mondays (start of the week) for the whole year until today
-            all_weeks = pd.date_range(start=start_of_year, end=today, freq='W-MON')
-
-            # Calculate total workouts, average duration, and calories burned per week
-            df_workouts['week'] = df_workouts['startDT'].dt.isocalendar().week
-            df_workouts['year'] = df_workouts['startDT'].dt.isocalendar().year
-
-            weekly_stats = df_workouts.groupby(['year', 'week']).agg({
-                'duration': 'mean',
-                'calories_burned': 'sum',
-                'startDT': 'count'  # Number of workouts per week
-            }).reset_index().rename(columns={'startDT': 'workouts_per_week'})
-
-            # Weekly goal tracking for all weeks in the year
-            for start_of_week in all_weeks:
-                # Get the year and week number for this Monday
-                year, week = start_of_week.year, start_of_week.isocalendar().week
-                end_of_week = start_of_week + pd.Timedelta(days=7)
-
-                # Check if there are workouts for this week
-                week_stats = weekly_stats[(weekly_stats['year'] == year) & (weekly_stats['week'] == week)]
-
-                if not week_stats.empty:
-                    num_workouts = week_stats['workouts_per_week'].values[0]
-                    avg_duration = week_stats['duration'].values[0]
-                    total_calories = week_stats['calories_burned'].values[0]
-                    
-                    # Check if weekly goals were met
-                    if frequency_goal and num_workouts >= frequency_goal:
-                        weekly_title = f"✅ Met weekly workout frequency goal with {num_workouts} workouts!"
-                        weekly_background_color = "green"
-                        text_color = "white"
-                    else:
-                        weekly_title = f"❌ Did not fully meet weekly workout frequency goal. Only {num_workouts} workouts."
-                        weekly_background_color = "yellow"
-                        text_color = "black"
-                    
-                    calendar_events.append({
-                        "title": weekly_title,
-                        "start": start_of_week.strftime("%Y-%m-%d"),
-                        "end": end_of_week.strftime("%Y-%m-%d"),
-                        "resourceId": "a",
-                        "backgroundColor": weekly_background_color,  # Set background color for the event
-                        "textColor": text_color
-                    })
-                    
-                    # Add average workout duration per week
-                    calendar_events.append({
-                        "title": f"Avg duration: {avg_duration:.2f} mins",
-                        "start": start_of_week.strftime("%Y-%m-%d"),
-                        "end": end_of_week.strftime("%Y-%m-%d"),
-                        "resourceId": "a",
-                        "backgroundColor": "lightblue"
-                    })
-                    
-                    # Add total calories burned per week
-                    calendar_events.append({
-                        "title": f"Total calories burned: {total_calories:.0f}",
-                        "start": start_of_week.strftime("%Y-%m-%d"),
-                        "end": end_of_week.strftime("%Y-%m-%d"),
-                        "resourceId": "a",
-                        "backgroundColor": "purple"
-                    })
-                else:
-                    # No workouts this week
-                    calendar_events.append({
-                        "title": "No workouts for this week :(",
-                        "start": start_of_week.strftime("%Y-%m-%d"),
-                        "end": end_of_week.strftime("%Y-%m-%d"),
-                        "resourceId": "a",
-                        "backgroundColor": "grey"
-                    })
-
-            # Calendar options
-            calendar_options = {
-                "editable": "false",
-                "selectable": "false",
-                "headerToolbar": {
-                    "left": "today prev,next",
-                    "center": "title",
-                    "right": "dayGridMonth,dayGridWeek,dayGridDay",
-                },
-                "slotMinTime": "06:00:00",
-                "slotMaxTime": "18:00:00",
-                "initialView": "dayGridMonth",
-                "resourceGroupField": "building",
-                "firstDay": 1,
-                "resources": [
-                    {"id": "a", "building": "Goals", "title": "Goals Tracking"}
-                ]
-            }
-
-            # Custom CSS for calendar styling
-            custom_css = """
-                .fc-event-past {
-                    opacity: 0.8;
-                }
-                .fc-event-time {
-                    font-style: italic;
-                }
-                .fc-event-title {
-                    font-weight: 700;
-                }
-                .fc-toolbar-title {
-                    font-size: 2rem;
-                }
-                .fc-event { 
-                    background-color: var(--fc-event-background-color); 
-                }
-                /* Reduce calendar event font size */
-                .fc-event-title {
-                    font-size: 0.8rem; /* Make event titles smaller */
-                }
-                /* Reduce height of calendar cells */
-                .fc-daygrid-day-frame {
-                    min-height: 20px; /* Adjust this value to decrease cell height */
-                }
-                .fc-event-title {
-                    white-space: normal !important; /* Allow text to wrap */
-                    word-wrap: break-word; /* Break long words if necessary */
-                    font-size: 0.9em; /* Optional: Make the text slightly smaller */
-                    line-height: 1.2em; /* Optional: Adjust the line height */
-                }
-                .fc-daygrid-event {
-                    height: auto !important; /* Allow the height to adjust to content */
-                }
-            """
-
-            # Create the calendar object
-            calendar_view = calendar(events=calendar_events, options=calendar_options, custom_css=custom_css)
-
-            # Render the calendar
-            st.write(calendar_view)
-
-            # Workout and health data visualization
-            st.subheader(f"Workout History Data")
-            st.dataframe(df_workouts[['startDT', 'endDT', 'duration', 'workout', 'reps', 'overallAccuracy', 'avg_heartbeat', 'calories_burned']])
-
-            st.subheader("Workout Analysis")
-            df_workouts['day_of_week'] = df_workouts['startDT'].dt.day_name()
-            fig_frequency = px.bar(df_workouts, x='day_of_week', title='Workout Frequency by Day of the Week')
-            st.plotly_chart(fig_frequency, use_container_width=True)
-
-            fig_duration_per_workout = px.bar(df_workouts, x='workout_date', y='duration', title='Total Duration per Workout')
-            st.plotly_chart(fig_duration_per_workout, use_container_width=True)
-
-            # Display calories graph only if weight, age, and gender are set 
-            if weight is not None and age is not None and gender is not None:
-                    fig_calories = px.bar(df_workouts, x='workout_date', y='calories_burned', title='Calories Burned per Workout')
-                    st.plotly_chart(fig_calories, use_container_width=True)
-
-            st.subheader("Workout Performance Analysis")
-            # Line chart of workout_date vs overallAccuracy, colored by workout
-            fig_accuracy = px.line(df_workouts, x='workout_date', y='overallAccuracy', color='workout', 
-                                title='Form Accuracy Over Time by Workout Type')
-            st.plotly_chart(fig_accuracy, use_container_width=True)
-
-            # Box plot comparing workout against duration, calories_burned, or overallAccuracy
-            fig_comparison = px.box(df_workouts, x='workout', y='duration', title='Workout Type vs Duration')
-            st.plotly_chart(fig_comparison, use_container_width=True)
-
-            # You can create similar box plots for calories_burned and overallAccuracy:
-            fig_calories = px.box(df_workouts, x='workout', y='calories_burned', title='Workout Type vs Calories Burned')
-            st.plotly_chart(fig_calories, use_container_width=True)
-
-            fig_accuracy_comparison = px.box(df_workouts, x='workout', y='overallAccuracy', title='Workout Type vs Accuracy')
-            st.plotly_chart(fig_accuracy_comparison, use_container_width=True)
-
-            # Scatter plot of reps vs duration, colored by workout
-            fig_reps_duration = px.scatter(df_workouts, x='reps', y='duration', color='workout', 
-                                        title='Reps vs Duration')
-            st.plotly_chart(fig_reps_duration, use_container_width=True)
-
-            # Heart rate  
-            st.subheader("Heart Rate Analysis")
-            fig_heart_rate = px.line(df_health, x='timestamp', y='heartrate', color='workout_id', title='Heart Rate per Workout')
-            st.plotly_chart(fig_heart_rate, use_container_width=True)  # Full-width chart
-            
-            avg_heart_rate = df_health.groupby('workout_id')['heartrate'].mean().reset_index()
-            df_workouts_avg_hr = df_workouts.merge(avg_heart_rate, on='workout_id', how='left')
-            fig_avg_hr = px.line(df_workouts_avg_hr, x='startDT', y='heartrate', title='Average Heart Rate per Workout')
-            st.plotly_chart(fig_avg_hr, use_container_width=True)
-
-            fig_hr_distribution = px.histogram(df_health, x='heartrate', nbins=50, title='Heart Rate Distribution')
-            st.plotly_chart(fig_hr_distribution, use_container_width=True)
-
-            fig_intensity = px.box(df_health, x='workout_id', y='heartrate', title='Workout Intensity Distribution')
-            st.plotly_chart(fig_intensity, use_container_width=True)
-
-            st.subheader("Over Time Trend Analysis")
-            # Workout duration over time 
-            fig_duration = px.line(df_workouts, x='startDT', y='duration', title='Workout Duration Over Time', markers=True)
-            st.plotly_chart(fig_duration, use_container_width=True)  # Full-width chart
-
-            # Reps over time graph 
-            fig_reps = px.line(df_workouts, x='startDT', y='reps', title='Total Reps Over Time', markers=True)
-            st.plotly_chart(fig_reps, use_container_width=True)
-
-            fig_calories_line = px.line(df_workouts, x='workout_date', y='calories_burned', title='Calories Burned Over Time', markers=True)
-            st.plotly_chart(fig_calories_line, use_container_width=True)
+            # Duration, heart rate and calories stored when each workout was summarized
+            workout_summary, unsummarized_days = summaries.load_summaries(
+                query_backend, user_info, df_workouts, start, end)
+            if unsummarized_days:
+                rollups.get_worker().schedule(username, unsummarized_days)
+            # Daily/weekly totals and goal flags, kept up to date by the rollup worker
+            daily_rollup, weekly_rollup = rollups.load_rollups(
+                query_backend, user_info, df_workouts, workout_summary,
+                first_day.strftime("%Y-%m-%d"), last_day.strftime("%Y-%m-%d"))
+            df_workouts = summaries.apply_summaries(df_workouts, workout_summary)
+
+            section = SECTIONS[selected_section]
+            if section is goals_section:
+                goals_section(daily_rollup, weekly_rollup, daily_duration_goal, frequency_goal, calories_goal)
+            elif section is calendar_section:
+                calendar_section(daily_rollup, weekly_rollup, frequency_goal, first_day, last_day)
+            elif section is heart_rate_section:
+                heart_rate_section(df_workouts, supabase_client, username, start, end)
+            elif section is cohort_section:
+                cohort_section(df_workouts, query_backend, user_info)
+            else:
+                section(df_workouts)
 
+        render_timings()
 
+    elif lifetime:
+        lifetime_totals(lifetime)
+        st.warning("No workouts in the selected date range.")
     else:
         st.warning("No workout data found for the current user.")
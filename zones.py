@@ -0,0 +1,15 @@
+# Heart-rate zones shared by the stored workout summaries (summaries.py), the calorie
+# engine (calories.py) and the live statistics (streaming.py). Plain Python without
+# imports, so the live path does not load pandas or the backends.
+
+# Lower bound of each heart-rate zone as a fraction of the age-predicted maximum (220 - age);
+# samples below the first bound count towards no zone
+HEART_RATE_ZONES = (0.5, 0.6, 0.7, 0.8, 0.9)
+# Longer gaps between two samples are treated as a sensor dropout: only this much of
+# the gap is credited, at the last heart rate seen before it
+MAX_SAMPLE_GAP_SECONDS = 10
+
+
+# Age-predicted maximum heart rate (bpm); age may be a scalar or an array
+def max_heart_rate(age):
+    return 220 - age